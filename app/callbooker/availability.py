@@ -1,8 +1,8 @@
-import asyncio
-from datetime import datetime, timedelta
-from typing import AsyncIterable
+from datetime import date, datetime, time, timedelta, timezone
+from functools import cache
+from typing import AsyncIterable, Iterator
+from zoneinfo import ZoneInfo
 
-import pytz
 from sqlmodel import select
 
 from app.callbooker.google import AdminGoogleCalendar
@@ -10,22 +10,70 @@ from app.callbooker.utils import iso_8601_to_datetime
 from app.core.database import get_session
 from app.main_app.models import Admin, Config
 
+ONE_DAY = timedelta(days=1)
 
-def is_weekday(dt: datetime) -> bool:
-    """Check if datetime is a weekday (not Saturday or Sunday)"""
+
+def is_weekday(dt: date) -> bool:
+    """Check if date is a weekday (not Saturday or Sunday)"""
     return dt.weekday() not in (5, 6)
 
 
+class WorkingHours:
+    """
+    The UTC start and end of working hours for each weekday in a timezone.
+
+    Windows are worked out a year at a time from the zone's own offsets (so DST changes are handled by zoneinfo rather
+    than by replacing the hour on an already-localised datetime) and then looked up by date.
+    Local times that don't exist because the clocks went forward are moved forward by the gap, e.g. 01:30 in London
+    on the day BST starts is 02:30 BST (01:30 UTC).
+    """
+
+    def __init__(self, tz_name: str, min_start: time, max_end: time):
+        self.tz = ZoneInfo(tz_name)
+        self.min_start = min_start
+        self.max_end = max_end
+        self._windows_by_year: dict[int, dict[date, tuple[datetime, datetime]]] = {}
+
+    def _to_utc(self, day: date, t: time) -> datetime:
+        return datetime.combine(day, t, tzinfo=self.tz).astimezone(timezone.utc)
+
+    def _year_windows(self, year: int) -> dict[date, tuple[datetime, datetime]]:
+        windows = self._windows_by_year.get(year)
+        if windows is None:
+            windows = {}
+            day = date(year, 1, 1)
+            while day.year == year:
+                if is_weekday(day):
+                    windows[day] = self._to_utc(day, self.min_start), self._to_utc(day, self.max_end)
+                day += ONE_DAY
+            self._windows_by_year[year] = windows
+        return windows
+
+    def day_windows(self, start: datetime, end: datetime) -> Iterator[tuple[datetime, datetime]]:
+        """Yield the UTC working hours for each local weekday between start and end (inclusive)"""
+        day = start.astimezone(self.tz).date()
+        last_day = end.astimezone(self.tz).date()
+        while day <= last_day:
+            if window := self._year_windows(day.year).get(day):
+                yield window
+            day += ONE_DAY
+
+
+@cache
+def get_working_hours(tz_name: str, min_start: time, max_end: time) -> WorkingHours:
+    """Get the WorkingHours for a timezone, shared between all admins in that timezone"""
+    return WorkingHours(tz_name, min_start, max_end)
+
+
 async def get_day_start_ends(start: datetime, end: datetime, admin_tz: str) -> AsyncIterable[tuple[datetime, datetime]]:
     """
     For each day in the range, get the earliest and latest possible working hours
     as if they were in the admin's timezone. This allows us to accurately compare
     across ranges in DST changes.
 
-    For example, if DST changes on 22nd Oct, we get:
-    21st Oct 10:00 - 17:00 UTC (10:00 - 17:00 GMT)
-    22nd Oct 09:00 - 16:00 UTC (10:00 - 17:00 GMT)
-    23rd Oct 09:00 - 16:00 UTC (10:00 - 17:00 GMT)
+    For example, if BST ends on 25th Oct, we get:
+    23rd Oct 09:00 - 16:30 UTC (10:00 - 17:30 BST)
+    26th Oct 10:00 - 17:30 UTC (10:00 - 17:30 GMT)
     """
     with get_session() as db:
         config = db.exec(select(Config)).one_or_none()
@@ -33,30 +81,12 @@ async def get_day_start_ends(start: datetime, end: datetime, admin_tz: str) -> A
             # Use defaults if no config exists
             config = Config()
 
-    min_start_hours, min_start_mins = config.meeting_min_start.split(':')
-    min_start_hours = int(min_start_hours)
-    min_start_mins = int(min_start_mins)
-    max_end_hours, max_end_mins = config.meeting_max_end.split(':')
-    max_end_hours = int(max_end_hours)
-    max_end_mins = int(max_end_mins)
-
+    working_hours = get_working_hours(
+        admin_tz, time.fromisoformat(config.meeting_min_start), time.fromisoformat(config.meeting_max_end)
+    )
     # Check the days either side of the dt range to catch where admins are in different timezones
-    start = start - timedelta(days=1)
-    end = end + timedelta(days=1)
-
-    admin_tz = pytz.timezone(admin_tz)
-
-    while start < end:
-        admin_local_dt = start.astimezone(admin_tz)
-        if not is_weekday(admin_local_dt):
-            # Skip weekends
-            start = start + timedelta(days=1)
-            continue
-
-        admin_local_start = admin_local_dt.replace(hour=min_start_hours, minute=min_start_mins, second=0, microsecond=0)
-        admin_local_end = admin_local_dt.replace(hour=max_end_hours, minute=max_end_mins, second=0, microsecond=0)
-        yield admin_local_start.astimezone(pytz.utc), admin_local_end.astimezone(pytz.utc)
-        start = start + timedelta(days=1)
+    for day_start_end in working_hours.day_windows(start - ONE_DAY, end + ONE_DAY):
+        yield day_start_end
 
 
 async def get_admin_available_slots(
@@ -75,7 +105,7 @@ async def get_admin_available_slots(
 
     # First we get all the 'busy' slots from Google
     g_cal = AdminGoogleCalendar(admin_email=admin.email)
-    cal_data = await asyncio.to_thread(g_cal.get_free_busy_slots, start, end)
+    cal_data = await g_cal.get_free_busy_slots(start, end)
     calendar_busy_slots = []
     for time_slot in cal_data['calendars'][admin.email]['busy']:
         _slot_start = iso_8601_to_datetime(time_slot['start'])
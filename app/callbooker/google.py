@@ -1,16 +1,95 @@
+import asyncio
 import logging
+import time
 from dataclasses import dataclass
 from datetime import datetime
+from functools import cache
+from typing import Optional
+from urllib.parse import quote
 from uuid import uuid4
 
-from google.oauth2 import service_account
-from googleapiclient.discovery import Resource, build
-from googleapiclient.errors import HttpError
+import httpx
+import logfire
+from google.auth import crypt, jwt
 
 from app.core.config import settings
 
 logger = logging.getLogger('hermes.google')
 
+CALENDAR_SCOPE = 'https://www.googleapis.com/auth/calendar'
+CALENDAR_BASE_URL = 'https://www.googleapis.com/calendar/v3'
+TOKEN_LIFETIME_SECS = 3600
+# Refresh tokens slightly before Google expires them so in-flight requests don't fail
+TOKEN_EXPIRY_MARGIN_SECS = 60
+
+_client: Optional[httpx.AsyncClient] = None
+# Access tokens keyed by the admin email they impersonate, as (token, expires_at)
+_tokens: dict[str, tuple[str, float]] = {}
+_token_locks: dict[str, asyncio.Lock] = {}
+
+
+def _get_client() -> httpx.AsyncClient:
+    """
+    Singleton httpx client so that connections to Google are pooled across requests.
+    """
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(
+                max_connections=settings.g_api_max_connections,
+                max_keepalive_connections=settings.g_api_max_connections,
+            ),
+        )
+    return _client
+
+
+@cache
+def _get_signer() -> crypt.Signer:
+    """The service account's private key, parsed once"""
+    return crypt.RSASigner.from_service_account_info(settings.google_credentials)
+
+
+def _make_assertion(subject: str) -> str:
+    """Build the signed JWT used to request an access token impersonating the admin"""
+    now = int(time.time())
+    payload = {
+        'iss': settings.g_client_email,
+        'sub': subject,
+        'scope': CALENDAR_SCOPE,
+        'aud': settings.g_token_uri,
+        'iat': now,
+        'exp': now + TOKEN_LIFETIME_SECS,
+    }
+    return jwt.encode(_get_signer(), payload, key_id=settings.g_private_key_id or None).decode()
+
+
+async def get_access_token(subject: str) -> str:
+    """
+    Get an access token for the service account impersonating `subject`.
+    Tokens are cached until shortly before they expire, and concurrent callers for the same subject share one
+    token request.
+    """
+    token = _tokens.get(subject)
+    if token and token[1] > time.time():
+        return token[0]
+
+    lock = _token_locks.setdefault(subject, asyncio.Lock())
+    async with lock:
+        token = _tokens.get(subject)
+        if token and token[1] > time.time():
+            return token[0]
+
+        response = await _get_client().post(
+            settings.g_token_uri,
+            data={'grant_type': 'urn:ietf:params:oauth:grant-type:jwt-bearer', 'assertion': _make_assertion(subject)},
+        )
+        response.raise_for_status()
+        data = response.json()
+        expires_at = time.time() + data.get('expires_in', TOKEN_LIFETIME_SECS) - TOKEN_EXPIRY_MARGIN_SECS
+        _tokens[subject] = (data['access_token'], expires_at)
+        return data['access_token']
+
 
 @dataclass
 class AdminGoogleCalendar:
@@ -18,17 +97,18 @@ class AdminGoogleCalendar:
 
     admin_email: str
 
-    def __post_init__(self):
-        self.resource = self._create_resource()
-
-    def _create_resource(self) -> Resource:
-        """Create Google Calendar API resource with service account credentials"""
-        creds = service_account.Credentials.from_service_account_info(
-            settings.google_credentials, scopes=['https://www.googleapis.com/auth/calendar']
-        ).with_subject(self.admin_email)
-        return build('calendar', 'v3', credentials=creds)
+    async def _request(self, method: str, path: str, *, params: Optional[dict] = None, data: dict) -> dict:
+        """Make an authenticated request to the Google Calendar API as the admin"""
+        headers = {'Authorization': f'Bearer {await get_access_token(self.admin_email)}'}
+        with logfire.span(f'{method} {path}'):
+            response = await _get_client().request(
+                method, f'{CALENDAR_BASE_URL}/{path}', params=params, json=data, headers=headers
+            )
+            logger.info(f'Request method={method} url={path} status_code={response.status_code}')
+            response.raise_for_status()
+            return response.json()
 
-    def get_free_busy_slots(self, start: datetime, end: datetime) -> dict:
+    async def get_free_busy_slots(self, start: datetime, end: datetime) -> dict:
         """Query Google Calendar for busy slots in the given time range"""
         q_data = {
             'timeMin': start.isoformat(),
@@ -37,9 +117,11 @@ class AdminGoogleCalendar:
             'groupExpansionMax': 100,
             'items': [{'id': self.admin_email}],
         }
-        return self.resource.freebusy().query(body=q_data).execute()
+        return await self._request('POST', 'freeBusy', data=q_data)
 
-    def create_cal_event(self, *, summary: str, description: str, start: datetime, end: datetime, contact_email: str):
+    async def create_cal_event(
+        self, *, summary: str, description: str, start: datetime, end: datetime, contact_email: str
+    ):
         """Create a calendar event with Google Meet"""
         event = {
             'summary': summary,
@@ -54,12 +136,13 @@ class AdminGoogleCalendar:
         }
 
         try:
-            (
-                self.resource.events()
-                .insert(calendarId=self.admin_email, sendNotifications=True, body=event, conferenceDataVersion=1)
-                .execute()
+            await self._request(
+                'POST',
+                f'calendars/{quote(self.admin_email)}/events',
+                params={'sendUpdates': 'all', 'conferenceDataVersion': 1},
+                data=event,
             )
             logger.info(f'Created Google Calendar event: {summary} for {contact_email}')
-        except HttpError as e:
+        except httpx.HTTPError as e:
             logger.error(f'Error creating Google Calendar event: {e}', exc_info=True)
             raise
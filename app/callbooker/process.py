@@ -1,9 +1,10 @@
-import asyncio
 import logging
 from datetime import datetime, timedelta, timezone
+from typing import Optional
 
+from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
-from sqlmodel import select
+from sqlmodel import delete, select
 
 from app.callbooker.google import AdminGoogleCalendar
 from app.callbooker.meeting_templates import MEETING_CONTENT_TEMPLATES
@@ -12,24 +13,22 @@ from app.callbooker.utils import iso_8601_to_datetime
 from app.core.config import settings
 from app.core.database import DBSession
 from app.exceptions import MeetingBookingError
-from app.main_app.models import Admin, Company, Contact, Meeting
+from app.main_app.identity import find_contact
+from app.main_app.models import Admin, Company, Contact, Meeting, PipedriveOutbox
+from app.pipedrive.outbox import add_to_outbox
 
 logger = logging.getLogger('hermes.callbooker')
 
 
 async def get_or_create_contact(company: Company, event: CBSalesCall | CBSupportCall, db: DBSession) -> Contact:
     """Get or create contact from callbooker event data"""
-    # Try to find existing contact by email or last name
+    # Try to find existing contact by email, or by last name case insensitively
     if event.email:
-        contact = db.exec(
-            select(Contact)
-            .where(Contact.company_id == company.id, Contact.email == event.email)
-            .order_by(Contact.id.desc())
-        ).first()
+        contact = find_contact(db, email=event.email, where=(Contact.company_id == company.id,))
     else:
         contact = db.exec(
             select(Contact)
-            .where(Contact.company_id == company.id, Contact.last_name.ilike(event.last_name))
+            .where(Contact.company_id == company.id, func.lower(Contact.last_name) == func.lower(event.last_name))
             .order_by(Contact.id.desc())
         ).first()
 
@@ -38,6 +37,7 @@ async def get_or_create_contact(company: Company, event: CBSalesCall | CBSupport
         contact_data = event.contact_dict()
         contact = Contact(company_id=company.id, **contact_data)
         db.add(contact)
+        add_to_outbox(db, PipedriveOutbox.ACTION_SYNC_COMPANY, company.id)
         db.commit()
         db.refresh(contact)
 
@@ -58,6 +58,8 @@ async def get_or_create_contact_company(event: CBSalesCall, db: DBSession) -> tu
     - Contact's phone
     - Their last name
 
+    Names are matched case insensitively, emails and phone numbers by the contacts' normalised identities.
+
     If neither exist, they are created.
     """
     contact = None
@@ -69,13 +71,13 @@ async def get_or_create_contact_company(event: CBSalesCall, db: DBSession) -> tu
 
     # Try to find contact by email or phone, then get their company
     if not company and event.email:
-        contact = db.exec(select(Contact).where(Contact.email == event.email).order_by(Contact.id.desc())).first()
+        contact = find_contact(db, email=event.email)
         if contact:
             logger.info(f'Found contact {contact.id} by email')
             company = db.get(Company, contact.company_id)
 
     if not company and event.phone:
-        contact = db.exec(select(Contact).where(Contact.phone == event.phone).order_by(Contact.id.desc())).first()
+        contact = find_contact(db, phone=event.phone, country=event.country)
         if contact:
             logger.info(f'Found contact {contact.id} by phone')
             company = db.get(Company, contact.company_id)
@@ -83,7 +85,9 @@ async def get_or_create_contact_company(event: CBSalesCall, db: DBSession) -> tu
     # Try to find company by name
     if not company:
         company = db.exec(
-            select(Company).where(Company.name.ilike(event.company_name)).order_by(Company.id.desc())
+            select(Company)
+            .where(func.lower(Company.name) == func.lower(event.company_name))
+            .order_by(Company.id.desc())
         ).first()
         if company:
             logger.info(f'Found company {company.id} by name')
@@ -94,6 +98,8 @@ async def get_or_create_contact_company(event: CBSalesCall, db: DBSession) -> tu
         company = Company(**company_data)
         db.add(company)
         try:
+            db.flush()
+            add_to_outbox(db, PipedriveOutbox.ACTION_SYNC_COMPANY, company.id)
             db.commit()
         except IntegrityError:
             # Previously tc2_admin_id was passed as bdr_id, but with the rebuild we expect the hermes_admin_id.
@@ -110,6 +116,8 @@ async def get_or_create_contact_company(event: CBSalesCall, db: DBSession) -> tu
 
             company.bdr_person_id = admin.id
             db.add(company)
+            db.flush()
+            add_to_outbox(db, PipedriveOutbox.ACTION_SYNC_COMPANY, company.id)
             db.commit()
 
         db.refresh(company)
@@ -122,13 +130,14 @@ async def get_or_create_contact_company(event: CBSalesCall, db: DBSession) -> tu
     # Mark that company has booked a call
     company.has_booked_call = True
     db.add(company)
+    add_to_outbox(db, PipedriveOutbox.ACTION_SYNC_COMPANY, company.id)
     db.commit()
 
     return company, contact
 
 
 async def book_meeting(
-    company: Company, contact: Contact, event: CBSalesCall | CBSupportCall, db: DBSession
+    company: Company, contact: Contact, event: CBSalesCall | CBSupportCall, db: DBSession, deal_id: Optional[int] = None
 ) -> Meeting:
     """
     Book a meeting after checking:
@@ -136,7 +145,8 @@ async def book_meeting(
     B) No meeting already booked within 2 hours
     C) Admin exists and is free at this time
 
-    If all checks pass, creates the meeting and syncs to Google Calendar.
+    If all checks pass, creates the meeting (for the deal if given), syncs it to Google Calendar and adds its sync
+    to Pipedrive to the outbox.
     """
     if not contact.email:
         raise MeetingBookingError('Contact must have an email address to book a meeting.')
@@ -151,7 +161,7 @@ async def book_meeting(
     meeting_end = event.meeting_dt + timedelta(minutes=settings.meeting_dur_mins)
     await _check_admin_availability(meeting_start, meeting_end, admin.email)
 
-    meeting = _create_meeting_record(company.id, contact.id, event, meeting_start, meeting_end, db)
+    meeting = _create_meeting_record(company.id, contact.id, deal_id, event, meeting_start, meeting_end, db)
 
     try:
         await _create_google_calendar_event(meeting, company, contact, admin, db)
@@ -186,12 +196,16 @@ async def _check_admin_availability(meeting_start: datetime, meeting_end: dateti
 def _create_meeting_record(
     company_id: int,
     contact_id: int,
+    deal_id: Optional[int],
     event: CBSalesCall | CBSupportCall,
     meeting_start: datetime,
     meeting_end: datetime,
     db: DBSession,
 ) -> Meeting:
-    """Create meeting record in database and commit to release DB connection before external API call"""
+    """
+    Create meeting record in database and commit to release DB connection before external API call, with its sync in
+    the outbox
+    """
     meeting_type = Meeting.TYPE_SALES if isinstance(event, CBSalesCall) else Meeting.TYPE_SUPPORT
 
     meeting = Meeting(
@@ -201,8 +215,11 @@ def _create_meeting_record(
         start_time=meeting_start,
         end_time=meeting_end,
         admin_id=event.admin_id,
+        deal_id=deal_id,
     )
     db.add(meeting)
+    db.flush()
+    add_to_outbox(db, PipedriveOutbox.ACTION_SYNC_MEETING, meeting.id)
     db.commit()
     db.refresh(meeting)
 
@@ -210,9 +227,14 @@ def _create_meeting_record(
 
 
 def _delete_meeting_on_calendar_failure(meeting_id: int, db: DBSession) -> None:
-    """Delete meeting from database if Google Calendar event creation fails"""
+    """Delete meeting from database, and its sync from the outbox, if Google Calendar event creation fails"""
     meeting = db.get(Meeting, meeting_id)
     if meeting:
+        db.exec(
+            delete(PipedriveOutbox).where(
+                PipedriveOutbox.action == PipedriveOutbox.ACTION_SYNC_MEETING, PipedriveOutbox.object_id == meeting_id
+            )
+        )
         db.delete(meeting)
         db.commit()
         logger.info(f'Deleted meeting {meeting_id} due to Google Calendar failure')
@@ -251,8 +273,7 @@ async def _create_google_calendar_event(
 
     try:
         g_cal = AdminGoogleCalendar(admin_email=admin.email)
-        await asyncio.to_thread(
-            g_cal.create_cal_event,
+        await g_cal.create_cal_event(
             description=meeting_template.format(**template_vars),
             summary=meeting.name,
             contact_email=contact.email,
@@ -273,7 +294,7 @@ async def check_gcal_open_slots(meeting_start: datetime, meeting_end: datetime,
     assert meeting_start.tzinfo == timezone.utc
 
     g_cal = AdminGoogleCalendar(admin_email=admin_email)
-    cal_data = await asyncio.to_thread(g_cal.get_free_busy_slots, meeting_start, meeting_start + timedelta(days=1))
+    cal_data = await g_cal.get_free_busy_slots(meeting_start, meeting_start + timedelta(days=1))
 
     busy_slots = cal_data.get('calendars', {}).get(admin_email, {}).get('busy', [])
     for time_slot in busy_slots:
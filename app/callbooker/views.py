@@ -1,12 +1,13 @@
+import json
 import logging
 from datetime import datetime, timedelta
 from hmac import compare_digest
-from typing import Optional
+from typing import AsyncIterable, Optional
 from urllib.parse import urlencode
 
 from fastapi import APIRouter, BackgroundTasks, Depends, Header
 from sqlmodel import select
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, StreamingResponse
 
 from app.callbooker.availability import get_admin_available_slots
 from app.callbooker.models import CBSalesCall, CBSupportCall
@@ -17,11 +18,11 @@ from app.callbooker.process import (
 )
 from app.common.utils import get_bearer, sign_args
 from app.core.config import settings
-from app.core.database import DBSession, get_db
+from app.core.database import DBSession, get_db, get_read_db
 from app.exceptions import DealCreationError, MeetingBookingError
 from app.main_app.common import get_or_create_deal
 from app.main_app.models import Admin, Company, Deal
-from app.pipedrive.tasks import sync_company_to_pipedrive, sync_meeting_to_pipedrive
+from app.pipedrive.outbox import relay_outbox
 from app.tc2.process import get_or_create_company_from_tc2
 
 logger = logging.getLogger('hermes.callbooker')
@@ -36,18 +37,14 @@ async def sales_call(event: CBSalesCall, background_tasks: BackgroundTasks, db:
     Callbooker → Hermes → Pipedrive sync.
     """
     try:
+        # Each change is committed with its sync in the Pipedrive outbox, so the sync can't be lost
         company, contact = await get_or_create_contact_company(event, db)
         deal = await get_or_create_deal(company, contact, db, status=Deal.STATUS_OPEN)
-        meeting = await book_meeting(company=company, contact=contact, event=event, db=db)
-        meeting.deal_id = deal.id
-        db.add(meeting)
-        db.commit()
+        await book_meeting(company=company, contact=contact, event=event, db=db, deal_id=deal.id)
     except (MeetingBookingError, DealCreationError) as e:
         return JSONResponse({'status': 'error', 'message': str(e)}, status_code=400)
 
-    # Queue background tasks to sync to Pipedrive
-    background_tasks.add_task(sync_company_to_pipedrive, company.id)
-    background_tasks.add_task(sync_meeting_to_pipedrive, meeting.id)
+    relay_outbox(background_tasks)
 
     return {'status': 'ok'}
 
@@ -65,25 +62,38 @@ async def support_call(event: CBSupportCall, background_tasks: BackgroundTasks,
     contact = await get_or_create_contact(company, event, db)
 
     try:
-        meeting = await book_meeting(company=company, contact=contact, event=event, db=db)
-        db.add(meeting)
-        db.commit()
+        await book_meeting(company=company, contact=contact, event=event, db=db)
     except (MeetingBookingError, DealCreationError) as e:
         return JSONResponse({'status': 'error', 'message': str(e)}, status_code=400)
 
+    relay_outbox(background_tasks)
+
     return {'status': 'ok'}
 
 
+async def _ndjson_slots(slots: AsyncIterable[tuple[datetime, datetime]]) -> AsyncIterable[str]:
+    """Serialise each slot as its own JSON line as soon as it's calculated"""
+    async for slot_start, slot_end in slots:
+        yield json.dumps([slot_start.isoformat(), slot_end.isoformat()]) + '\n'
+
+
 @router.get('/availability/', name='get-availability')
-async def availability(admin_id: int, start_dt: datetime, end_dt: datetime, db: DBSession = Depends(get_db)):
+async def availability(
+    admin_id: int, start_dt: datetime, end_dt: datetime, stream: bool = False, db: DBSession = Depends(get_read_db)
+):
     """
     Get available time slots for an admin between two datetimes.
+
+    With `stream=true` the slots are sent as NDJSON, one `[start, end]` pair per line, as they're calculated rather
+    than collected into a single response.
     """
     admin = db.get(Admin, admin_id)
     if not admin:
         return JSONResponse({'status': 'error', 'message': 'Admin not found'}, status_code=404)
 
     slots = get_admin_available_slots(start_dt, end_dt, admin)
+    if stream:
+        return StreamingResponse(_ndjson_slots(slots), media_type='application/x-ndjson')
     return {'status': 'ok', 'slots': [slot async for slot in slots]}
 
 
@@ -120,7 +130,7 @@ async def generate_support_link(
 
 
 @router.get('/support-link/validate/', name='validate-support-link')
-async def validate_support_link(admin_id: int, company_id: int, e: int, s: str, db: DBSession = Depends(get_db)):
+async def validate_support_link(admin_id: int, company_id: int, e: int, s: str, db: DBSession = Depends(get_read_db)):
     """
     Validate a support link for a company from the website.
     Checks signature and expiry.
@@ -0,0 +1,233 @@
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from sqlmodel import delete, select
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.database import get_session, upsert_insert
+from app.main_app.models import IdempotentResponse
+
+logger = logging.getLogger('hermes.idempotency')
+
+# How often expired responses are deleted
+PURGE_INTERVAL_SECS = 3600
+
+
+def get_idempotency_key(
+    path: str, body: bytes, idempotency_key: Optional[str] = None, key_from_body: bool = True
+) -> Optional[str]:
+    """
+    The key a request's response is stored under: the request's path with either the Idempotency-Key header sent by
+    the client or, without one, the raw body (so a retried webhook delivery has the same key as the original). None
+    if there's no header and the body shouldn't be used, e.g. two bookings can have the same body.
+    """
+    h = hashlib.sha256(path.encode())
+    if idempotency_key:
+        h.update(b'\0key\0' + idempotency_key.encode())
+    elif key_from_body:
+        h.update(b'\0body\0' + body)
+    else:
+        return None
+    return h.hexdigest()
+
+
+def claim_key(key: str, pending_ttl: int) -> Optional[IdempotentResponse]:
+    """
+    Claim the key for a request that's about to be processed, with a pending row, unless another request already has.
+
+    Returns:
+        None if the key was claimed, otherwise the other request's response, or its pending row if it's still being
+        processed (`status_code` is None)
+    """
+    now = datetime.now(timezone.utc)
+    values = {
+        'key': key,
+        'created': now,
+        'expires': now + timedelta(seconds=pending_ttl),
+        'status_code': None,
+        'media_type': None,
+        'content': '',
+    }
+    with get_session() as db:
+        stmt = upsert_insert(db, IdempotentResponse).values(values)
+        # A request that's expired (or whose processing never finished) can be claimed again
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['key'], set_=values, where=IdempotentResponse.expires <= now
+        ).returning(IdempotentResponse.key)
+        claimed = db.exec(stmt).first()
+        db.commit()
+        if claimed:
+            return None
+        return db.exec(select(IdempotentResponse).where(IdempotentResponse.key == key)).one_or_none()
+
+
+def store_response(key: str, status_code: int, media_type: Optional[str], content: str, ttl: int):
+    """Store the response to the request that claimed the key"""
+    now = datetime.now(timezone.utc)
+    values = {
+        'key': key,
+        'created': now,
+        'expires': now + timedelta(seconds=ttl),
+        'status_code': status_code,
+        'media_type': media_type,
+        'content': content,
+    }
+    with get_session() as db:
+        stmt = upsert_insert(db, IdempotentResponse).values(values)
+        # Usually replacing the key's pending row
+        db.exec(stmt.on_conflict_do_update(index_elements=['key'], set_=values))
+        db.commit()
+
+
+def release_key(key: str):
+    """Release a key claimed by a request that failed, so it can be retried"""
+    with get_session() as db:
+        db.exec(
+            delete(IdempotentResponse).where(IdempotentResponse.key == key, IdempotentResponse.status_code.is_(None))
+        )
+        db.commit()
+
+
+def purge_expired_responses():
+    with get_session() as db:
+        result = db.exec(delete(IdempotentResponse).where(IdempotentResponse.expires <= datetime.now(timezone.utc)))
+        db.commit()
+    logger.info(f'Deleted {result.rowcount} expired idempotent responses')
+
+
+class IdempotencyMiddleware:
+    """
+    Sends repeated POSTs to the given paths the stored response to the first one, rather than processing them again.
+
+    Requests are matched by their Idempotency-Key header if they have one, otherwise, for `webhook_paths`, by their raw
+    body. Requests to `key_paths` without the header are processed as usual. Each request claims its key before it's
+    processed, so a repeat that arrives while the first is still being processed gets a 409 rather than being
+    processed alongside it. Only successful responses are stored, failed requests release their key so they can be
+    retried. Storage errors never fail the request, the request is just processed as if it were new.
+
+    Requests to paths in `verifiers` are only matched once the path's verifier accepts their body and headers, so
+    unauthenticated requests are passed straight to the app to be rejected without touching the database. The
+    database is used in a thread so it doesn't block the event loop.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        webhook_paths: set[str],
+        key_paths: set[str],
+        ttl: int,
+        pending_ttl: int,
+        verifiers: Optional[dict[str, Callable[[bytes, Headers], bool]]] = None,
+    ):
+        self.app = app
+        self.webhook_paths = webhook_paths
+        self.key_paths = key_paths
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        self.verifiers = verifiers or {}
+        self._next_purge = 0.0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        path = scope['path'] if scope['type'] == 'http' and scope['method'] == 'POST' else None
+        if path not in self.webhook_paths and path not in self.key_paths:
+            await self.app(scope, receive, send)
+            return
+
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+
+        body_sent = False
+
+        async def receive_body() -> Message:
+            # The app gets the body we've already read, then anything else (i.e. disconnects) from the server
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            return await receive()
+
+        headers = Headers(scope=scope)
+        if (verify := self.verifiers.get(path)) and not verify(body, headers):
+            await self.app(scope, receive_body, send)
+            return
+
+        key = get_idempotency_key(path, body, headers.get('idempotency-key'), key_from_body=path in self.webhook_paths)
+        if key is None:
+            await self.app(scope, receive_body, send)
+            return
+
+        try:
+            existing = await asyncio.to_thread(claim_key, key, self.pending_ttl)
+            claimed = existing is None
+        except Exception as e:
+            logger.error(f'Error claiming idempotency key for {path}: {e}', exc_info=True)
+            existing, claimed = None, False
+        if existing and existing.status_code is None:
+            logger.info(f'Repeated request to {path} while the first is being processed')
+            response = JSONResponse(
+                {'status': 'error', 'message': 'The same request is already being processed'},
+                status_code=409,
+                headers={'Retry-After': '1'},
+            )
+            await response(scope, receive, send)
+            return
+        if existing:
+            logger.info(f'Repeated request to {path}, sending stored response')
+            response = Response(
+                existing.content,
+                status_code=existing.status_code,
+                media_type=existing.media_type,
+                headers={'Idempotent-Replayed': 'true'},
+            )
+            await response(scope, receive, send)
+            return
+
+        start: Message = {}
+        content = b''
+        stored = False
+
+        async def send_and_store(message: Message):
+            nonlocal start, content, stored
+            if message['type'] == 'http.response.start':
+                start = message
+            elif message['type'] == 'http.response.body':
+                content += message.get('body', b'')
+                if not message.get('more_body', False) and 200 <= start['status'] < 300:
+                    # Stored before the response is sent (and before any background tasks run) so a repeat gets the
+                    # response as soon as possible rather than a 409
+                    stored = await self._store(path, key, start, content)
+            await send(message)
+
+        try:
+            await self.app(scope, receive_body, send_and_store)
+        finally:
+            if claimed and not stored:
+                await self._release(path, key)
+
+    async def _store(self, path: str, key: str, start: Message, content: bytes) -> bool:
+        media_type = Headers(raw=start.get('headers', [])).get('content-type')
+        try:
+            await asyncio.to_thread(store_response, key, start['status'], media_type, content.decode(), self.ttl)
+            if time.monotonic() > self._next_purge:
+                self._next_purge = time.monotonic() + PURGE_INTERVAL_SECS
+                await asyncio.to_thread(purge_expired_responses)
+        except Exception as e:
+            logger.error(f'Error storing response for {path}: {e}', exc_info=True)
+            return False
+        return True
+
+    async def _release(self, path: str, key: str):
+        try:
+            await asyncio.to_thread(release_key, key)
+        except Exception as e:
+            logger.error(f'Error releasing idempotency key for {path}: {e}', exc_info=True)
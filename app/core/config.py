@@ -1,7 +1,7 @@
 from pathlib import Path
-from typing import Optional
+from typing import Literal, Optional
 
-from pydantic import Field, PostgresDsn, field_validator
+from pydantic import Field, PostgresDsn, field_validator, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 PROJECT_ROOT = Path(__file__).parent.parent.parent
@@ -25,8 +25,36 @@ class Settings(BaseSettings):
     )
     db_pool_size: int = 20
     db_max_overflow: int = 15
-    db_pool_pre_ping: bool = True
+    # How pooled connections are checked to still be alive: 'pre_ping' pings each connection as it's checked out,
+    # 'idle' only pings connections that have been idle for more than db_liveness_idle_secs, and 'retry' never pings.
+    # With 'idle' and 'retry', a statement that finds its connection dead is run again on a new connection, if it was
+    # the first in its transaction.
+    db_liveness: Literal['pre_ping', 'idle', 'retry'] = 'pre_ping'
+    db_liveness_idle_secs: float = 30
     db_pool_recycle: int = 3600
+    # Connections checked out for longer than this are logged, see /debug/pool
+    db_long_held_secs: float = 1
+    # A read replica for read-only endpoints, with its own pool, so they don't compete with webhooks for the
+    # primary's connections. Without one they read from the primary.
+    database_replica_url: Optional[PostgresDsn] = Field(None, validation_alias='DATABASE_REPLICA_URL')
+    db_replica_pool_size: int = 10
+    db_replica_max_overflow: int = 10
+
+    # Limits on the traffic to webhook and booking endpoints, rates and bursts are per source IP
+    webhook_rate_limit: float = 20  # requests per second
+    webhook_burst_limit: int = 200
+    webhook_max_concurrency: int = 10
+    booking_rate_limit: float = 1
+    booking_burst_limit: int = 10
+    booking_max_concurrency: int = 10
+    # Endpoints shed load (503) when the DB pool or the TC2 event queue are this full
+    shed_db_pool_usage: float = 0.9
+    shed_tc2_event_backlog: int = 10_000
+
+    # How long responses to webhooks and bookings are kept to answer repeat deliveries, and how long a request being
+    # processed holds its key (in case it never finishes) before repeats are processed again
+    idempotency_ttl_secs: int = 24 * 3600
+    idempotency_pending_secs: int = 120
 
     # Sentry
     sentry_dsn: Optional[str] = None
@@ -42,6 +70,9 @@ class Settings(BaseSettings):
     # How long a support link is valid for
     support_ttl_days: int = 4
 
+    # How often the admins each round-robin chooses from are reloaded, for changes made by other processes
+    admin_routing_ttl_secs: int = 60
+
     meeting_dur_mins: int = 30
     meeting_buffer_mins: int = 15
     meeting_min_start: str = '10:00'
@@ -49,7 +80,12 @@ class Settings(BaseSettings):
 
     # TC2
     tc2_api_key: str = 'test-key'
+    # Used to sign webhooks from TC2, required unless in dev mode (where webhooks' signatures aren't checked)
+    tc2_shared_key: Optional[str] = None
     tc2_base_url: str = 'https://secure.tutorcruncher.com'
+    # Webhook events are processed by this many workers, each taking up to tc2_event_batch_size events at a time
+    tc2_event_workers: int = 4
+    tc2_event_batch_size: int = 50
 
     # Pipedrive
     pd_api_key: str = 'test-key'
@@ -59,6 +95,14 @@ class Settings(BaseSettings):
     pd_api_rate_period: int = 2  # seconds
     pd_api_enable_retry: bool = False
     pd_api_max_retry: int = 3
+    # How often changes are pulled from Pipedrive in case webhooks were missed, 0 to not pull them
+    pd_change_feed_interval_secs: int = 300
+    # The outbox relay delivers up to pd_outbox_batch_size syncs at a time, and checks for syncs it wasn't told about
+    # (e.g. written by another process) every pd_outbox_poll_secs
+    pd_outbox_batch_size: int = 100
+    pd_outbox_poll_secs: int = 10
+    # How long a relay has to deliver the batch it's claimed, before another relay can claim it (if the first died)
+    pd_outbox_claim_secs: int = 300
 
     # Google
     g_project_id: str = 'tc-hubspot-314214'
@@ -72,14 +116,21 @@ class Settings(BaseSettings):
     g_client_x509_cert_url: str = (
         'https://www.googleapis.com/robot/v1/metadata/x509/tc-hubspot%40tc-hubspot-314214.iam.gserviceaccount.com'
     )
+    g_api_max_connections: int = 100
 
-    @field_validator('database_url', mode='before')
+    @field_validator('database_url', 'database_replica_url', mode='before')
     @classmethod
     def fix_heroku_postgres_url(cls, v) -> str:
         if isinstance(v, str) and v.startswith('postgres://'):
             return v.replace('postgres://', 'postgresql://', 1)
         return v
 
+    @model_validator(mode='after')
+    def check_tc2_shared_key(self) -> 'Settings':
+        if not self.dev_mode and not self.tc2_shared_key:
+            raise ValueError('tc2_shared_key must be set to verify TC2 webhooks outside dev mode')
+        return self
+
     @property
     def google_credentials(self):
         return {
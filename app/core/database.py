@@ -1,10 +1,18 @@
+import logging
 from contextlib import contextmanager
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import ORMExecuteState, sessionmaker
+from sqlalchemy.pool import QueuePool
 from sqlmodel import Session, SQLModel
 
 from .config import settings
+from .pool import ObservedQueuePool, ping_idle_connections, pool_stats
+
+logger = logging.getLogger('hermes.database')
 
 
 class DBSession(Session):
@@ -20,17 +28,62 @@ class DBSession(Session):
         return instance
 
 
-engine = create_engine(
-    str(settings.database_url),
-    pool_size=settings.db_pool_size,
-    max_overflow=settings.db_max_overflow,
-    pool_pre_ping=settings.db_pool_pre_ping,
-    pool_recycle=settings.db_pool_recycle,
-)
+@event.listens_for(DBSession, 'do_orm_execute')
+def _retry_on_dead_connection(state: ORMExecuteState):
+    """
+    When connections aren't pinged before every checkout, run a statement again on a new connection if its connection
+    was dead. Only if it's the first in its transaction, so nothing else was lost with the connection. Statements
+    flushed by the ORM aren't retried.
+    """
+    db = state.session
+    if settings.db_liveness == 'pre_ping' or db.in_transaction():
+        return None
+    try:
+        return state.invoke_statement()
+    except DBAPIError as e:
+        if not e.connection_invalidated:
+            raise
+        logger.warning(f'Retrying on a new connection after a dead connection: {e}')
+        db.rollback()
+        return state.invoke_statement()
+
+
+def _create_engine(url: str, pool_size: int, max_overflow: int, **kwargs) -> Engine:
+    engine = create_engine(
+        url,
+        poolclass=ObservedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_pre_ping=settings.db_liveness == 'pre_ping',
+        pool_recycle=settings.db_pool_recycle,
+        **kwargs,
+    )
+    pool_stats.attach(engine)
+    if settings.db_liveness == 'idle':
+        ping_idle_connections(engine, settings.db_liveness_idle_secs)
+    return engine
+
+
+engine = _create_engine(str(settings.database_url), settings.db_pool_size, settings.db_max_overflow)
 SessionLocal = sessionmaker(class_=DBSession, autocommit=False, autoflush=False, bind=engine)
 
 SessionCls = SessionLocal  # So that we can override in tests
 
+if settings.database_replica_url:
+    # Each read session is one read only, repeatable read transaction, so its reads are of the same snapshot even as
+    # the replica is updated
+    read_engine = _create_engine(
+        str(settings.database_replica_url),
+        settings.db_replica_pool_size,
+        settings.db_replica_max_overflow,
+        execution_options={'isolation_level': 'REPEATABLE READ', 'postgresql_readonly': True},
+    )
+else:
+    read_engine = engine
+ReadSessionLocal = sessionmaker(class_=DBSession, autocommit=False, autoflush=False, bind=read_engine)
+
+ReadSessionCls = ReadSessionLocal  # So that we can override in tests
+
 
 @contextmanager
 def get_session():
@@ -44,6 +97,34 @@ def get_session():
         db.close()
 
 
+@contextmanager
+def get_read_session():
+    """Context manager for a session reading from the replica, see `get_read_db`"""
+    db = ReadSessionCls()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def db_pool_usage() -> float:
+    """The proportion of the pool's connections (including overflow) that are checked out"""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return 0
+    return pool.checkedout() / (pool.size() + settings.db_max_overflow)
+
+
+def upsert_insert(db: Session, model):
+    """
+    Get an INSERT statement for the session's database so `on_conflict_do_*` can be used for upserts, both in
+    Postgres and in the SQLite database used by tests.
+    """
+    if db.get_bind().dialect.name == 'sqlite':
+        return sqlite_insert(model)
+    return pg_insert(model)
+
+
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
 
@@ -58,3 +139,16 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    """
+    FastAPI dependency for getting a session reading from the replica, or the primary if there isn't one. For
+    read-only endpoints, which shouldn't expect to see changes made moments before on the primary.
+    Used with Depends(get_read_db) in endpoint parameters, a request's reads all being from the one session.
+    """
+    db = ReadSessionCls()
+    try:
+        yield db
+    finally:
+        db.close()
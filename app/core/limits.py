@@ -0,0 +1,149 @@
+import logging
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger('hermes.limits')
+
+# Idle sources are forgotten once we're tracking this many
+MAX_TRACKED_SOURCES = 10_000
+
+
+@dataclass
+class Saturation:
+    """
+    A signal that something endpoints depend on (e.g. the DB pool) is overloaded, in which case they shed load rather
+    than queue behind it.
+    """
+
+    name: str
+    value: Callable[[], float]
+    limit: float
+
+    def info(self) -> dict:
+        value = self.value()
+        return {'value': value, 'limit': self.limit, 'saturated': value >= self.limit}
+
+
+class TokenBuckets:
+    """Token bucket rate limits, one bucket per source"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        # The tokens left in each source's bucket and when it was last updated
+        self._buckets: dict[str, tuple[float, float]] = {}
+
+    def take(self, source: str) -> float:
+        """Take a token from the source's bucket, returning 0 if there was one or else the seconds until there is"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(source, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[source] = tokens, now
+            return (1 - tokens) / self.rate
+
+        if source not in self._buckets and len(self._buckets) >= MAX_TRACKED_SOURCES:
+            self._prune(now)
+        self._buckets[source] = tokens - 1, now
+        return 0
+
+    def _prune(self, now: float):
+        """Forget sources whose buckets have refilled, as they're the same as new ones"""
+        refill_secs = self.burst / self.rate
+        self._buckets = {s: b for s, b in self._buckets.items() if now - b[1] < refill_secs}
+
+    def clear(self):
+        self._buckets.clear()
+
+
+@dataclass
+class EndpointLimit:
+    """The rate (per source) and concurrency limits for an endpoint, and what it should shed load on"""
+
+    rate: float
+    burst: int
+    max_concurrency: int
+    saturations: tuple[Saturation, ...] = ()
+    in_flight: int = field(default=0, init=False)
+    buckets: TokenBuckets = field(init=False)
+
+    def __post_init__(self):
+        self.buckets = TokenBuckets(self.rate, self.burst)
+
+    def info(self) -> dict:
+        return {'in_flight': self.in_flight, 'max_concurrency': self.max_concurrency}
+
+    def reset(self):
+        self.in_flight = 0
+        self.buckets.clear()
+
+
+def _error(message: str, status_code: int, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {'status': 'error', 'message': message},
+        status_code=status_code,
+        headers={'Retry-After': str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def get_source(scope: Scope) -> str:
+    """
+    The IP address the request came from. Behind Heroku's router that's the last X-Forwarded-For address, as the
+    router appends the address that connected to it.
+    """
+    for key, value in scope['headers']:
+        if key == b'x-forwarded-for':
+            return value.decode('latin-1').rsplit(',', 1)[-1].strip()
+    client = scope.get('client')
+    return client[0] if client else 'unknown'
+
+
+class IngressLimitMiddleware:
+    """
+    Limits the traffic to the given endpoints (by path):
+
+    * 503 if any of the endpoint's saturation signals are over their limit, or it's already handling
+      `max_concurrency` requests
+    * 429 if the source has sent more than `burst` requests without slowing to `rate` per second
+
+    Both include a `Retry-After` header so well behaved senders (TC2 and Pipedrive both retry webhooks) back off.
+    """
+
+    def __init__(self, app: ASGIApp, limits: dict[str, EndpointLimit]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        limit = self.limits.get(scope['path']) if scope['type'] == 'http' else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        for saturation in limit.saturations:
+            if saturation.value() >= saturation.limit:
+                logger.warning(f'Shedding request to {scope["path"]}, {saturation.name} is saturated')
+                await _error('Service overloaded', 503, 5)(scope, receive, send)
+                return
+
+        if limit.in_flight >= limit.max_concurrency:
+            logger.warning(f'Shedding request to {scope["path"]}, {limit.in_flight} requests in flight')
+            await _error('Service overloaded', 503, 1)(scope, receive, send)
+            return
+
+        # Checked last so requests we shed don't use up the source's rate limit for its retries
+        source = get_source(scope)
+        if retry_after := limit.buckets.take(source):
+            logger.warning(f'Rate limiting requests to {scope["path"]} from {source}')
+            await _error('Too many requests', 429, retry_after)(scope, receive, send)
+            return
+
+        limit.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit.in_flight -= 1
@@ -0,0 +1,208 @@
+"""
+Observing the database connection pool: how long checkouts wait for a connection, how many connections are in use and
+overflowing the pool, and how long they're held, by the route or task using them. So the pool can be sized from how
+it's used, and handlers holding a connection across slow awaits (like calls to Pipedrive) can be found.
+"""
+
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+import logfire
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DisconnectionError
+from sqlalchemy.pool import QueuePool
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .config import settings
+
+logger = logging.getLogger('hermes.pool')
+
+# The long held connections kept for /debug/pool
+MAX_LONG_HELD = 50
+
+# The request being handled, or the name of the task being run, by the code checking out connections
+_request_scope: ContextVar[Optional[Scope]] = ContextVar('pool_request_scope', default=None)
+_task_name: ContextVar[Optional[str]] = ContextVar('pool_task_name', default=None)
+
+checkout_wait_histogram = logfire.metric_histogram(
+    'db_pool_checkout_wait', unit='s', description='Time waiting to check out a connection'
+)
+held_histogram = logfire.metric_histogram('db_pool_held', unit='s', description='Time a connection was checked out')
+in_use_counter = logfire.metric_up_down_counter('db_pool_in_use', description='Connections checked out')
+overflow_counter = logfire.metric_counter('db_pool_overflow', description='Checkouts beyond the pool size')
+long_held_counter = logfire.metric_counter('db_pool_long_held', description='Connections held for too long')
+
+
+@contextmanager
+def pool_user(name: str):
+    """Tag the connections checked out inside the block with the name of the task using them"""
+    token = _task_name.set(name)
+    try:
+        yield
+    finally:
+        _task_name.reset(token)
+
+
+def current_pool_user() -> str:
+    """The task, or route (e.g. `GET /companies/{id}/`) of the request, checking out a connection"""
+    if name := _task_name.get():
+        return name
+    if scope := _request_scope.get():
+        # The route is added to the scope once the request is routed, which is before the endpoint uses the database
+        route = scope.get('route')
+        return f'{scope["method"]} {getattr(route, "path", scope["path"])}'
+    return 'unknown'
+
+
+class PoolUserMiddleware:
+    """Tags the connections checked out while handling a request with its route"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
+
+
+@dataclass
+class PoolUserStats:
+    """How a route or task has used the pool"""
+
+    checkouts: int = 0
+    in_use: int = 0
+    overflows: int = 0
+    long_held: int = 0
+    wait_secs: float = 0
+    max_wait_secs: float = 0
+    held_secs: float = 0
+    max_held_secs: float = 0
+
+    def info(self) -> dict:
+        return {
+            'checkouts': self.checkouts,
+            'in_use': self.in_use,
+            'overflows': self.overflows,
+            'long_held': self.long_held,
+            'mean_wait_ms': round(self.wait_secs / self.checkouts * 1000, 2) if self.checkouts else 0,
+            'max_wait_ms': round(self.max_wait_secs * 1000, 2),
+            'mean_held_ms': round(self.held_secs / self.checkouts * 1000, 2) if self.checkouts else 0,
+            'max_held_ms': round(self.max_held_secs * 1000, 2),
+        }
+
+
+class PoolStats:
+    """
+    Records each checkout from the pools of the engines it's attached to, by the route or task checking out. A
+    connection held for longer than `long_held_secs` is logged as a warning.
+    """
+
+    def __init__(self, long_held_secs: float):
+        self.long_held_secs = long_held_secs
+        self.users: dict[str, PoolUserStats] = {}
+        self.long_held: deque[dict] = deque(maxlen=MAX_LONG_HELD)
+        # Who checked out each connection record and when, kept here as records' info is cleared when invalidated
+        self._checked_out: dict[int, tuple[str, float]] = {}
+
+    def attach(self, engine: Engine):
+        # The engine's pool rather than the one attached to, as it's replaced when the engine is disposed
+        event.listen(engine, 'checkout', lambda *args: self._on_checkout(engine.pool, *args))
+        event.listen(engine, 'checkin', self._on_checkin)
+
+    def reset(self):
+        self.users.clear()
+        self.long_held.clear()
+
+    def _user_stats(self, user: str) -> PoolUserStats:
+        if (stats := self.users.get(user)) is None:
+            stats = self.users[user] = PoolUserStats()
+        return stats
+
+    def record_wait(self, user: str, secs: float):
+        stats = self._user_stats(user)
+        stats.wait_secs += secs
+        stats.max_wait_secs = max(stats.max_wait_secs, secs)
+        checkout_wait_histogram.record(secs, {'user': user})
+
+    def _on_checkout(self, pool, dbapi_conn, record, proxy):
+        user = current_pool_user()
+        self._checked_out[id(record)] = user, time.perf_counter()
+        stats = self._user_stats(user)
+        stats.checkouts += 1
+        stats.in_use += 1
+        in_use_counter.add(1, {'user': user})
+        if isinstance(pool, QueuePool) and pool.checkedout() > pool.size():
+            stats.overflows += 1
+            overflow_counter.add(1, {'user': user})
+
+    def _on_checkin(self, dbapi_conn, record):
+        if not (checkout := self._checked_out.pop(id(record), None)):
+            # Checked out before we were attached
+            return
+        user, checked_out = checkout
+        held = time.perf_counter() - checked_out
+        stats = self._user_stats(user)
+        stats.in_use -= 1
+        stats.held_secs += held
+        stats.max_held_secs = max(stats.max_held_secs, held)
+        in_use_counter.add(-1, {'user': user})
+        held_histogram.record(held, {'user': user})
+        if held > self.long_held_secs:
+            stats.long_held += 1
+            long_held_counter.add(1, {'user': user})
+            self.long_held.append({'user': user, 'held_ms': round(held * 1000, 2), 'at': time.time()})
+            logger.warning(f'{user} held a database connection for {held:0.2f}s')
+
+    def info(self, pool) -> dict:
+        info = {'users': {user: stats.info() for user, stats in sorted(self.users.items())}}
+        if isinstance(pool, QueuePool):
+            info.update(size=pool.size(), checked_out=pool.checkedout(), overflow=max(pool.overflow(), 0))
+        info['long_held'] = list(self.long_held)
+        return info
+
+
+pool_stats = PoolStats(settings.db_long_held_secs)
+
+
+class ObservedQueuePool(QueuePool):
+    """A QueuePool recording how long each checkout waits for a connection in `pool_stats`"""
+
+    def connect(self):
+        start = time.perf_counter()
+        conn = super().connect()
+        pool_stats.record_wait(current_pool_user(), time.perf_counter() - start)
+        return conn
+
+
+def ping_idle_connections(engine: Engine, idle_secs: float):
+    """
+    Ping a connection as it's checked out if it's been idle for more than `idle_secs`, replacing it if it's dead. Unlike
+    `pool_pre_ping` connections used more recently aren't pinged, saving a round trip for most checkouts.
+    """
+
+    @event.listens_for(engine, 'checkin')
+    def _record_checkin(dbapi_conn, record):
+        record.info['checked_in'] = time.monotonic()
+
+    @event.listens_for(engine, 'checkout')
+    def _ping_if_idle(dbapi_conn, record, proxy):
+        checked_in = record.info.get('checked_in')
+        if checked_in is None or time.monotonic() - checked_in <= idle_secs:
+            # New, or recently used
+            return
+        try:
+            engine.dialect.do_ping(dbapi_conn)
+        except Exception as e:
+            # The pool replaces the connection and checks out again
+            raise DisconnectionError(f'Idle connection is dead: {e}') from e
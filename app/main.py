@@ -6,11 +6,18 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.callbooker.views import router as callbooker_router
+from app.common.idempotency import IdempotencyMiddleware
 from app.core.config import settings
+from app.core.database import db_pool_usage, engine
+from app.core.limits import EndpointLimit, IngressLimitMiddleware, Saturation
 from app.core.logging import get_logger
+from app.core.pool import PoolUserMiddleware, pool_stats
 from app.main_app.views import router as main_app_router
+from app.pipedrive.changes import pd_change_feed
+from app.pipedrive.outbox import pd_outbox_relay
 from app.pipedrive.views import router as pipedrive_router
-from app.tc2.views import router as tc2_router
+from app.tc2.views import is_signed_tc2_webhook, router as tc2_router
+from app.tc2.worker import tc2_event_pool
 
 logger = get_logger('hermes')
 
@@ -29,9 +36,15 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info('Starting Hermes application')
     # TODO: Initialize database connections, load config, etc.
+    pd_outbox_relay.start()
+    await tc2_event_pool.start()
+    pd_change_feed.start()
     yield
     # Shutdown
     logger.info('Shutting down Hermes application')
+    await pd_change_feed.stop()
+    await tc2_event_pool.stop()
+    await pd_outbox_relay.stop()
 
 
 # Create FastAPI app
@@ -51,6 +64,47 @@ app.add_middleware(
     allow_headers=['*'],
 )
 
+# Repeat deliveries of webhooks, and double-submitted bookings sent with an Idempotency-Key, get the original response
+# without being processed again. TC2 webhooks are only stored once their signature is verified.
+app.add_middleware(
+    IdempotencyMiddleware,
+    webhook_paths={'/tc2/callback/', '/pipedrive/callback/'},
+    key_paths={'/callbooker/sales/book/', '/callbooker/support/book/'},
+    ttl=settings.idempotency_ttl_secs,
+    pending_ttl=settings.idempotency_pending_secs,
+    verifiers={'/tc2/callback/': is_signed_tc2_webhook},
+)
+
+# Limit traffic to the webhook and booking endpoints, shedding it when the DB pool or TC2 event queue are saturated
+db_pool_saturation = Saturation('db_pool_usage', db_pool_usage, settings.shed_db_pool_usage)
+tc2_backlog_saturation = Saturation(
+    'tc2_event_backlog', lambda: tc2_event_pool.backlog, settings.shed_tc2_event_backlog
+)
+ingress_limits = {
+    '/tc2/callback/': EndpointLimit(
+        settings.webhook_rate_limit,
+        settings.webhook_burst_limit,
+        settings.webhook_max_concurrency,
+        saturations=(db_pool_saturation, tc2_backlog_saturation),
+    ),
+    '/pipedrive/callback/': EndpointLimit(
+        settings.webhook_rate_limit,
+        settings.webhook_burst_limit,
+        settings.webhook_max_concurrency,
+        saturations=(db_pool_saturation,),
+    ),
+    '/callbooker/sales/book/': EndpointLimit(
+        settings.booking_rate_limit,
+        settings.booking_burst_limit,
+        settings.booking_max_concurrency,
+        saturations=(db_pool_saturation,),
+    ),
+}
+app.add_middleware(IngressLimitMiddleware, limits=ingress_limits)
+
+# Tag the DB connections each request checks out with its route, see /debug/pool
+app.add_middleware(PoolUserMiddleware)
+
 # Instrument with Logfire
 logfire.instrument_fastapi(app)
 
@@ -63,8 +117,26 @@ async def root():
 
 @app.get('/health')
 async def health():
-    """Health check endpoint"""
-    return {'status': 'healthy'}
+    """
+    Health check endpoint, including whether anything is saturated, the load on the limited endpoints and how quickly
+    syncs are being delivered to Pipedrive
+    """
+    saturation = {s.name: s.info() for s in (db_pool_saturation, tc2_backlog_saturation)}
+    return {
+        'status': 'saturated' if any(s['saturated'] for s in saturation.values()) else 'healthy',
+        'saturation': saturation,
+        'endpoints': {path: limit.info() for path, limit in ingress_limits.items()},
+        'pd_outbox': pd_outbox_relay.info(),
+    }
+
+
+@app.get('/debug/pool')
+async def debug_pool():
+    """
+    How the DB connection pool is being used: its size and the connections checked out now, and by each route and
+    task the checkouts, the time waiting for and holding connections, and the connections held for too long
+    """
+    return pool_stats.info(engine.pool)
 
 
 app.include_router(main_app_router)
@@ -4,7 +4,8 @@ from sqlmodel import select
 
 from app.core.database import DBSession
 from app.exceptions import DealCreationError
-from app.main_app.models import Company, Config, Contact, Deal, Pipeline, Stage
+from app.main_app.models import Company, Config, Contact, Deal, PipedriveOutbox, Pipeline, Stage
+from app.pipedrive.outbox import add_to_outbox
 
 logger = logging.getLogger('hermes.main_app')
 
@@ -85,6 +86,8 @@ async def get_or_create_deal(company: Company, contact: Contact, db: DBSession,
     )
 
     db.add(deal)
+    # Synced to Pipedrive with the company, through the outbox
+    add_to_outbox(db, PipedriveOutbox.ACTION_SYNC_COMPANY, company.id)
     db.commit()
     db.refresh(deal)
 
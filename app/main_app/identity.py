@@ -0,0 +1,137 @@
+"""
+Contacts' identities: their email and phone number normalised (the email lower case, the phone in E.164 format), so a
+contact from TC2, the callbooker or Pipedrive is matched to the same person from another however each wrote them.
+
+The identities are saved with the contacts, by the listeners below for contacts saved through the ORM and with
+`save_identities` for those inserted with statements.
+"""
+
+from typing import Iterable, Optional
+
+from sqlalchemy import Connection, event, insert, inspect
+from sqlmodel import delete, select
+
+from app.core.database import DBSession
+from app.main_app.models import Contact, ContactIdentity
+
+# The characters ignored in phone numbers
+PHONE_SEPARATORS = ' -().'
+
+# The international dialling codes of the countries we have customers in, for numbers written in their national format
+DIALLING_CODES = {
+    'AE': '971',
+    'AU': '61',
+    'BE': '32',
+    'CA': '1',
+    'CH': '41',
+    'DE': '49',
+    'ES': '34',
+    'FR': '33',
+    'GB': '44',
+    'HK': '852',
+    'IE': '353',
+    'IN': '91',
+    'IT': '39',
+    'NL': '31',
+    'NZ': '64',
+    'SG': '65',
+    'US': '1',
+    'ZA': '27',
+}
+
+# The fields a contact's identities are made from
+IDENTITY_FIELDS = ('email', 'phone', 'country')
+
+
+def normalise_email(email: Optional[str]) -> Optional[str]:
+    email = (email or '').strip().lower()
+    return email if '@' in email else None
+
+
+def normalise_phone(phone: Optional[str], country: Optional[str] = None) -> Optional[str]:
+    """
+    The phone number in E.164 format, so '+44 (0)20 7946-0000', '0044 20 7946 0000' and (in the UK) '020 7946 0000'
+    are all '+442079460000'. National numbers in countries we don't know the dialling code of are just the digits.
+    None if it's not a phone number.
+    """
+    # The trunk prefix written in some international numbers, +44 (0)20...
+    number = (phone or '').replace('(0)', '').translate(str.maketrans('', '', PHONE_SEPARATORS))
+    if number.startswith('+'):
+        number = f'+{number[1:]}'
+    elif number.startswith('00'):
+        number = f'+{number[2:]}'
+    elif dialling_code := DIALLING_CODES.get(country):
+        number = f'+{dialling_code}{number.removeprefix("0")}'
+    digits = number.removeprefix('+')
+    # E.164 numbers are at most 15 digits, and shorter than 7 aren't a full number anywhere
+    if not digits.isdigit() or not 7 <= len(digits) <= 15:
+        return None
+    return number
+
+
+def contact_identities(email: Optional[str], phone: Optional[str], country: Optional[str]) -> list[tuple[str, str]]:
+    """The kind and value of the identities of a contact with these details"""
+    identities = []
+    if email := normalise_email(email):
+        identities.append((ContactIdentity.KIND_EMAIL, email))
+    if phone := normalise_phone(phone, country):
+        identities.append((ContactIdentity.KIND_PHONE, phone))
+    return identities
+
+
+def save_identities(conn: Connection, contacts: Iterable[tuple[int, Optional[str], Optional[str], Optional[str]]]):
+    """Replace the identities of contacts, given as (id, email, phone, country)"""
+    contacts = list(contacts)
+    if not contacts:
+        return
+    conn.execute(delete(ContactIdentity).where(ContactIdentity.contact_id.in_([c[0] for c in contacts])))
+    rows = [
+        {'contact_id': contact_id, 'kind': kind, 'value': value}
+        for contact_id, email, phone, country in contacts
+        for kind, value in contact_identities(email, phone, country)
+    ]
+    if rows:
+        conn.execute(insert(ContactIdentity), rows)
+
+
+@event.listens_for(Contact, 'after_insert')
+def _save_new_identities(mapper, conn: Connection, contact: Contact):
+    save_identities(conn, [(contact.id, contact.email, contact.phone, contact.country)])
+
+
+@event.listens_for(Contact, 'after_update')
+def _save_changed_identities(mapper, conn: Connection, contact: Contact):
+    # Called for every modified contact in the flush, even if none of its identity fields have changed
+    attrs = inspect(contact).attrs
+    if any(attrs[f].history.has_changes() for f in IDENTITY_FIELDS):
+        save_identities(conn, [(contact.id, contact.email, contact.phone, contact.country)])
+
+
+@event.listens_for(Contact, 'after_delete')
+def _delete_identities(mapper, conn: Connection, contact: Contact):
+    # The foreign key cascades in Postgres, but not in SQLite without its foreign keys pragma
+    save_identities(conn, [(contact.id, None, None, None)])
+
+
+def find_contact(
+    db: DBSession,
+    *,
+    email: Optional[str] = None,
+    phone: Optional[str] = None,
+    country: Optional[str] = None,
+    where: tuple = (),
+) -> Optional[Contact]:
+    """
+    The latest contact with the email or, failing that, the phone number, with the `where` clauses if given.
+    `country` is where the phone number is from, for numbers in their national format.
+    """
+    for kind, value in contact_identities(email, phone, country):
+        contact = db.exec(
+            select(Contact)
+            .join(ContactIdentity, ContactIdentity.contact_id == Contact.id)
+            .where(ContactIdentity.kind == kind, ContactIdentity.value == value, *where)
+            .order_by(ContactIdentity.contact_id.desc())
+        ).first()
+        if contact:
+            return contact
+    return None
@@ -1,6 +1,7 @@
 from datetime import datetime, timezone
 from typing import ClassVar, List, Optional
 
+from sqlalchemy import JSON, Column, Index, func
 from sqlmodel import Field, Relationship, SQLModel
 
 from app.core.config import settings
@@ -261,6 +262,41 @@ class Contact(SQLModel, table=True):
         return f'{self.first_name} {self.last_name} ({self.email})'
 
 
+# Indexes for matching bookings to existing companies and contacts by name, case insensitively. Contacts are matched
+# by email and phone with their ContactIdentity.
+Index('ix_company_name_lower', func.lower(Company.name))
+Index('ix_contact_company_id_last_name_lower', Contact.company_id, func.lower(Contact.last_name))
+# For searching for companies by part of their name, the pg_trgm extension is created by the migration
+Index('ix_company_name_trgm', Company.name, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}).ddl_if(
+    dialect='postgresql'
+)
+# For walking through companies a page at a time in (name, id) order, with each of the search's filters
+Index('ix_company_name_id', Company.name, Company.id)
+Index('ix_company_country_name_id', Company.country, Company.name, Company.id)
+Index('ix_company_price_plan_name_id', Company.price_plan, Company.name, Company.id)
+Index('ix_company_tc2_status_name_id', Company.tc2_status, Company.name, Company.id)
+Index('ix_company_sales_person_id_name_id', Company.sales_person_id, Company.name, Company.id)
+Index('ix_company_support_person_id_name_id', Company.support_person_id, Company.name, Company.id)
+Index('ix_company_bdr_person_id_name_id', Company.bdr_person_id, Company.name, Company.id)
+
+
+class ContactIdentity(SQLModel, table=True):
+    """
+    A contact's email or phone number, normalised so contacts from TC2, the callbooker and Pipedrive are matched
+    however each wrote them. Kept up to date as contacts are saved, see app/main_app/identity.py.
+    """
+
+    KIND_EMAIL: ClassVar[str] = 'email'
+    KIND_PHONE: ClassVar[str] = 'phone'
+
+    __table_args__ = (Index('ix_contactidentity_kind_value_contact_id', 'kind', 'value', 'contact_id'),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    contact_id: int = Field(foreign_key='contact.id', ondelete='CASCADE', index=True)
+    kind: str = Field(max_length=10)
+    value: str = Field(max_length=255)
+
+
 class Deal(SQLModel, table=True):
     """Pipedrive Deal"""
 
@@ -345,3 +381,83 @@ class Meeting(SQLModel, table=True):
             return f'TutorCruncher demo with {self.admin.name}'
         else:
             return f'TutorCruncher support meeting with {self.admin.name}'
+
+
+class TC2Event(SQLModel, table=True):
+    """
+    A TC2 webhook event, stored when the webhook is received so it can be acknowledged straight away and processed
+    in the background.
+    """
+
+    STATUS_PENDING: ClassVar[str] = 'pending'
+    STATUS_PROCESSED: ClassVar[str] = 'processed'
+    STATUS_FAILED: ClassVar[str] = 'failed'
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    created: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    processed: Optional[datetime] = Field(default=None)
+
+    action: str = Field(max_length=255)
+    tc2_cligency_id: int = Field(index=True)
+    data: dict = Field(sa_column=Column(JSON, nullable=False))
+    status: str = Field(default=STATUS_PENDING, max_length=25, index=True)
+    error: Optional[str] = Field(default=None)
+
+
+class IdempotentResponse(SQLModel, table=True):
+    """
+    The response sent to a webhook or booking request, so that repeat deliveries of the same request are sent the
+    same response rather than being processed again.
+    """
+
+    # The hash of the request's path and its Idempotency-Key header or, without one, its body
+    key: str = Field(primary_key=True, max_length=64)
+    created: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    expires: datetime = Field(index=True)
+
+    # None while the first request is still being processed
+    status_code: Optional[int] = None
+    media_type: Optional[str] = Field(default=None, max_length=255)
+    content: str = ''
+
+
+class RoundRobinCursor(SQLModel, table=True):
+    """How many admins have been chosen from each round-robin, e.g. of the sales people selling PAYG in the US"""
+
+    key: str = Field(primary_key=True, max_length=50)
+    turns: int = Field(default=0)
+
+
+class PipedriveSyncCursor(SQLModel, table=True):
+    """How far the Pipedrive change feed has got through each entity's changes"""
+
+    entity: str = Field(primary_key=True, max_length=25)
+    # The update_time of the latest change processed
+    updated_since: datetime
+    last_run: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class PipedriveOutbox(SQLModel, table=True):
+    """
+    A change to sync to Pipedrive, written in the same transaction as the change so it can't be lost between the
+    commit and the sync. Entries are deleted once they're delivered by the outbox relay.
+    """
+
+    ACTION_SYNC_COMPANY: ClassVar[str] = 'sync_company'
+    ACTION_PURGE_COMPANY: ClassVar[str] = 'purge_company'
+    ACTION_SYNC_MEETING: ClassVar[str] = 'sync_meeting'
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    created: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    action: str = Field(max_length=25)
+    # The id of the Company or Meeting
+    object_id: int
+    # For company syncs, the fields of the company and its contacts and deals changed in Hermes, so only they're sent
+    # to Pipedrive, e.g. {'company:1': ['name'], 'contact:2': ['email'], 'deal:3': None} where None means the object
+    # is new. None when we don't know what changed, so everything is compared with Pipedrive.
+    changes: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    attempts: int = Field(default=0)
+    error: Optional[str] = Field(default=None)
+    # Until when the entry is being delivered by the relay that claimed it, so no other relay delivers it too
+    claimed_until: Optional[datetime] = Field(default=None)
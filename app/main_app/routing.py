@@ -0,0 +1,178 @@
+"""
+Which admins each round-robin chooses from: a table of the sales people for each price plan and region, and the
+support people. It's loaded once and reloaded when admins change, so choosing an admin doesn't query them.
+"""
+
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import event
+from sqlmodel import select
+
+from app.core.config import settings
+from app.core.database import DBSession
+from app.main_app.models import Admin, Company
+
+logger = logging.getLogger('hermes.main_app')
+
+EU_COUNTRIES = frozenset(
+    {
+        'MD',
+        'BG',
+        'DE',
+        'AL',
+        'ME',
+        'ES',
+        'SE',
+        'AD',
+        'MT',
+        'CZ',
+        'GB',
+        'GI',
+        'CY',
+        'MC',
+        'RU',
+        'IE',
+        'FR',
+        'BY',
+        'PT',
+        'HR',
+        'LI',
+        'HU',
+        'IS',
+        'PL',
+        'CH',
+        'MK',
+        'XK',
+        'BE',
+        'RS',
+        'NL',
+        'DK',
+        'LU',
+        'FO',
+        'SI',
+        'UA',
+        'FI',
+        'AT',
+        'BA',
+        'GR',
+        'GG',
+        'EE',
+        'SM',
+        'VA',
+        'IT',
+        'SK',
+        'LT',
+        'IM',
+        'NO',
+        'LV',
+        'RO',
+        'SJ',
+        'JE',
+        'AX',
+    }
+)
+
+# The regions sales people sell in, and the flag on Admin saying whether they sell there
+REGION_FLAGS = {
+    'us': 'sells_us',
+    'gb': 'sells_gb',
+    'au': 'sells_au',
+    'ca': 'sells_ca',
+    'eu': 'sells_eu',
+    'row': 'sells_row',
+}
+# The flag on Admin saying whether they sell each price plan
+PLAN_FLAGS = {
+    Company.PP_PAYG: 'sells_payg',
+    Company.PP_STARTUP: 'sells_startup',
+    Company.PP_ENTERPRISE: 'sells_enterprise',
+}
+
+
+def country_region(country_code: str) -> str:
+    """The region sales people sell a country in"""
+    if country_code in ('US', 'GB', 'AU', 'CA'):
+        return country_code.lower()
+    if country_code in EU_COUNTRIES:
+        return 'eu'
+    return 'row'
+
+
+def admin_data(admin: Admin) -> dict:
+    return {
+        'id': admin.id,
+        'first_name': admin.first_name,
+        'last_name': admin.last_name,
+        'email': admin.email,
+        'tc2_admin_id': admin.tc2_admin_id,
+        'pd_owner_id': admin.pd_owner_id,
+    }
+
+
+class AdminRouting:
+    """
+    The admins each round-robin chooses from, in the order they take turns, as `admin_data` dicts. Reloaded when
+    admins are changed by this process, and every `ttl` seconds for changes by others.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        # The key of the round-robin and its admins, for each price plan and region
+        self._sales: dict[tuple[str, str], tuple[str, tuple[dict, ...]]] = {}
+        self._support: tuple[dict, ...] = ()
+        self._loaded: Optional[float] = None
+
+    def invalidate(self):
+        self._loaded = None
+
+    def _load(self, db: DBSession):
+        admins = db.exec(select(Admin).where(Admin.is_sales_person | Admin.is_support_person).order_by(Admin.id)).all()
+        sales = {}
+        for plan, plan_flag in PLAN_FLAGS.items():
+            plan_admins = [a for a in admins if a.is_sales_person and getattr(a, plan_flag)]
+            for region, region_flag in REGION_FLAGS.items():
+                if regional_admins := [a for a in plan_admins if getattr(a, region_flag)]:
+                    sales[plan, region] = f'sales:{plan}:{region}', tuple(map(admin_data, regional_admins))
+                else:
+                    # No one sells the plan in the region, so it's shared by everyone who sells the plan
+                    sales[plan, region] = f'sales:{plan}', tuple(map(admin_data, plan_admins))
+        self._sales = sales
+        self._support = tuple(admin_data(a) for a in admins if a.is_support_person)
+        self._loaded = time.monotonic()
+        logger.info(f'Loaded {len(admins)} admins for the round-robins')
+
+    def _ensure_loaded(self, db: DBSession):
+        if self._loaded is None or time.monotonic() - self._loaded > self.ttl:
+            self._load(db)
+
+    def sales_people(self, db: DBSession, plan: str, region: str) -> tuple[str, tuple[dict, ...]]:
+        """The key of the round-robin of sales people for the price plan and region, and its admins"""
+        self._ensure_loaded(db)
+        return self._sales[plan, region]
+
+    def support_people(self, db: DBSession) -> tuple[dict, ...]:
+        self._ensure_loaded(db)
+        return self._support
+
+
+admin_routing = AdminRouting(settings.admin_routing_ttl_secs)
+
+
+@event.listens_for(DBSession, 'after_flush')
+def _record_admin_changes(db: DBSession, flush_context):
+    if any(isinstance(obj, Admin) for obj in (*db.new, *db.dirty, *db.deleted)):
+        db.info['admins_changed'] = True
+
+
+@event.listens_for(DBSession, 'after_commit')
+def _reload_changed_admins(db: DBSession):
+    # Only once they're committed, or they could be reloaded before they are
+    if db.info.pop('admins_changed', False):
+        admin_routing.invalidate()
+
+
+@event.listens_for(DBSession, 'after_rollback')
+def _discard_admin_changes(db: DBSession):
+    db.info.pop('admins_changed', None)
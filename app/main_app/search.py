@@ -0,0 +1,131 @@
+"""
+Searching companies: by a fixed set of typed filters, each backed by an index, a page at a time in (name, id) order.
+
+Pages are fetched with keyset pagination, the cursor being the (name, id) of the last company on the previous page, so
+each page is read from the index where the last one stopped rather than counting past the companies before it.
+"""
+
+import base64
+import json
+from typing import Iterator, Literal, Optional
+
+from fastapi import HTTPException
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy import Select, func, tuple_
+from sqlmodel import select
+
+from app.core.database import get_read_session
+from app.main_app.models import Company
+
+# The columns returned for each company
+COMPANY_COLUMNS = (
+    Company.id,
+    Company.name,
+    Company.pd_org_id,
+    Company.tc2_cligency_id,
+    Company.tc2_agency_id,
+    Company.country,
+    Company.price_plan,
+)
+
+# The companies are read from the database this many at a time as they're streamed
+STREAM_BATCH_SIZE = 200
+
+
+class CompanySearch(BaseModel):
+    """The filters companies can be searched by, anything else is rejected"""
+
+    model_config = ConfigDict(extra='forbid')
+
+    # The whole name, case insensitively
+    name: Optional[str] = None
+    # The start of the name, case insensitively
+    name_prefix: Optional[str] = Field(default=None, min_length=1)
+    # Part of the name, case insensitively. Found with the name's trigram index, so at least a trigram long.
+    q: Optional[str] = Field(default=None, min_length=3)
+    country: Optional[str] = Field(default=None, max_length=2)
+    price_plan: Optional[Literal['payg', 'startup', 'enterprise']] = None
+    tc2_status: Optional[str] = None
+    sales_person_id: Optional[int] = None
+    support_person_id: Optional[int] = None
+    bdr_person_id: Optional[int] = None
+    pd_org_id: Optional[int] = None
+    tc2_cligency_id: Optional[int] = None
+    tc2_agency_id: Optional[int] = None
+
+    # The cursor of the page to start from, from the previous page's `next`
+    after: Optional[str] = None
+    limit: int = Field(default=100, ge=1, le=1000)
+
+
+# The filters that are an equality check on their column
+EQUALITY_FILTERS = (
+    'country',
+    'price_plan',
+    'tc2_status',
+    'sales_person_id',
+    'support_person_id',
+    'bdr_person_id',
+    'pd_org_id',
+    'tc2_cligency_id',
+    'tc2_agency_id',
+)
+
+
+def encode_cursor(name: str, company_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([name, company_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    try:
+        name, company_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=422, detail='Invalid cursor')
+    if not isinstance(name, str) or not isinstance(company_id, int):
+        raise HTTPException(status_code=422, detail='Invalid cursor')
+    return name, company_id
+
+
+def search_statement(search: CompanySearch) -> Select:
+    """Select the companies matching the search, in (name, id) order"""
+    stmt = select(*COMPANY_COLUMNS)
+    for field in EQUALITY_FILTERS:
+        if (value := getattr(search, field)) is not None:
+            stmt = stmt.where(getattr(Company, field) == value)
+    if search.name is not None:
+        # With the lower(name) index
+        stmt = stmt.where(func.lower(Company.name) == func.lower(search.name))
+    # Both with the name's trigram index in Postgres
+    if search.name_prefix is not None:
+        stmt = stmt.where(Company.name.istartswith(search.name_prefix, autoescape=True))
+    if search.q is not None:
+        stmt = stmt.where(Company.name.icontains(search.q, autoescape=True))
+    return stmt.order_by(Company.name, Company.id)
+
+
+def stream_companies(search: CompanySearch, after: Optional[tuple[str, int]]) -> Iterator[str]:
+    """
+    Stream a page of the companies matching the search, after the (name, id) of the cursor, as JSON:
+    `{"companies": [...], "next": cursor}`, `next` being the cursor of the next page or null if it's the last. They're
+    read a batch at a time, so the page is never all in memory at once.
+    """
+    stmt = search_statement(search)
+    remaining = search.limit
+    yield '{"companies": ['
+    first = True
+    with get_read_session() as db:
+        while remaining:
+            size = min(remaining, STREAM_BATCH_SIZE)
+            batch_stmt = stmt.where(tuple_(Company.name, Company.id) > after) if after else stmt
+            # One more than we need, to know if there are more
+            rows = db.exec(batch_stmt.limit(size + 1)).all()
+            for row in rows[:size]:
+                yield ('' if first else ', ') + json.dumps(dict(row._mapping))
+                first = False
+            if len(rows) <= size:
+                # That was the last of the companies
+                after = None
+                break
+            after = rows[size - 1].name, rows[size - 1].id
+            remaining -= size
+    yield f'], "next": {json.dumps(encode_cursor(*after) if after else None)}}}'
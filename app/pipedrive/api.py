@@ -1,6 +1,6 @@
 import asyncio
 import logging
-from typing import Optional
+from typing import AsyncIterator, Optional
 
 import httpx
 import logfire
@@ -98,6 +98,21 @@ async def pipedrive_request(
         return response.json()
 
 
+async def iter_pages(endpoint: str, page_size: int = 500, **query_params) -> AsyncIterator[list[dict]]:
+    """Get the objects from one of the list endpoints a page at a time, following its cursors"""
+    cursor = None
+    while True:
+        params = {**query_params, 'limit': page_size}
+        if cursor:
+            params['cursor'] = cursor
+        result = await pipedrive_request(endpoint, method='GET', query_params=params)
+        if data := result.get('data'):
+            yield data
+        cursor = (result.get('additional_data') or {}).get('next_cursor')
+        if not cursor:
+            return
+
+
 async def create_organisation(org_data: dict) -> dict:
     """Create organization in Pipedrive using v2 API"""
     return await pipedrive_request('organizations', method='POST', data=org_data)
@@ -156,6 +171,11 @@ async def create_activity(activity_data: dict) -> dict:
     return await pipedrive_request('activities', method='POST', data=activity_data)
 
 
+def is_gone(exc: Exception) -> bool:
+    """Whether an error from a Pipedrive request is because the object has been deleted (a 404 or 410)"""
+    return isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code in (404, 410)
+
+
 def get_changed_fields(old_data: Optional[dict], new_data: dict) -> dict:
     """
     Compare old and new data to find changed fields.
@@ -0,0 +1,131 @@
+"""
+The Pipedrive change feed: an incremental pull of recently updated objects, so changes whose webhooks were missed
+still reach Hermes.
+
+For each entity we store the update_time of the latest change processed and ask Pipedrive only for objects updated
+since then, oldest first, so each run is a few API calls rather than a full scan (see reconcile.py for that).
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.core.config import settings
+from app.core.database import get_session
+from app.core.pool import pool_user
+from app.main_app.models import PipedriveSyncCursor
+from app.pipedrive import api
+from app.pipedrive.process import PD_ENTITIES
+
+logger = logging.getLogger('hermes.pipedrive')
+
+# The order entities are pulled in, so the pipelines, stages, organizations and persons a deal refers to are in
+# Hermes before it is. Pipedrive only filters and sorts by update_time for the larger entities, the pipelines and
+# stages are few enough to get them all and filter them here.
+CHANGE_FEED_ENDPOINTS = {
+    'pipeline': ('pipelines', False),
+    'stage': ('stages', False),
+    'organization': ('organizations', True),
+    'person': ('persons', True),
+    'deal': ('deals', True),
+}
+
+
+def _utc(dt: datetime) -> datetime:
+    # Naive datetimes (from SQLite, or Pipedrive's v1 format) are UTC
+    return dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _update_time(pd_data: dict) -> Optional[datetime]:
+    if update_time := pd_data.get('update_time'):
+        return _utc(datetime.fromisoformat(update_time))
+    return None
+
+
+async def pull_changes(entity: str) -> int:
+    """
+    Process the entity's objects updated in Pipedrive since the last pull, returning how many there were. The first
+    pull just records the time to start from, a full reconcile is the way to catch up on older changes.
+    """
+    with get_session() as db:
+        cursor = db.get(PipedriveSyncCursor, entity)
+        if not cursor:
+            db.add(PipedriveSyncCursor(entity=entity, updated_since=datetime.now(timezone.utc)))
+            db.commit()
+            logger.info(f'Started the Pipedrive change feed for {entity}')
+            return 0
+        updated_since = _utc(cursor.updated_since)
+
+    endpoint, server_filtered = CHANGE_FEED_ENDPOINTS[entity]
+    query_params = {}
+    if server_filtered:
+        query_params = {
+            'updated_since': updated_since.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'sort_by': 'update_time',
+            'sort_direction': 'asc',
+        }
+    pd_model, processor_cls = PD_ENTITIES[entity]
+
+    count = 0
+    async for pd_page in api.iter_pages(endpoint, **query_params):
+        # updated_since includes objects updated at that exact time, which we've already processed
+        changed = [(d, t) for d in pd_page if (t := _update_time(d)) and t > updated_since]
+        if not changed:
+            continue
+
+        with get_session() as db:
+            processor = processor_cls(db)
+            for pd_data, update_time in sorted(changed, key=lambda c: c[1]):
+                try:
+                    await processor.process(None, pd_model.model_validate(pd_data))
+                except Exception as e:
+                    # Not retried, or the feed would be stuck on it. The next reconcile will find it.
+                    logger.error(f'Error processing Pipedrive {entity} {pd_data.get("id")} change: {e}', exc_info=True)
+                    db.rollback()
+            cursor = db.get(PipedriveSyncCursor, entity)
+            cursor.updated_since = max(_utc(cursor.updated_since), *(t for _, t in changed))
+            cursor.last_run = datetime.now(timezone.utc)
+            db.add(cursor)
+            db.commit()
+        count += len(changed)
+
+    if count:
+        logger.info(f'Processed {count} Pipedrive {entity} changes')
+    return count
+
+
+class PipedriveChangeFeed:
+    """Pulls each entity's changes from Pipedrive every `interval` seconds"""
+
+    def __init__(self, interval: int):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if self.interval:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f'Started the Pipedrive change feed, pulling every {self.interval}s')
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            for entity in CHANGE_FEED_ENDPOINTS:
+                try:
+                    with pool_user(f'pd_change_feed:{entity}'):
+                        await pull_changes(entity)
+                except Exception as e:
+                    logger.error(f'Error pulling Pipedrive {entity} changes: {e}', exc_info=True)
+            await asyncio.sleep(self.interval)
+
+
+pd_change_feed = PipedriveChangeFeed(settings.pd_change_feed_interval_secs)
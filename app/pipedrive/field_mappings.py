@@ -5,14 +5,23 @@ This single source of truth is used for both:
 1. Building Pydantic models with validation_alias (incoming webhooks)
 2. Mapping data to send to Pipedrive (outgoing sync)
 
-Field mappings can be overridden by creating a field_mappings_override.py file in the project root.
+Field mappings can be overridden by creating a field_mappings_override.py file in the project root. Once any
+overrides are applied, the maps are compiled into tuples of PDCustomField, so syncing an object doesn't need to work
+out how to get and format each field's value.
 """
 
 import logging
 import os
 import sys
+import typing
+from datetime import datetime
+from operator import attrgetter
+from typing import Any, Callable, NamedTuple, Optional
+
+from sqlmodel import SQLModel
 
 from app.core.config import PROJECT_ROOT
+from app.main_app.models import Company, Contact, Deal
 
 logger = logging.getLogger('hermes.pipedrive')
 
@@ -82,3 +91,74 @@ if os.path.exists(override_path):
             CONTACT_PD_FIELD_MAP.update(field_mappings_override.CONTACT_PD_FIELD_MAP)
 
         logger.info(f'Loaded field mapping overrides from {override_path}')
+
+
+# Fields that are integers in Hermes but text fields in Pipedrive
+_PD_TEXT_FIELDS = {'hermes_id', 'paid_invoice_count'}
+
+
+class PDCustomField(NamedTuple):
+    """A field map entry, with how to get its value from the Hermes object and format it for Pipedrive"""
+
+    name: str
+    pd_field_id: str
+    get: Callable[[Any], Any]
+    serialize: Optional[Callable[[Any], Any]]
+
+
+def _date_str(value: datetime) -> str:
+    return value.date().isoformat()
+
+
+def _none(obj: Any) -> None:
+    return None
+
+
+def _compile_field_map(
+    field_map: dict[str, str], model: type[SQLModel], getters: Optional[dict[str, Callable[[Any], Any]]] = None
+) -> tuple[PDCustomField, ...]:
+    getters = {'hermes_id': attrgetter('id'), **(getters or {})}
+    fields = []
+    for name, pd_field_id in field_map.items():
+        field_info = model.model_fields.get(name)
+        annotation_args = typing.get_args(field_info.annotation) if field_info else ()
+        if name in _PD_TEXT_FIELDS:
+            serialize = str
+        elif field_info and datetime in (field_info.annotation, *annotation_args):
+            serialize = _date_str
+        else:
+            serialize = None
+        if name in getters:
+            get = getters[name]
+        elif hasattr(model, name):
+            get = attrgetter(name)
+        else:
+            # A field in an override map that Hermes doesn't have
+            get = _none
+        fields.append(PDCustomField(name, pd_field_id, get, serialize))
+    return tuple(fields)
+
+
+def _deal_company_getter(name: str) -> Callable[[Deal], Any]:
+    get = attrgetter(name)
+    return lambda deal: get(deal.company) if deal.company else None
+
+
+COMPANY_PD_FIELDS = _compile_field_map(COMPANY_PD_FIELD_MAP, Company)
+CONTACT_PD_FIELDS = _compile_field_map(CONTACT_PD_FIELD_MAP, Contact)
+# The deal's TC2 fields are always the company's
+DEAL_PD_FIELDS = _compile_field_map(
+    DEAL_PD_FIELD_MAP,
+    Deal,
+    {name: _deal_company_getter(name) for name in ('tc2_cligency_url', 'paid_invoice_count')},
+)
+
+
+def build_custom_fields(fields: tuple[PDCustomField, ...], obj: SQLModel) -> dict[str, Any]:
+    """The custom_fields to send to Pipedrive for the object, skipping empty values"""
+    custom_fields = {}
+    for name, pd_field_id, get, serialize in fields:
+        value = get(obj)
+        if value is not None and value != '':
+            custom_fields[pd_field_id] = serialize(value) if serialize else value
+    return custom_fields
@@ -0,0 +1,49 @@
+"""
+Loading the objects synced to Pipedrive together with the objects their Pipedrive data is built from, in one query,
+rather than lazy loading each of them with a query of its own as the data is built.
+
+They're all many-to-one, so are joined onto the object's query rather than loaded with a query per relationship.
+"""
+
+from typing import Optional
+
+from sqlalchemy.orm import joinedload
+
+from app.core.database import DBSession
+from app.main_app.models import Company, Contact, Deal, Meeting
+
+# The owner
+COMPANY_LOAD = (joinedload(Company.sales_person),)
+# The organisation and its owner
+CONTACT_LOAD = (joinedload(Contact.company).joinedload(Company.sales_person),)
+# The organisation, person, owner, pipeline and stage, the organisation also being where the TC2 custom fields are from
+DEAL_LOAD = (
+    joinedload(Deal.company),
+    joinedload(Deal.contact),
+    joinedload(Deal.admin),
+    joinedload(Deal.pipeline),
+    joinedload(Deal.stage),
+)
+# The participant, organisation, owner and deal
+MEETING_LOAD = (
+    joinedload(Meeting.contact),
+    joinedload(Meeting.company),
+    joinedload(Meeting.admin),
+    joinedload(Meeting.deal),
+)
+
+
+def load_company(db: DBSession, company_id: int) -> Optional[Company]:
+    return db.get(Company, company_id, options=COMPANY_LOAD)
+
+
+def load_contact(db: DBSession, contact_id: int) -> Optional[Contact]:
+    return db.get(Contact, contact_id, options=CONTACT_LOAD)
+
+
+def load_deal(db: DBSession, deal_id: int) -> Optional[Deal]:
+    return db.get(Deal, deal_id, options=DEAL_LOAD)
+
+
+def load_meeting(db: DBSession, meeting_id: int) -> Optional[Meeting]:
+    return db.get(Meeting, meeting_id, options=MEETING_LOAD)
@@ -1,32 +1,28 @@
 from datetime import date
-from typing import Any, Optional
+from typing import Any, Generic, Optional, TypeVar
 
-from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+from pydantic import AliasChoices, AliasPath, BaseModel, ConfigDict, Field, field_validator, model_validator
 
-from app.pipedrive.field_mappings import COMPANY_PD_FIELD_MAP, CONTACT_PD_FIELD_MAP, DEAL_PD_FIELD_MAP
+from app.pipedrive.field_mappings import COMPANY_PD_FIELDS, CONTACT_PD_FIELDS, DEAL_PD_FIELDS, PDCustomField
+
+
+def custom_field(fields: tuple[PDCustomField, ...], name: str) -> AliasChoices:
+    """
+    The validation alias for the Pipedrive custom field `name` in the compiled field map, so the models read the same
+    fields (with any overrides) that syncing sends. Pipedrive v2 webhooks nest custom fields as
+    {'custom_fields': {field_id: {'type': 'varchar', 'value': value}}} (or just {field_id: value} for some types),
+    while older payloads have them at the top level. Pydantic looks up only the fields in the field maps, so the rest
+    of `custom_fields` is never touched.
+    """
+    [field_id] = [f.pd_field_id for f in fields if f.name == name]
+    return AliasChoices(AliasPath('custom_fields', field_id, 'value'), AliasPath('custom_fields', field_id), field_id)
 
 
 class _HermesModel(BaseModel):
-    @model_validator(mode='before')
-    @classmethod
-    def flatten_custom_fields(cls, data: Any) -> Any:
-        """
-        Flatten Pipedrive v2 webhook custom_fields structure.
+    """Base for the Pipedrive objects we get in webhooks and API responses"""
 
-        Pipedrive v2 sends: {'field_id': {'type': 'varchar', 'value': 'actual_value'}}
-        We need: {'field_id': 'actual_value'}
-        """
-        if isinstance(data, dict) and 'custom_fields' in data:
-            custom_fields = data.get('custom_fields', {})
-            if isinstance(custom_fields, dict):
-                flattened = {}
-                for field_id, field_data in custom_fields.items():
-                    if isinstance(field_data, dict) and 'value' in field_data:
-                        flattened[field_id] = field_data['value']
-                    else:
-                        flattened[field_id] = field_data
-                data.update(flattened)
-        return data
+
+PDModel = TypeVar('PDModel', bound=_HermesModel)
 
 
 class Organisation(_HermesModel):
@@ -39,32 +35,44 @@ class Organisation(_HermesModel):
 
     # Custom fields - reference the centralized mapping
     # hermes_id can be string when Pipedrive merges entities (e.g., "123, 456")
-    hermes_id: Optional[int | str] = Field(default=None, validation_alias=COMPANY_PD_FIELD_MAP['hermes_id'])
+    hermes_id: Optional[int | str] = Field(default=None, validation_alias=custom_field(COMPANY_PD_FIELDS, 'hermes_id'))
     paid_invoice_count: Optional[int | str] = Field(
-        default=0, validation_alias=COMPANY_PD_FIELD_MAP['paid_invoice_count']
+        default=0, validation_alias=custom_field(COMPANY_PD_FIELDS, 'paid_invoice_count')
+    )
+    tc2_cligency_url: Optional[str] = Field(
+        default=None, validation_alias=custom_field(COMPANY_PD_FIELDS, 'tc2_cligency_url')
+    )
+    tc2_status: Optional[str] = Field(default=None, validation_alias=custom_field(COMPANY_PD_FIELDS, 'tc2_status'))
+    website: Optional[str] = Field(default=None, validation_alias=custom_field(COMPANY_PD_FIELDS, 'website'))
+    price_plan: Optional[str] = Field(default=None, validation_alias=custom_field(COMPANY_PD_FIELDS, 'price_plan'))
+    estimated_income: Optional[str] = Field(
+        default=None, validation_alias=custom_field(COMPANY_PD_FIELDS, 'estimated_income')
+    )
+    support_person_id: Optional[int] = Field(
+        default=None, validation_alias=custom_field(COMPANY_PD_FIELDS, 'support_person_id')
+    )
+    bdr_person_id: Optional[int] = Field(
+        default=None, validation_alias=custom_field(COMPANY_PD_FIELDS, 'bdr_person_id')
     )
-    tc2_cligency_url: Optional[str] = Field(default=None, validation_alias=COMPANY_PD_FIELD_MAP['tc2_cligency_url'])
-    tc2_status: Optional[str] = Field(default=None, validation_alias=COMPANY_PD_FIELD_MAP['tc2_status'])
-    website: Optional[str] = Field(default=None, validation_alias=COMPANY_PD_FIELD_MAP['website'])
-    price_plan: Optional[str] = Field(default=None, validation_alias=COMPANY_PD_FIELD_MAP['price_plan'])
-    estimated_income: Optional[str] = Field(default=None, validation_alias=COMPANY_PD_FIELD_MAP['estimated_income'])
-    support_person_id: Optional[int] = Field(default=None, validation_alias=COMPANY_PD_FIELD_MAP['support_person_id'])
-    bdr_person_id: Optional[int] = Field(default=None, validation_alias=COMPANY_PD_FIELD_MAP['bdr_person_id'])
     signup_questionnaire: Optional[str] = Field(
-        default=None, validation_alias=COMPANY_PD_FIELD_MAP['signup_questionnaire']
+        default=None, validation_alias=custom_field(COMPANY_PD_FIELDS, 'signup_questionnaire')
+    )
+    utm_source: Optional[str] = Field(default=None, validation_alias=custom_field(COMPANY_PD_FIELDS, 'utm_source'))
+    utm_campaign: Optional[str] = Field(default=None, validation_alias=custom_field(COMPANY_PD_FIELDS, 'utm_campaign'))
+    created: Optional[date] = Field(default=None, validation_alias=custom_field(COMPANY_PD_FIELDS, 'created'))
+    pay0_dt: Optional[date] = Field(default=None, validation_alias=custom_field(COMPANY_PD_FIELDS, 'pay0_dt'))
+    pay1_dt: Optional[date] = Field(default=None, validation_alias=custom_field(COMPANY_PD_FIELDS, 'pay1_dt'))
+    pay3_dt: Optional[date] = Field(default=None, validation_alias=custom_field(COMPANY_PD_FIELDS, 'pay3_dt'))
+    gclid: Optional[str] = Field(default=None, validation_alias=custom_field(COMPANY_PD_FIELDS, 'gclid'))
+    gclid_expiry_dt: Optional[date] = Field(
+        default=None, validation_alias=custom_field(COMPANY_PD_FIELDS, 'gclid_expiry_dt')
     )
-    utm_source: Optional[str] = Field(default=None, validation_alias=COMPANY_PD_FIELD_MAP['utm_source'])
-    utm_campaign: Optional[str] = Field(default=None, validation_alias=COMPANY_PD_FIELD_MAP['utm_campaign'])
-    created: Optional[date] = Field(default=None, validation_alias=COMPANY_PD_FIELD_MAP['created'])
-    pay0_dt: Optional[date] = Field(default=None, validation_alias=COMPANY_PD_FIELD_MAP['pay0_dt'])
-    pay1_dt: Optional[date] = Field(default=None, validation_alias=COMPANY_PD_FIELD_MAP['pay1_dt'])
-    pay3_dt: Optional[date] = Field(default=None, validation_alias=COMPANY_PD_FIELD_MAP['pay3_dt'])
-    gclid: Optional[str] = Field(default=None, validation_alias=COMPANY_PD_FIELD_MAP['gclid'])
-    gclid_expiry_dt: Optional[date] = Field(default=None, validation_alias=COMPANY_PD_FIELD_MAP['gclid_expiry_dt'])
     email_confirmed_dt: Optional[date] = Field(
-        default=None, validation_alias=COMPANY_PD_FIELD_MAP['email_confirmed_dt']
+        default=None, validation_alias=custom_field(COMPANY_PD_FIELDS, 'email_confirmed_dt')
+    )
+    card_saved_dt: Optional[date] = Field(
+        default=None, validation_alias=custom_field(COMPANY_PD_FIELDS, 'card_saved_dt')
     )
-    card_saved_dt: Optional[date] = Field(default=None, validation_alias=COMPANY_PD_FIELD_MAP['card_saved_dt'])
 
     model_config = ConfigDict(populate_by_name=True)
 
@@ -90,7 +98,7 @@ class Person(_HermesModel):
 
     # Custom fields - reference the centralized mapping
     # hermes_id can be string when Pipedrive merges entities (e.g., "123, 456")
-    hermes_id: Optional[int | str] = Field(default=None, validation_alias=CONTACT_PD_FIELD_MAP['hermes_id'])
+    hermes_id: Optional[int | str] = Field(default=None, validation_alias=custom_field(CONTACT_PD_FIELDS, 'hermes_id'))
 
     @model_validator(mode='after')
     def parse_name(self) -> 'Person':
@@ -163,20 +171,28 @@ class PDDeal(_HermesModel):
 
     # Custom fields - reference the centralized mapping
     # hermes_id can be string when Pipedrive merges entities (e.g., "123, 456")
-    hermes_id: Optional[int | str] = Field(default=None, validation_alias=DEAL_PD_FIELD_MAP['hermes_id'])
-    support_person_id: Optional[int] = Field(default=None, validation_alias=DEAL_PD_FIELD_MAP['support_person_id'])
-    tc2_cligency_url: Optional[str] = Field(default=None, validation_alias=DEAL_PD_FIELD_MAP['tc2_cligency_url'])
+    hermes_id: Optional[int | str] = Field(default=None, validation_alias=custom_field(DEAL_PD_FIELDS, 'hermes_id'))
+    support_person_id: Optional[int] = Field(
+        default=None, validation_alias=custom_field(DEAL_PD_FIELDS, 'support_person_id')
+    )
+    tc2_cligency_url: Optional[str] = Field(
+        default=None, validation_alias=custom_field(DEAL_PD_FIELDS, 'tc2_cligency_url')
+    )
     signup_questionnaire: Optional[str] = Field(
-        default=None, validation_alias=DEAL_PD_FIELD_MAP['signup_questionnaire']
+        default=None, validation_alias=custom_field(DEAL_PD_FIELDS, 'signup_questionnaire')
+    )
+    utm_campaign: Optional[str] = Field(default=None, validation_alias=custom_field(DEAL_PD_FIELDS, 'utm_campaign'))
+    utm_source: Optional[str] = Field(default=None, validation_alias=custom_field(DEAL_PD_FIELDS, 'utm_source'))
+    bdr_person_id: Optional[int] = Field(default=None, validation_alias=custom_field(DEAL_PD_FIELDS, 'bdr_person_id'))
+    paid_invoice_count: Optional[int | str] = Field(
+        default=0, validation_alias=custom_field(DEAL_PD_FIELDS, 'paid_invoice_count')
+    )
+    tc2_status: Optional[str] = Field(default=None, validation_alias=custom_field(DEAL_PD_FIELDS, 'tc2_status'))
+    website: Optional[str] = Field(default=None, validation_alias=custom_field(DEAL_PD_FIELDS, 'website'))
+    price_plan: Optional[str] = Field(default=None, validation_alias=custom_field(DEAL_PD_FIELDS, 'price_plan'))
+    estimated_income: Optional[str] = Field(
+        default=None, validation_alias=custom_field(DEAL_PD_FIELDS, 'estimated_income')
     )
-    utm_campaign: Optional[str] = Field(default=None, validation_alias=DEAL_PD_FIELD_MAP['utm_campaign'])
-    utm_source: Optional[str] = Field(default=None, validation_alias=DEAL_PD_FIELD_MAP['utm_source'])
-    bdr_person_id: Optional[int] = Field(default=None, validation_alias=DEAL_PD_FIELD_MAP['bdr_person_id'])
-    paid_invoice_count: Optional[int | str] = Field(default=0, validation_alias=DEAL_PD_FIELD_MAP['paid_invoice_count'])
-    tc2_status: Optional[str] = Field(default=None, validation_alias=DEAL_PD_FIELD_MAP['tc2_status'])
-    website: Optional[str] = Field(default=None, validation_alias=DEAL_PD_FIELD_MAP['website'])
-    price_plan: Optional[str] = Field(default=None, validation_alias=DEAL_PD_FIELD_MAP['price_plan'])
-    estimated_income: Optional[str] = Field(default=None, validation_alias=DEAL_PD_FIELD_MAP['estimated_income'])
 
     model_config = ConfigDict(populate_by_name=True)
 
@@ -226,15 +242,34 @@ class PDStage(_HermesModel):
 class WebhookMeta(BaseModel):
     """Webhook metadata"""
 
-    action: str
-    entity: str
+    action: Optional[str] = None
+    entity: Optional[str] = None
+
+
+class _Skipped(BaseModel):
+    """An object in a webhook that's skipped over rather than read"""
 
 
 class PipedriveEvent(BaseModel):
-    """Pipedrive webhook event (v2)"""
+    """
+    Pipedrive webhook event (v2), without the objects in it. This is quick to parse as they're skipped over, then the
+    event's parsed again as a PDObjectEvent or PDDeletedEvent of its entity's model, so each object is only read once
+    and straight into its model.
+    """
 
-    meta: WebhookMeta
-    data: Optional[dict] = None
-    previous: Optional[dict] = None
+    meta: WebhookMeta = Field(default_factory=WebhookMeta)
+    data: Optional[_Skipped] = None
 
     model_config = ConfigDict(populate_by_name=True)
+
+
+class PDObjectEvent(BaseModel, Generic[PDModel]):
+    """An event with the object's data, e.g. it's been added or updated"""
+
+    data: PDModel
+
+
+class PDDeletedEvent(BaseModel, Generic[PDModel]):
+    """An event for an object that's been deleted, the only time the processors need its previous data"""
+
+    previous: Optional[PDModel] = None
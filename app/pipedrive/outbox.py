@@ -0,0 +1,298 @@
+"""
+The Pipedrive outbox: syncs to Pipedrive are written to the outbox in the same transaction as the changes they're for,
+then delivered by the outbox relay, so a restart between the commit and the sync doesn't lose the sync.
+
+The relay takes a batch of entries at a time. Entries for the same company or meeting are collapsed into one sync, as
+each sync sends the object's latest state.
+
+The fields of Companies, Contacts and Deals changed in a session are recorded as they're flushed, and saved with the
+company's outbox entry, so the sync sends Pipedrive just those fields rather than fetching each object to compare.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import BackgroundTasks
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlmodel import delete, or_, select, update
+
+from app.core.config import settings
+from app.core.database import DBSession, get_session
+from app.core.pool import pool_user
+from app.main_app.models import Company, Contact, Deal, PipedriveOutbox
+from app.pipedrive.tasks import (
+    COMPANY_SYNCED_FIELDS,
+    CONTACT_SYNCED_FIELDS,
+    DEAL_SYNCED_FIELDS,
+    purge_company_from_pipedrive,
+    sync_company_to_pipedrive,
+    sync_meeting_to_pipedrive,
+)
+
+logger = logging.getLogger('hermes.pipedrive')
+
+# Entries that have failed this many times are left in the outbox to be looked at
+MAX_ATTEMPTS = 5
+
+
+# What each model's changes are called in an outbox entry's changes, and its fields that are sent to Pipedrive
+_TRACKED_MODELS = {
+    Company: ('company', COMPANY_SYNCED_FIELDS),
+    Contact: ('contact', CONTACT_SYNCED_FIELDS),
+    Deal: ('deal', DEAL_SYNCED_FIELDS),
+}
+
+
+def merge_changes(changes: dict, other: dict):
+    """Merge changes into `changes`, an object's changed fields being None when it's new (so everything is sent)"""
+    for key, fields in other.items():
+        existing = changes.get(key, ())
+        changes[key] = None if existing is None or fields is None else sorted({*existing, *fields})
+
+
+def record_changes(db: DBSession, company_id: int, changes: dict):
+    """
+    Record changes to a company or its contacts and deals, to be added to the company's next outbox entry. Changes
+    made through the ORM are recorded when they're flushed, this is for INSERT and UPDATE statements.
+    """
+    merge_changes(db.info.setdefault('pd_pending_changes', {}).setdefault(company_id, {}), changes)
+
+
+@event.listens_for(DBSession, 'after_flush')
+def _record_flushed_changes(db: DBSession, flush_context):
+    # The session's new and dirty objects, and their attributes' history, are still as they were before the flush
+    for obj in (*db.new, *db.dirty):
+        if not (tracked := _TRACKED_MODELS.get(type(obj))):
+            continue
+        kind, synced_fields = tracked
+        company_id = obj.id if kind == 'company' else obj.company_id
+        if not company_id:
+            continue
+        if obj in db.new:
+            record_changes(db, company_id, {f'{kind}:{obj.id}': None})
+        elif fields := [a.key for a in inspect(obj).attrs if a.key in synced_fields and a.history.has_changes()]:
+            record_changes(db, company_id, {f'{kind}:{obj.id}': fields})
+
+
+@event.listens_for(DBSession, 'after_commit')
+def _keep_committed_changes(db: Session):
+    # Kept until they're added to an outbox entry, which may be in a later transaction
+    committed = db.info.setdefault('pd_changes', {})
+    for company_id, changes in db.info.pop('pd_pending_changes', {}).items():
+        merge_changes(committed.setdefault(company_id, {}), changes)
+
+
+@event.listens_for(DBSession, 'after_rollback')
+def _discard_rolled_back_changes(db: Session):
+    db.info.pop('pd_pending_changes', None)
+
+
+def add_to_outbox(db: DBSession, action: str, object_id: int):
+    """
+    Add a sync to the outbox, to be committed with the changes it's for. A company's sync is saved with the changes
+    to it and its contacts and deals recorded in the session.
+    """
+    changes = None
+    if action == PipedriveOutbox.ACTION_SYNC_COMPANY:
+        # So the changes made since the last flush are recorded
+        db.flush()
+        changes = {}
+        for recorded in ('pd_changes', 'pd_pending_changes'):
+            merge_changes(changes, db.info.get(recorded, {}).pop(object_id, {}))
+    db.add(PipedriveOutbox(action=action, object_id=object_id, changes=changes))
+
+
+def _collapse_changes(entries: list[PipedriveOutbox]) -> Optional[dict]:
+    """The changes of a company's entries, or None if any don't know what changed"""
+    changes = {}
+    for entry in entries:
+        if entry.action != PipedriveOutbox.ACTION_SYNC_COMPANY or entry.changes is None:
+            return None
+        merge_changes(changes, entry.changes)
+    return changes
+
+
+def _collapse_key(entry: PipedriveOutbox) -> tuple[str, int]:
+    # Syncing and purging a company collapse together, so whichever was written last is delivered
+    if entry.action == PipedriveOutbox.ACTION_SYNC_MEETING:
+        return 'meeting', entry.object_id
+    return 'company', entry.object_id
+
+
+async def _deliver(action: str, object_id: int, changes: Optional[dict]):
+    with pool_user(f'pd_outbox:{action}'):
+        if action == PipedriveOutbox.ACTION_SYNC_COMPANY:
+            await sync_company_to_pipedrive(object_id, changes)
+        elif action == PipedriveOutbox.ACTION_PURGE_COMPANY:
+            # NARC companies are deleted/purged from Pipedrive
+            await purge_company_from_pipedrive(object_id)
+        elif action == PipedriveOutbox.ACTION_SYNC_MEETING:
+            await sync_meeting_to_pipedrive(object_id)
+        else:
+            raise ValueError(f'Unknown outbox action {action!r}')
+
+
+def _claim_entries(db: DBSession, last_id: int, batch_size: int) -> list[PipedriveOutbox]:
+    """
+    Claim the next batch of entries after `last_id` that no other relay has claimed, for `pd_outbox_claim_secs`. The
+    rows are locked with `SKIP LOCKED` while they're claimed, so relays draining at once each claim different entries.
+    """
+    now = datetime.now(timezone.utc)
+    claimable = (
+        select(PipedriveOutbox.id)
+        .where(
+            PipedriveOutbox.id > last_id,
+            PipedriveOutbox.attempts < MAX_ATTEMPTS,
+            or_(PipedriveOutbox.claimed_until.is_(None), PipedriveOutbox.claimed_until <= now),
+        )
+        .order_by(PipedriveOutbox.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    claimed_ids = (
+        db.exec(
+            update(PipedriveOutbox)
+            .where(PipedriveOutbox.id.in_(claimable.scalar_subquery()))
+            .values(claimed_until=now + timedelta(seconds=settings.pd_outbox_claim_secs))
+            .returning(PipedriveOutbox.id)
+        )
+        .scalars()
+        .all()
+    )
+    db.commit()
+    if not claimed_ids:
+        return []
+    return db.exec(
+        select(PipedriveOutbox).where(PipedriveOutbox.id.in_(claimed_ids)).order_by(PipedriveOutbox.id)
+    ).all()
+
+
+async def drain_outbox(batch_size: int = settings.pd_outbox_batch_size) -> list[float]:
+    """
+    Deliver everything in the outbox, a batch at a time, trying each entry once. Returns the latency of each sync
+    delivered: the seconds since the oldest entry it was collapsed from was written.
+
+    Each batch is claimed before it's delivered, so entries being delivered by another relay (or another process's)
+    are skipped rather than sent to Pipedrive twice.
+    """
+    latencies = []
+    last_id = 0
+    while True:
+        with get_session() as db:
+            entries = _claim_entries(db, last_id, batch_size)
+        if not entries:
+            break
+        last_id = entries[-1].id
+
+        collapsed: dict[tuple[str, int], list[PipedriveOutbox]] = {}
+        for entry in entries:
+            collapsed.setdefault(_collapse_key(entry), []).append(entry)
+
+        delivered, errors = [], {}
+        for group in collapsed.values():
+            latest = group[-1]
+            try:
+                await _deliver(latest.action, latest.object_id, _collapse_changes(group))
+            except Exception as e:
+                logger.error(f'Error delivering Pipedrive {latest.action} {latest.object_id}: {e}', exc_info=True)
+                errors.update((entry.id, str(e)) for entry in group)
+            else:
+                delivered.extend(entry.id for entry in group)
+                created = group[0].created
+                created = created.astimezone(timezone.utc) if created.tzinfo else created.replace(tzinfo=timezone.utc)
+                latencies.append((datetime.now(timezone.utc) - created).total_seconds())
+
+        with get_session() as db:
+            if delivered:
+                db.exec(delete(PipedriveOutbox).where(PipedriveOutbox.id.in_(delivered)))
+            if errors:
+                for entry in db.exec(select(PipedriveOutbox).where(PipedriveOutbox.id.in_(errors))):
+                    entry.attempts += 1
+                    entry.error = errors[entry.id]
+                    # So it's retried by whichever relay drains the outbox next
+                    entry.claimed_until = None
+                    db.add(entry)
+            db.commit()
+
+        if len(entries) < batch_size:
+            break
+    return latencies
+
+
+class PipedriveOutboxRelay:
+    """
+    Delivers the outbox in the background, as soon as it's notified of new entries and every `poll_interval` seconds
+    for any it wasn't notified of (written by another process, or before a restart).
+    """
+
+    def __init__(self, poll_interval: int, batch_size: int):
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.delivered = 0
+        # The latencies of recent deliveries, in seconds
+        self.latencies: deque[float] = deque(maxlen=1000)
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+        logger.info('Started the Pipedrive outbox relay')
+
+    async def stop(self):
+        # Anything undelivered is still in the outbox, so will be delivered after we start again
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def notify(self):
+        """Tell the relay there are new entries in the outbox"""
+        self._wake.set()
+
+    def info(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            'delivered': self.delivered,
+            'latency_p50': latencies[len(latencies) // 2] if latencies else None,
+            'latency_p95': latencies[int(len(latencies) * 0.95)] if latencies else None,
+            'latency_max': latencies[-1] if latencies else None,
+        }
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                latencies = await drain_outbox(self.batch_size)
+            except Exception as e:
+                logger.error(f'Error delivering the Pipedrive outbox: {e}', exc_info=True)
+            else:
+                if latencies:
+                    self.delivered += len(latencies)
+                    self.latencies.extend(latencies)
+                    logger.info(f'Delivered {len(latencies)} Pipedrive syncs, max latency {max(latencies):.2f}s')
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+pd_outbox_relay = PipedriveOutboxRelay(settings.pd_outbox_poll_secs, settings.pd_outbox_batch_size)
+
+
+def relay_outbox(background_tasks: BackgroundTasks):
+    """
+    Have the relay deliver new outbox entries or, without the relay (when the app's lifespan hasn't run, e.g. in
+    tests), deliver them after the response is sent
+    """
+    if pd_outbox_relay.running:
+        pd_outbox_relay.notify()
+    else:
+        background_tasks.add_task(drain_outbox)
@@ -4,8 +4,9 @@ from functools import cached_property
 from sqlmodel import select
 
 from app.core.database import DBSession
+from app.main_app.identity import find_contact
 from app.main_app.models import Admin, Company, Contact, Deal, Pipeline, Stage
-from app.pipedrive.field_mappings import COMPANY_PD_FIELD_MAP, CONTACT_PD_FIELD_MAP, DEAL_PD_FIELD_MAP
+from app.pipedrive.field_mappings import COMPANY_PD_FIELDS, CONTACT_PD_FIELDS, DEAL_PD_FIELDS
 from app.pipedrive.models import Organisation, PDDeal, PDPipeline, PDStage, Person
 
 logger = logging.getLogger('hermes.pipedrive')
@@ -122,13 +123,12 @@ class OrganisationProcessor(PipedriveObjProcessor):
     pd_model = Organisation
     pd_id_field = 'pd_org_id'
 
-    @property
-    def custom_field_names(self):
-        return [
-            f
-            for f in list(COMPANY_PD_FIELD_MAP.keys())
-            if f not in ['hermes_id', 'bdr_person_id', 'support_person_id', 'tc2_cligency_url']
-        ]
+    # The admin ids are mapped to Hermes admins separately, and the TC2 URL is built from tc2_cligency_id
+    custom_field_names = tuple(
+        f.name
+        for f in COMPANY_PD_FIELDS
+        if f.name not in ('hermes_id', 'bdr_person_id', 'support_person_id', 'tc2_cligency_url')
+    )
 
     def _mark_merged_losers_deleted(self, loser_ids: list[int]) -> None:
         for loser_id in loser_ids:
@@ -188,12 +188,22 @@ class PersonProcessor(PipedriveObjProcessor):
     pd_model = Person
     pd_id_field = 'pd_person_id'
 
-    @property
-    def custom_field_names(self):
-        return [f for f in list(CONTACT_PD_FIELD_MAP.keys()) if f != 'hermes_id']
+    custom_field_names = tuple(f.name for f in CONTACT_PD_FIELDS if f.name != 'hermes_id')
 
     async def _add_obj(self, pd_obj: Person) -> Contact:
         company = self.db.exec(select(Company).where(Company.pd_org_id == pd_obj.org_id)).one()
+        # The same person may already be a contact of the company from TC2 or the callbooker
+        contact = find_contact(
+            self.db,
+            email=pd_obj.email,
+            phone=pd_obj.phone,
+            country=company.country,
+            where=(Contact.company_id == company.id, Contact.pd_person_id.is_(None)),
+        )
+        if contact:
+            logger.info(f'Matched Pipedrive person {pd_obj.id} to contact {contact.id}')
+            contact.pd_person_id = pd_obj.id
+            return await self._update_obj(contact, pd_obj)
         return Contact(
             pd_person_id=pd_obj.id,
             company_id=company.id,
@@ -201,6 +211,7 @@ class PersonProcessor(PipedriveObjProcessor):
             last_name=pd_obj.last_name,
             email=pd_obj.email,
             phone=pd_obj.phone,
+            country=company.country,
         )
 
     async def _update_obj(self, hermes_obj: Contact, pd_obj: Person) -> Contact:
@@ -230,9 +241,7 @@ class PDDealProcessor(PipedriveObjProcessor):
     pd_model = PDDeal
     pd_id_field = 'pd_deal_id'
 
-    @property
-    def custom_field_names(self):
-        return [f for f in list(DEAL_PD_FIELD_MAP.keys()) if f != 'hermes_id']
+    custom_field_names = tuple(f.name for f in DEAL_PD_FIELDS if f.name != 'hermes_id')
 
     async def _add_obj(self, pd_obj: PDDeal) -> Deal:
         company = self.db.exec(select(Company).where(Company.pd_org_id == pd_obj.org_id)).one()
@@ -332,3 +341,13 @@ class PDStageProcessor(PipedriveObjProcessor):
         if pd_obj.name and hermes_obj.name != pd_obj.name[:255]:
             hermes_obj.name = pd_obj.name[:255]
         return hermes_obj
+
+
+# The model each entity's Pipedrive data is parsed into, and the processor that syncs it to Hermes
+PD_ENTITIES = {
+    'organization': (Organisation, OrganisationProcessor),
+    'person': (Person, PersonProcessor),
+    'deal': (PDDeal, PDDealProcessor),
+    'pipeline': (PDPipeline, PDPipelineProcessor),
+    'stage': (PDStage, PDStageProcessor),
+}
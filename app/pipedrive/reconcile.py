@@ -0,0 +1,273 @@
+"""
+Full reconciliation between Hermes and Pipedrive.
+
+Pages through every organization, person and deal in Pipedrive and diffs each page against Hermes, so drift from
+missed webhooks or failed syncs can be found (and fixed) without syncing every entity one by one. Only a page of
+Pipedrive objects, and the Pipedrive ids seen so far, are held in memory at once.
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import tuple_
+from sqlalchemy.orm import selectinload
+from sqlmodel import SQLModel, select, update
+
+from app.core.database import DBSession, get_session
+from app.main_app.models import Company, Contact, Deal
+from app.pipedrive import api
+from app.pipedrive.field_mappings import (
+    COMPANY_PD_FIELDS,
+    CONTACT_PD_FIELDS,
+    DEAL_PD_FIELDS,
+    PDCustomField,
+    build_custom_fields,
+)
+from app.pipedrive.models import Organisation, PDDeal, Person
+
+logger = logging.getLogger('hermes.reconcile')
+
+PAGE_SIZE = 500
+# Pipedrive updates made at once, the API client's rate limiting still applies
+MAX_CONCURRENT_UPDATES = 5
+
+
+@dataclass(frozen=True)
+class ReconcileEntity:
+    """How to reconcile one kind of Pipedrive object with its Hermes model"""
+
+    name: str
+    endpoint: str
+    pd_model: type[BaseModel]
+    hermes_model: type[SQLModel]
+    pd_id_field: str
+    fields: tuple[PDCustomField, ...]
+    # Relationships the custom fields are read from, loaded with each page's objects
+    load: tuple = ()
+
+
+ENTITIES = {
+    e.name: e
+    for e in (
+        ReconcileEntity('organization', 'organizations', Organisation, Company, 'pd_org_id', COMPANY_PD_FIELDS),
+        ReconcileEntity('person', 'persons', Person, Contact, 'pd_person_id', CONTACT_PD_FIELDS),
+        ReconcileEntity('deal', 'deals', PDDeal, Deal, 'pd_deal_id', DEAL_PD_FIELDS, (Deal.company,)),
+    )
+}
+
+
+@dataclass
+class Correction:
+    """
+    A difference between Hermes and Pipedrive:
+
+    * link - the Pipedrive object has the Hermes object's hermes_id, but the Hermes object has no Pipedrive id
+    * unlink - the Hermes object's Pipedrive id isn't in Pipedrive any more
+    * update_pipedrive - the Pipedrive object's custom fields don't match Hermes
+    * missing_in_hermes - nothing in Hermes matches the Pipedrive object
+    * duplicate - the Pipedrive object has the hermes_id of a Hermes object linked to a different Pipedrive object
+
+    Only the first three are applied, the others need a human to look at them.
+    """
+
+    ACTION_LINK = 'link'
+    ACTION_UNLINK = 'unlink'
+    ACTION_UPDATE_PIPEDRIVE = 'update_pipedrive'
+    ACTION_MISSING_IN_HERMES = 'missing_in_hermes'
+    ACTION_DUPLICATE = 'duplicate'
+
+    entity: str
+    action: str
+    hermes_id: Optional[int] = None
+    pd_id: Optional[int] = None
+    changes: dict = field(default_factory=dict)
+
+    def __str__(self):
+        s = f'{self.entity} {self.action}: hermes_id={self.hermes_id} pd_id={self.pd_id}'
+        return f'{s} changes={self.changes}' if self.changes else s
+
+
+def _pd_value(value: Any) -> Any:
+    """A custom field's value as we send it, as Pipedrive returns typed values and nests some in {'value': ...}"""
+    if isinstance(value, dict):
+        value = value.get('value')
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return value
+
+
+def _custom_field_changes(entity: ReconcileEntity, hermes_obj: SQLModel, pd_data: dict) -> dict:
+    pd_custom_fields = pd_data.get('custom_fields') or {}
+    changes = {}
+    for pd_field_id, value in build_custom_fields(entity.fields, hermes_obj).items():
+        pd_value = _pd_value(pd_custom_fields.get(pd_field_id, pd_data.get(pd_field_id)))
+        if pd_value != value and str(pd_value) != str(value):
+            changes[pd_field_id] = value
+    return changes
+
+
+def diff_page(db: DBSession, entity: ReconcileEntity, pd_page: list[dict]) -> list[Correction]:
+    """Diff a page of Pipedrive objects against Hermes, with one query for their Pipedrive ids and one for hermes_ids"""
+    pd_objs = []
+    for pd_data in pd_page:
+        try:
+            pd_objs.append((entity.pd_model.model_validate(pd_data), pd_data))
+        except ValidationError as e:
+            logger.warning(f'Skipping invalid Pipedrive {entity.name} {pd_data.get("id")}: {e}')
+
+    model = entity.hermes_model
+    pd_id_col = getattr(model, entity.pd_id_field)
+    query = select(model).options(*(selectinload(r) for r in entity.load))
+    by_pd_id = {
+        getattr(h, entity.pd_id_field): h
+        for h in db.exec(query.where(pd_id_col.in_([pd_obj.id for pd_obj, _ in pd_objs])))
+    }
+    # hermes_id is a string like '123, 456' when Pipedrive has merged objects, the first is the merged object's
+    hermes_ids = {
+        pd_obj.id: int(hermes_id)
+        for pd_obj, _ in pd_objs
+        if pd_obj.id not in by_pd_id and (hermes_id := str(pd_obj.hermes_id or '').split(',')[0].strip()).isdigit()
+    }
+    by_id = {h.id: h for h in db.exec(query.where(model.id.in_(set(hermes_ids.values()))))} if hermes_ids else {}
+
+    corrections = []
+    linked = set()
+    for pd_obj, pd_data in pd_objs:
+        if hermes_obj := by_pd_id.get(pd_obj.id):
+            if changes := _custom_field_changes(entity, hermes_obj, pd_data):
+                corrections.append(
+                    Correction(entity.name, Correction.ACTION_UPDATE_PIPEDRIVE, hermes_obj.id, pd_obj.id, changes)
+                )
+        elif hermes_obj := by_id.get(hermes_ids.get(pd_obj.id)):
+            if getattr(hermes_obj, entity.pd_id_field) is None and hermes_obj.id not in linked:
+                linked.add(hermes_obj.id)
+                corrections.append(Correction(entity.name, Correction.ACTION_LINK, hermes_obj.id, pd_obj.id))
+            else:
+                corrections.append(Correction(entity.name, Correction.ACTION_DUPLICATE, hermes_obj.id, pd_obj.id))
+        else:
+            corrections.append(Correction(entity.name, Correction.ACTION_MISSING_IN_HERMES, None, pd_obj.id))
+    return corrections
+
+
+def find_unlinked(db: DBSession, entity: ReconcileEntity, seen_pd_ids: set[int]) -> list[Correction]:
+    """Hermes objects linked to Pipedrive objects that weren't in any page"""
+    pd_id_col = getattr(entity.hermes_model, entity.pd_id_field)
+    rows = db.exec(
+        select(entity.hermes_model.id, pd_id_col).where(pd_id_col.is_not(None)).execution_options(yield_per=1000)
+    )
+    return [
+        Correction(entity.name, Correction.ACTION_UNLINK, hermes_id, pd_id)
+        for hermes_id, pd_id in rows
+        if pd_id not in seen_pd_ids
+    ]
+
+
+async def confirm_unlinked(entity: ReconcileEntity, corrections: list[Correction]) -> list[Correction]:
+    """
+    The unlinks whose Pipedrive object really has gone, checked with a GET each (a few at a time). An object can be
+    missed while paging if it's created after its page was fetched, or if deletions shift the pages under us.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPDATES)
+
+    async def is_gone(correction: Correction) -> bool:
+        async with semaphore:
+            try:
+                await api.pipedrive_request(f'{entity.endpoint}/{correction.pd_id}')
+            except Exception as e:
+                if api.is_gone(e):
+                    return True
+                logger.error(f'Error checking {entity.name} {correction.pd_id}, not unlinking: {e}')
+                return False
+            logger.info(f'{entity.name} {correction.pd_id} is still in Pipedrive, not unlinking')
+            return False
+
+    unlinks = [c for c in corrections if c.action == Correction.ACTION_UNLINK]
+    gone = await asyncio.gather(*(is_gone(c) for c in unlinks))
+    return [c for c, c_gone in zip(unlinks, gone) if c_gone]
+
+
+def apply_hermes_corrections(db: DBSession, entity: ReconcileEntity, corrections: list[Correction]):
+    """
+    Set the Pipedrive ids of Hermes objects that need linking, and clear the unlinked ones in one UPDATE. An unlinked
+    object is only cleared if it still has the Pipedrive id that was found to be missing.
+    """
+    model = entity.hermes_model
+    links = [c for c in corrections if c.action == Correction.ACTION_LINK]
+    if links:
+        pd_ids = {c.hermes_id: c.pd_id for c in links}
+        objs = db.exec(select(model).where(model.id.in_(pd_ids)))
+        for obj in objs:
+            setattr(obj, entity.pd_id_field, pd_ids[obj.id])
+            db.add(obj)
+    if unlinks := [(c.hermes_id, c.pd_id) for c in corrections if c.action == Correction.ACTION_UNLINK]:
+        pd_id_col = getattr(model, entity.pd_id_field)
+        db.exec(update(model).where(tuple_(model.id, pd_id_col).in_(unlinks)).values({entity.pd_id_field: None}))
+    db.commit()
+
+
+async def apply_pipedrive_corrections(entity: ReconcileEntity, corrections: list[Correction]):
+    """Send Pipedrive the custom fields that don't match Hermes, a few objects at a time"""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPDATES)
+
+    async def apply(correction: Correction):
+        async with semaphore:
+            try:
+                await api.pipedrive_request(
+                    f'{entity.endpoint}/{correction.pd_id}',
+                    method='PATCH',
+                    data={'custom_fields': correction.changes},
+                )
+            except Exception as e:
+                logger.error(f'Error updating {entity.name} {correction.pd_id}: {e}')
+
+    await asyncio.gather(*(apply(c) for c in corrections if c.action == Correction.ACTION_UPDATE_PIPEDRIVE))
+
+
+async def reconcile_entity(entity: ReconcileEntity, live: bool = False, page_size: int = PAGE_SIZE) -> Counter:
+    """
+    Reconcile every object of one kind, logging each correction and applying them if `live`. The DB session is
+    only open while a page is diffed, never during API requests. When `live`, Hermes objects whose Pipedrive object
+    wasn't in any page are only unlinked once a GET confirms it's gone.
+    """
+    counts = Counter()
+    seen_pd_ids = set()
+    pages = 0
+    async for pd_page in api.iter_pages(entity.endpoint, page_size):
+        pages += 1
+        seen_pd_ids.update(pd_data['id'] for pd_data in pd_page)
+        with get_session() as db:
+            corrections = diff_page(db, entity, pd_page)
+            if live:
+                apply_hermes_corrections(db, entity, corrections)
+        for correction in corrections:
+            logger.info(str(correction))
+            counts[correction.action] += 1
+        if live:
+            await apply_pipedrive_corrections(entity, corrections)
+
+    if not seen_pd_ids:
+        # Almost certainly a problem with the API rather than everything having been deleted from Pipedrive
+        logger.warning(f'No {entity.endpoint} in Pipedrive, not checking for Hermes objects to unlink')
+        return counts
+
+    with get_session() as db:
+        corrections = find_unlinked(db, entity, seen_pd_ids)
+    if live:
+        corrections = await confirm_unlinked(entity, corrections)
+        with get_session() as db:
+            apply_hermes_corrections(db, entity, corrections)
+    for correction in corrections:
+        logger.info(str(correction))
+        counts[correction.action] += 1
+
+    logger.info(f'Reconciled {len(seen_pd_ids)} Pipedrive {entity.endpoint} in {pages} pages: {dict(counts)}')
+    return counts
+
+
+async def reconcile(entity_names: Optional[list[str]] = None, live: bool = False) -> dict[str, Counter]:
+    """Reconcile organizations, persons and then deals (or just those given), returning the corrections counts"""
+    return {name: await reconcile_entity(ENTITIES[name], live) for name in (entity_names or ENTITIES)}
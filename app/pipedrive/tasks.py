@@ -1,83 +1,251 @@
 import logging
-from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Optional
 
 import logfire
-from sqlmodel import select
+from sqlmodel import select, update
 
-from app.core.database import get_session
+from app.core.database import DBSession, get_session
 from app.main_app.models import Company, Contact, Deal, Meeting
 from app.pipedrive import api
-from app.pipedrive.field_mappings import COMPANY_PD_FIELD_MAP, CONTACT_PD_FIELD_MAP, DEAL_PD_FIELD_MAP
+from app.pipedrive.field_mappings import (
+    COMPANY_PD_FIELDS,
+    CONTACT_PD_FIELDS,
+    DEAL_PD_FIELD_MAP,
+    DEAL_PD_FIELDS,
+    PDCustomField,
+    build_custom_fields,
+)
+from app.pipedrive.loaders import CONTACT_LOAD, DEAL_LOAD, load_company, load_contact, load_deal, load_meeting
 
 logger = logging.getLogger('hermes.pipedrive')
 
 SYNCABLE_DEAL_FIELDS = ['paid_invoice_count']  # these fields get synced from deal company
 
+# The Hermes fields each standard Pipedrive field comes from, so when we know which Hermes fields have changed we can
+# send just the Pipedrive fields that need updating, without fetching the object from Pipedrive to compare. Fields
+# starting 'company.' are the fields of the object's company.
+ORG_FIELD_SOURCES = {'name': ('name',), 'owner_id': ('sales_person_id',), 'address': ('country',)}
+PERSON_FIELD_SOURCES = {
+    'name': ('first_name', 'last_name'),
+    'org_id': ('company_id',),
+    'owner_id': ('company.sales_person_id',),
+    'emails': ('email',),
+    'phones': ('phone',),
+}
+DEAL_FIELD_SOURCES = {
+    'title': ('name',),
+    'org_id': ('company_id',),
+    'person_id': ('contact_id',),
+    'owner_id': ('admin_id',),
+    'pipeline_id': ('pipeline_id',),
+    'stage_id': ('stage_id',),
+    'status': ('status',),
+}
+# The custom fields that don't come from the Hermes field of the same name
+ORG_CUSTOM_FIELD_SOURCES = {'tc2_cligency_url': 'tc2_cligency_id'}
+DEAL_CUSTOM_FIELD_SOURCES = {
+    'tc2_cligency_url': 'company.tc2_cligency_id',
+    'paid_invoice_count': 'company.paid_invoice_count',
+}
+
+
+def _synced_fields(
+    field_sources: dict[str, tuple[str, ...]],
+    pd_fields: tuple[PDCustomField, ...],
+    custom_field_sources: Optional[dict[str, str]] = None,
+) -> frozenset[str]:
+    custom_field_sources = custom_field_sources or {}
+    sources = {source for sources in field_sources.values() for source in sources}
+    sources.update(custom_field_sources.get(f.name, f.name) for f in pd_fields)
+    return frozenset(source for source in sources if not source.startswith('company.'))
+
+
+# The Hermes fields of each model that are sent to Pipedrive
+COMPANY_SYNCED_FIELDS = _synced_fields(ORG_FIELD_SOURCES, COMPANY_PD_FIELDS, ORG_CUSTOM_FIELD_SOURCES)
+CONTACT_SYNCED_FIELDS = _synced_fields(PERSON_FIELD_SOURCES, CONTACT_PD_FIELDS)
+DEAL_SYNCED_FIELDS = _synced_fields(DEAL_FIELD_SOURCES, DEAL_PD_FIELDS, DEAL_CUSTOM_FIELD_SOURCES)
+
+
+def _changed_data(
+    data: dict,
+    changed: set[str],
+    field_sources: dict[str, tuple[str, ...]],
+    pd_fields: tuple[PDCustomField, ...],
+    custom_field_sources: Optional[dict[str, str]] = None,
+) -> dict:
+    """The parts of an object's Pipedrive data that come from the changed Hermes fields"""
+    custom_field_sources = custom_field_sources or {}
+    changed_data = {key: data.get(key) for key, sources in field_sources.items() if changed.intersection(sources)}
+    # Custom fields that are now empty aren't in the data, and are sent as None to clear them
+    custom_fields = {
+        f.pd_field_id: data['custom_fields'].get(f.pd_field_id)
+        for f in pd_fields
+        if custom_field_sources.get(f.name, f.name) in changed
+    }
+    if custom_fields:
+        changed_data['custom_fields'] = custom_fields
+    return changed_data
 
-async def sync_company_to_pipedrive(company_id: int):
-    """
-    Sync company and related data to Pipedrive.
-    This is called after TC2 or Callbooker updates.
-    """
-    with logfire.span('sync_company_to_pipedrive'):
-        try:
-            with get_session() as db:
-                company = db.get(Company, company_id)
-                if not company:
-                    logger.warning(f'Company {company_id} not found, skipping sync')
-                    return
-                if company.is_deleted:
-                    logger.info(f'Company {company_id} is marked as deleted, skipping sync')
-                    return
 
-                contact_ids = [c.id for c in db.exec(select(Contact).where(Contact.company_id == company_id)).all()]
+def _changed_fields(changes: dict, key: str, related: set[str] = frozenset()) -> Optional[set[str]]:
+    """An object's changed fields from the outbox changes (see PipedriveOutbox), or None if it's new"""
+    if key in changes and changes[key] is None:
+        return None
+    return set(changes.get(key, ())) | related
 
-                deal_query = select(Deal).where(Deal.company_id == company_id)
-                if not company.paid_invoice_count:
-                    # Full sync for non-paying companies (update existing + create new open deals)
-                    deal_query = deal_query.where((Deal.pd_deal_id.is_not(None)) | (Deal.status == Deal.STATUS_OPEN))
-                    only_syncable_deal_fields = False
-                else:
-                    # Only sync fields for paying companies' existing open deals
-                    deal_query = deal_query.where(Deal.pd_deal_id.is_not(None), Deal.status == Deal.STATUS_OPEN)
-                    only_syncable_deal_fields = True
 
-                deal_ids = [d.id for d in db.exec(deal_query).all()]
+@dataclass
+class CreatedPDIds:
+    """The Pipedrive ids of the objects created by a sync, by Hermes id, saved together once it's done"""
 
-            await sync_organization(company_id)
+    orgs: dict[int, int] = field(default_factory=dict)
+    persons: dict[int, int] = field(default_factory=dict)
+    deals: dict[int, int] = field(default_factory=dict)
 
-            for contact_id in contact_ids:
-                await sync_person(contact_id)
+    def save(self):
+        """Save the Pipedrive ids with an UPDATE per model"""
+        if not (self.orgs or self.persons or self.deals):
+            return
+        with get_session() as db:
+            for model, pd_id_field, ids in (
+                (Company, 'pd_org_id', self.orgs),
+                (Contact, 'pd_person_id', self.persons),
+                (Deal, 'pd_deal_id', self.deals),
+            ):
+                if ids:
+                    db.execute(update(model), [{'id': obj_id, pd_id_field: pd_id} for obj_id, pd_id in ids.items()])
+            db.commit()
 
-            for deal_id in deal_ids:
-                await sync_deal(deal_id, only_syncable_deal_fields)
 
-            logger.info(f'Successfully synced company {company_id} to Pipedrive')
-        except Exception as e:
-            logger.error(f'Error syncing company {company_id}: {e}', exc_info=True)
+def _load_company_sync(db: DBSession, company_id: int) -> Optional[tuple[Company, list[Contact], list[Deal], bool]]:
+    """
+    Load a company with its contacts and the deals to sync, and everything their Pipedrive data is built from, and
+    whether only the deals' syncable fields are sent. The contacts' and deals' company is the company, and the deals'
+    contact is one of the contacts, so Pipedrive ids created for them are seen by the objects sent after them.
+    """
+    company = load_company(db, company_id)
+    if not company:
+        logger.warning(f'Company {company_id} not found, skipping sync')
+        return None
+    if company.is_deleted:
+        logger.info(f'Company {company_id} is marked as deleted, skipping sync')
+        return None
+
+    contacts = db.exec(
+        select(Contact).where(Contact.company_id == company_id).options(*CONTACT_LOAD).order_by(Contact.id)
+    ).all()
+
+    deal_query = select(Deal).where(Deal.company_id == company_id).options(*DEAL_LOAD).order_by(Deal.id)
+    if not company.paid_invoice_count:
+        # Full sync for non-paying companies (update existing + create new open deals)
+        deal_query = deal_query.where((Deal.pd_deal_id.is_not(None)) | (Deal.status == Deal.STATUS_OPEN))
+        only_syncable_deal_fields = False
+    else:
+        # Only sync fields for paying companies' existing open deals
+        deal_query = deal_query.where(Deal.pd_deal_id.is_not(None), Deal.status == Deal.STATUS_OPEN)
+        only_syncable_deal_fields = True
+
+    return company, list(contacts), list(db.exec(deal_query).all()), only_syncable_deal_fields
+
+
+async def sync_company_to_pipedrive(company_id: int, changes: Optional[dict] = None):
+    """
+    Sync company and related data to Pipedrive.
+    This is called after TC2 or Callbooker updates.
 
+    With the `changes` recorded in the outbox (the changed fields of the company and of its contacts and deals, by
+    id), only those are sent to Pipedrive. Without them each object is compared with Pipedrive to find what's changed.
 
-async def sync_organization(company_id: int):
-    """Sync a single organization to Pipedrive"""
-    with get_session() as db:
-        company = db.get(Company, company_id)
-        if not company:
+    The company, contacts and deals are loaded with one session and closed before anything is sent, and the Pipedrive
+    ids of the objects created are saved together at the end, so no connection is held while Pipedrive is called.
+
+    Pipedrive errors are raised, so the outbox keeps the sync (with its changes) to retry.
+    """
+    with logfire.span('sync_company_to_pipedrive'):
+        with get_session() as db:
+            loaded = _load_company_sync(db, company_id)
+        if not loaded:
             return
-        org_data = _company_to_org_data(company)
-        pd_org_id = company.pd_org_id
+        company, contacts, deals, only_syncable_deal_fields = loaded
+
+        if changes is not None and _changed_fields(changes, f'company:{company_id}') is None:
+            # A new company, so everything is sent
+            changes = None
+
+        created = CreatedPDIds()
+        try:
+            if changes is None:
+                await _send_organization(company, None, created)
+                for contact in contacts:
+                    await _send_person(contact, None, created)
+                for deal in deals:
+                    await _send_deal(deal, only_syncable_deal_fields, None, created)
+            else:
+                company_changed = _changed_fields(changes, f'company:{company_id}')
+                new_person_contact_ids = {contact.id for contact in contacts if not contact.pd_person_id}
+                await _send_organization(company, company_changed, created)
+                # The company's fields that are also sent with its persons and deals, and its organization if it was
+                # just created (including recreated, having been deleted from Pipedrive)
+                related = {f'company.{f}' for f in company_changed}
+                if company.id in created.orgs:
+                    related.add('company_id')
+
+                for contact in contacts:
+                    changed = _changed_fields(changes, f'contact:{contact.id}', related)
+                    if contact.id not in new_person_contact_ids and changed == set():
+                        continue
+                    await _send_person(contact, changed, created)
+
+                for deal in deals:
+                    deal_related = related | {'contact_id'} if deal.contact_id in created.persons else related
+                    changed = _changed_fields(changes, f'deal:{deal.id}', deal_related)
+                    if deal.pd_deal_id and changed == set():
+                        continue
+                    await _send_deal(deal, only_syncable_deal_fields, changed, created)
+        finally:
+            # Whatever was created before an error is still saved, so it isn't created again when it's retried
+            created.save()
+
+        logger.info(f'Successfully synced company {company_id} to Pipedrive')
+
+
+async def sync_organization(company_id: int, changed: Optional[set[str]] = None):
+    """
+    Sync a single organization to Pipedrive, sending just the fields from the `changed` Hermes fields if we know them
+    """
+    with get_session() as db:
+        company = load_company(db, company_id)
+    if company:
+        created = CreatedPDIds()
+        try:
+            await _send_organization(company, changed, created)
+        finally:
+            created.save()
+
+
+async def _send_organization(company: Company, changed: Optional[set[str]], created: CreatedPDIds):
+    """Update or create the company's organization, recording its id in `created` if it's created"""
+    org_data = _company_to_org_data(company)
+    pd_org_id = company.pd_org_id
 
     if pd_org_id:
         try:
-            pd_org = await api.get_organisation(pd_org_id)
-            current_data = pd_org.get('data', {})
-            changed_fields = api.get_changed_fields(current_data, org_data)
+            if changed is None:
+                pd_org = await api.get_organisation(pd_org_id)
+                current_data = pd_org.get('data', {})
+                changed_fields = api.get_changed_fields(current_data, org_data)
+            else:
+                changed_fields = _changed_data(
+                    org_data, changed, ORG_FIELD_SOURCES, COMPANY_PD_FIELDS, ORG_CUSTOM_FIELD_SOURCES
+                )
 
             if changed_fields:
                 await api.update_organisation(pd_org_id, changed_fields)
-                logger.info(f'Updated organization {pd_org_id} for company {company_id}')
+                logger.info(f'Updated organization {pd_org_id} for company {company.id}')
         except Exception as e:
             logger.error(f'Error updating organization {pd_org_id}: {e}')
-            if '404' in str(e) or '410' in str(e):
+            if api.is_gone(e):
                 pd_org_id = None
             else:
                 raise
@@ -86,58 +254,58 @@ async def sync_organization(company_id: int):
         try:
             result = await api.create_organisation(org_data)
             new_pd_org_id = result['data']['id']
-
-            with get_session() as db:
-                company = db.get(Company, company_id)
-                if company:
-                    company.pd_org_id = new_pd_org_id
-                    db.add(company)
-                    db.commit()
-
-            logger.info(f'Created organization {new_pd_org_id} for company {company_id}')
+            # So the company's persons and deals are sent with it
+            company.pd_org_id = created.orgs[company.id] = new_pd_org_id
+            logger.info(f'Created organization {new_pd_org_id} for company {company.id}')
         except Exception as e:
-            logger.error(f'Error creating organization for company {company_id}: {e}')
+            logger.error(f'Error creating organization for company {company.id}: {e}')
             raise
 
 
-async def sync_person(contact_id: int):
-    """Sync a single person to Pipedrive"""
+async def sync_person(contact_id: int, changed: Optional[set[str]] = None):
+    """Sync a single person to Pipedrive, sending just the fields from the `changed` Hermes fields if we know them"""
     with get_session() as db:
-        contact = db.get(Contact, contact_id)
-        if not contact:
-            return
-        person_data = _contact_to_person_data(contact, db)
-        pd_person_id = contact.pd_person_id
+        contact = load_contact(db, contact_id)
+    if contact:
+        created = CreatedPDIds()
+        await _send_person(contact, changed, created)
+        created.save()
+
+
+async def _send_person(contact: Contact, changed: Optional[set[str]], created: CreatedPDIds):
+    """Update or create the contact's person, recording its id in `created` if it's created"""
+    person_data = _contact_to_person_data(contact)
+    pd_person_id = contact.pd_person_id
 
     if pd_person_id:
         try:
-            pd_person = await api.get_person(pd_person_id)
-            current_data = pd_person.get('data', {})
-            changed_fields = api.get_changed_fields(current_data, person_data)
+            if changed is None:
+                pd_person = await api.get_person(pd_person_id)
+                current_data = pd_person.get('data', {})
+                changed_fields = api.get_changed_fields(current_data, person_data)
+            else:
+                changed_fields = _changed_data(person_data, changed, PERSON_FIELD_SOURCES, CONTACT_PD_FIELDS)
 
             if changed_fields:
                 await api.update_person(pd_person_id, changed_fields)
-                logger.info(f'Updated person {pd_person_id} for contact {contact_id}')
+                logger.info(f'Updated person {pd_person_id} for contact {contact.id}')
         except Exception as e:
             logger.error(f'Error updating person {pd_person_id}: {e}')
-            if '404' in str(e) or '410' in str(e):
+            if api.is_gone(e):
                 pd_person_id = None
+            else:
+                raise
 
     if not pd_person_id:
         try:
             result = await api.create_person(person_data)
             new_pd_person_id = result['data']['id']
-
-            with get_session() as db:
-                contact = db.get(Contact, contact_id)
-                if contact:
-                    contact.pd_person_id = new_pd_person_id
-                    db.add(contact)
-                    db.commit()
-
-            logger.info(f'Created person {new_pd_person_id} for contact {contact_id}')
+            # So the contact's deals are sent with it
+            contact.pd_person_id = created.persons[contact.id] = new_pd_person_id
+            logger.info(f'Created person {new_pd_person_id} for contact {contact.id}')
         except Exception as e:
-            logger.error(f'Error creating person for contact {contact_id}: {e}')
+            logger.error(f'Error creating person for contact {contact.id}: {e}')
+            raise
 
 
 async def partial_sync_deal_from_company(company: Company, deal: Deal):
@@ -148,11 +316,11 @@ async def partial_sync_deal_from_company(company: Company, deal: Deal):
         return
 
     custom_fields = {}
-    for field in SYNCABLE_DEAL_FIELDS:
-        value = getattr(company, field, None)
+    for field_name in SYNCABLE_DEAL_FIELDS:
+        value = getattr(company, field_name, None)
         if value is None:
             continue
-        pd_field_id = DEAL_PD_FIELD_MAP.get(field)
+        pd_field_id = DEAL_PD_FIELD_MAP.get(field_name)
         if pd_field_id:
             custom_fields[pd_field_id] = str(value) if isinstance(value, int) else value
 
@@ -164,118 +332,125 @@ async def partial_sync_deal_from_company(company: Company, deal: Deal):
         logger.info(f'Updated deal {deal.pd_deal_id}')
     except Exception as e:
         logger.error(f'Error updating deal {deal.pd_deal_id}: {e}')
+        raise
 
 
-async def sync_deal(deal_id: int, only_syncable_deal_fields: bool = False):
+async def sync_deal(deal_id: int, only_syncable_deal_fields: bool = False, changed: Optional[set[str]] = None):
     """
-    Sync a single deal to Pipedrive.
+    Sync a single deal to Pipedrive, sending just the fields from the `changed` Hermes fields if we know them.
     """
+    with get_session() as db:
+        deal = load_deal(db, deal_id)
+    if deal:
+        created = CreatedPDIds()
+        await _send_deal(deal, only_syncable_deal_fields, changed, created)
+        created.save()
+
+
+async def _send_deal(deal: Deal, only_syncable_deal_fields: bool, changed: Optional[set[str]], created: CreatedPDIds):
+    """Update or create the deal in Pipedrive, recording its id in `created` if it's created"""
     from app.core.config import settings
 
-    company = None
-    with get_session() as db:
-        deal = db.get(Deal, deal_id)
-        if not deal:
+    if only_syncable_deal_fields:
+        if changed is not None and not changed.intersection(f'company.{f}' for f in SYNCABLE_DEAL_FIELDS):
             return
-        if only_syncable_deal_fields:
-            company = db.get(Company, deal.company_id)
-        else:
-            deal_data = _deal_to_pd_data(deal, db)
-        pd_deal_id = deal.pd_deal_id
+        return await partial_sync_deal_from_company(deal.company, deal)
 
-    if only_syncable_deal_fields:
-        # we do this so we don't hold the db connection
-        return await partial_sync_deal_from_company(company, deal)
+    deal_data = _deal_to_pd_data(deal)
+    pd_deal_id = deal.pd_deal_id
 
     if pd_deal_id:
         try:
-            pd_deal = await api.get_deal(pd_deal_id)
-            current_data = pd_deal.get('data', {})
-            changed_fields = api.get_changed_fields(current_data, deal_data)
-
-            pd_status = current_data.get('status')
-            hermes_status = deal_data.get('status')
-
-            # only update deals when an 'open' deal on hermes is actually 'open' on PD
-            if (
-                pd_status
-                and pd_status != Deal.STATUS_OPEN
-                and hermes_status == Deal.STATUS_OPEN
-                and 'status' in changed_fields
-            ):
-                logger.info(f'Skipping update for deal {deal_id} because PipeDrive status {pd_status} is not open')
-                return
+            if changed is None:
+                pd_deal = await api.get_deal(pd_deal_id)
+                current_data = pd_deal.get('data', {})
+                changed_fields = api.get_changed_fields(current_data, deal_data)
+
+                pd_status = current_data.get('status')
+                hermes_status = deal_data.get('status')
+
+                # only update deals when an 'open' deal on hermes is actually 'open' on PD
+                if (
+                    pd_status
+                    and pd_status != Deal.STATUS_OPEN
+                    and hermes_status == Deal.STATUS_OPEN
+                    and 'status' in changed_fields
+                ):
+                    logger.info(f'Skipping update for deal {deal.id} because PipeDrive status {pd_status} is not open')
+                    return
+            else:
+                # The status is only sent if it was changed in Hermes, so a deal closed in Pipedrive isn't reopened
+                changed_fields = _changed_data(
+                    deal_data, changed, DEAL_FIELD_SOURCES, DEAL_PD_FIELDS, DEAL_CUSTOM_FIELD_SOURCES
+                )
 
             if changed_fields:
                 await api.update_deal(pd_deal_id, changed_fields)
-                logger.info(f'Updated deal {pd_deal_id} for deal {deal_id}')
+                logger.info(f'Updated deal {pd_deal_id} for deal {deal.id}')
         except Exception as e:
             logger.error(f'Error updating deal {pd_deal_id}: {e}')
+            # A deal deleted from Pipedrive isn't recreated
+            if not api.is_gone(e):
+                raise
 
     if not pd_deal_id:
         if not settings.sync_create_deals:
-            logger.warning(f'Deal {deal_id} has no pd_deal_id, skipping sync (deal creation disabled)')
+            logger.warning(f'Deal {deal.id} has no pd_deal_id, skipping sync (deal creation disabled)')
             return
 
         try:
             result = await api.create_deal(deal_data)
             new_pd_deal_id = result['data']['id']
-
-            with get_session() as db:
-                deal = db.get(Deal, deal_id)
-                if deal:
-                    deal.pd_deal_id = new_pd_deal_id
-                    db.add(deal)
-                    db.commit()
-
-            logger.info(f'Created deal {new_pd_deal_id} for deal {deal_id}')
+            deal.pd_deal_id = created.deals[deal.id] = new_pd_deal_id
+            logger.info(f'Created deal {new_pd_deal_id} for deal {deal.id}')
         except Exception as e:
-            logger.error(f'Error creating deal for deal {deal_id}: {e}')
+            logger.error(f'Error creating deal for deal {deal.id}: {e}')
+            raise
 
 
 async def sync_meeting_to_pipedrive(meeting_id: int):
-    """Sync a meeting as an activity to Pipedrive"""
+    """Sync a meeting as an activity to Pipedrive, raising Pipedrive errors so the outbox retries it"""
     with logfire.span('sync_meeting_to_pipedrive'):
-        try:
-            # Fetch meeting data with short-lived connection
-            with get_session() as db:
-                meeting = db.get(Meeting, meeting_id)
-                if not meeting:
-                    logger.warning(f'Meeting {meeting_id} not found, skipping sync')
-                    return
-                activity_data = _meeting_to_activity_data(meeting, db)
+        # Fetch meeting data with short-lived connection
+        with get_session() as db:
+            meeting = load_meeting(db, meeting_id)
+            if not meeting:
+                logger.warning(f'Meeting {meeting_id} not found, skipping sync')
+                return
+            activity_data = _meeting_to_activity_data(meeting)
 
-            # Make API call without holding database connection
-            result = await api.create_activity(activity_data)
-            logger.info(f'Created activity {result["data"]["id"]} for meeting {meeting_id}')
-        except Exception as e:
-            logger.error(f'Error syncing meeting {meeting_id}: {e}', exc_info=True)
+        # Make API call without holding database connection
+        result = await api.create_activity(activity_data)
+        logger.info(f'Created activity {result["data"]["id"]} for meeting {meeting_id}')
 
 
 async def purge_company_from_pipedrive(company_id: int):
-    """Delete a company and all related data from Pipedrive (for NARC companies)"""
+    """
+    Delete a company and all related data from Pipedrive (for NARC companies), raising Pipedrive errors so the outbox
+    retries it
+    """
     with logfire.span('purge_company_from_pipedrive'):
-        try:
-            with get_session() as db:
-                company = db.get(Company, company_id)
-                if not company:
-                    return
-                pd_org_id = company.pd_org_id
+        with get_session() as db:
+            company = db.get(Company, company_id)
+            if not company:
+                return
+            pd_org_id = company.pd_org_id
 
-            if pd_org_id:
-                try:
-                    await api.delete_organisation(pd_org_id)
-                    logger.info(f'Deleted organization {pd_org_id}')
-                except Exception as e:
-                    logger.error(f'Error deleting organization {pd_org_id}: {e}')
+        if pd_org_id:
+            try:
+                await api.delete_organisation(pd_org_id)
+                logger.info(f'Deleted organization {pd_org_id}')
+            except Exception as e:
+                logger.error(f'Error deleting organization {pd_org_id}: {e}')
+                # Already gone from Pipedrive
+                if not api.is_gone(e):
+                    raise
 
-            logger.info(f'Purged company {company_id} from Pipedrive')
-        except Exception as e:
-            logger.error(f'Error purging company {company_id}: {e}', exc_info=True)
+        logger.info(f'Purged company {company_id} from Pipedrive')
 
 
 def _company_to_org_data(company: Company) -> dict:
-    """Convert Company model to Pipedrive organization data"""
+    """Convert Company model to Pipedrive organization data, loaded with `COMPANY_LOAD`"""
     data = {
         'name': company.name,
         'owner_id': company.sales_person.pd_owner_id if company.sales_person else None,
@@ -286,34 +461,13 @@ def _company_to_org_data(company: Company) -> dict:
     if company.country:
         data['address'] = {'value': company.country, 'country': company.country}
 
-    # Build custom_fields using field mapping
-    custom_fields = {}
-
-    # Map fields to Pipedrive field IDs
-    for field_name, pd_field_id in COMPANY_PD_FIELD_MAP.items():
-        if field_name == 'hermes_id':
-            value = company.id
-        elif field_name == 'tc2_cligency_url':
-            value = company.tc2_cligency_url
-        else:
-            value = getattr(company, field_name, None)
-
-        if value is not None and value != '':
-            # Convert datetime to ISO date string
-            if isinstance(value, datetime):
-                value = value.date().isoformat()
-            # Convert integers to strings for hermes_id and paid_invoice_count (text fields in Pipedrive)
-            elif field_name in ('hermes_id', 'paid_invoice_count') and isinstance(value, int):
-                value = str(value)
-            custom_fields[pd_field_id] = value
-
-    data['custom_fields'] = custom_fields
+    data['custom_fields'] = build_custom_fields(COMPANY_PD_FIELDS, company)
     return data
 
 
-def _contact_to_person_data(contact: Contact, db) -> dict:
-    """Convert Contact model to Pipedrive person data"""
-    company = db.get(Company, contact.company_id)
+def _contact_to_person_data(contact: Contact) -> dict:
+    """Convert Contact model to Pipedrive person data, loaded with `CONTACT_LOAD`"""
+    company = contact.company
 
     data = {
         'name': contact.name,
@@ -327,20 +481,14 @@ def _contact_to_person_data(contact: Contact, db) -> dict:
     if contact.phone:
         data['phones'] = [{'value': contact.phone, 'label': 'work', 'primary': True}]
 
-    # Add custom fields
-    custom_fields = {}
-    for field_name, pd_field_id in CONTACT_PD_FIELD_MAP.items():
-        if field_name == 'hermes_id':
-            custom_fields[pd_field_id] = str(contact.id)
-
-    data['custom_fields'] = custom_fields
+    data['custom_fields'] = build_custom_fields(CONTACT_PD_FIELDS, contact)
     return data
 
 
-def _deal_to_pd_data(deal: Deal, db) -> dict:
-    """Convert Deal model to Pipedrive deal data"""
-    company = db.get(Company, deal.company_id) if deal.company_id else None
-    contact = db.get(Contact, deal.contact_id) if deal.contact_id else None
+def _deal_to_pd_data(deal: Deal) -> dict:
+    """Convert Deal model to Pipedrive deal data, loaded with `DEAL_LOAD`"""
+    company = deal.company
+    contact = deal.contact
 
     data = {
         'title': deal.name,
@@ -352,35 +500,14 @@ def _deal_to_pd_data(deal: Deal, db) -> dict:
         'status': deal.status,
     }
 
-    # Build custom_fields using field mapping
-    custom_fields = {}
-
-    # Map fields to Pipedrive field IDs
-    for field_name, pd_field_id in DEAL_PD_FIELD_MAP.items():
-        if field_name == 'hermes_id':
-            value = deal.id
-        elif field_name == 'tc2_cligency_url':
-            # Get from company
-            value = company.tc2_cligency_url if company else None
-        elif field_name == 'paid_invoice_count':
-            value = company.paid_invoice_count if company else None
-        else:
-            value = getattr(deal, field_name, None)
-
-        if value is not None and value != '':
-            # Convert integers to strings for hermes_id and paid_invoice_count (text fields in Pipedrive)
-            if field_name in ('hermes_id', 'paid_invoice_count') and isinstance(value, int):
-                value = str(value)
-            custom_fields[pd_field_id] = value
-
-    data['custom_fields'] = custom_fields
+    data['custom_fields'] = build_custom_fields(DEAL_PD_FIELDS, deal)
     return data
 
 
-def _meeting_to_activity_data(meeting: Meeting, db) -> dict:
-    """Convert Meeting model to Pipedrive activity data"""
-    contact = db.get(Contact, meeting.contact_id)
-    company = db.get(Company, meeting.company_id) if meeting.company_id else None
+def _meeting_to_activity_data(meeting: Meeting) -> dict:
+    """Convert Meeting model to Pipedrive activity data, loaded with `MEETING_LOAD`"""
+    contact = meeting.contact
+    company = meeting.company
 
     data = {
         'type': 'meeting',
@@ -398,9 +525,7 @@ def _meeting_to_activity_data(meeting: Meeting, db) -> dict:
     if company and company.pd_org_id:
         data['org_id'] = company.pd_org_id
 
-    if meeting.deal_id:
-        deal = db.get(Deal, meeting.deal_id)
-        if deal and deal.pd_deal_id:
-            data['deal_id'] = deal.pd_deal_id
+    if meeting.deal and meeting.deal.pd_deal_id:
+        data['deal_id'] = meeting.deal.pd_deal_id
 
     return data
@@ -1,16 +1,12 @@
 import logging
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
 
 from app.core.database import DBSession, get_db
-from app.pipedrive.models import Organisation, PDDeal, PDPipeline, PDStage, Person, PipedriveEvent
-from app.pipedrive.process import (
-    OrganisationProcessor,
-    PDDealProcessor,
-    PDPipelineProcessor,
-    PDStageProcessor,
-    PersonProcessor,
-)
+from app.pipedrive.models import PDDeletedEvent, PDObjectEvent, PipedriveEvent
+from app.pipedrive.process import PD_ENTITIES
 
 logger = logging.getLogger('hermes.pipedrive')
 
@@ -18,7 +14,7 @@ router = APIRouter(prefix='/pipedrive', tags=['pipedrive'])
 
 
 @router.post('/callback/', name='pipedrive-callback')
-async def pipedrive_callback(event: dict, db: DBSession = Depends(get_db)):
+async def pipedrive_callback(request: Request, db: DBSession = Depends(get_db)):
     """
     Process Pipedrive webhooks: Pipedrive → Hermes (no TC2 sync)
 
@@ -27,52 +23,27 @@ async def pipedrive_callback(event: dict, db: DBSession = Depends(get_db)):
 
     Supported entities: organization, person, deal, pipeline, stage
     """
-    entity = event.get('meta', {}).get('entity')
-    action = event.get('meta', {}).get('action')
-
-    logger.info(f'Received Pipedrive webhook: entity={entity}, action={action}')
-    if entity not in ('organization', 'person', 'deal', 'pipeline', 'stage'):
-        logger.info(f'Ignoring {entity} event')
-        return {'status': 'ok'}
-
+    body = await request.body()
     try:
-        webhook_event = PipedriveEvent(**event)
+        webhook_event = PipedriveEvent.model_validate_json(body)
+        entity = webhook_event.meta.entity
+        logger.info(f'Received Pipedrive webhook: entity={entity}, action={webhook_event.meta.action}')
+        if entity not in PD_ENTITIES:
+            logger.info(f'Ignoring {entity} event')
+            return {'status': 'ok'}
+
+        pd_model, processor_cls = PD_ENTITIES[entity]
         new_data = None
         old_data = None
-        if entity == 'organization':
-            if webhook_event.data:
-                new_data = Organisation(**webhook_event.data)
-            if webhook_event.previous:
-                old_data = Organisation(**webhook_event.previous)
-            await OrganisationProcessor(db).process(old_data, new_data)
-
-        elif entity == 'person':
-            if webhook_event.data:
-                new_data = Person(**webhook_event.data)
-            if webhook_event.previous:
-                old_data = Person(**webhook_event.previous)
-            await PersonProcessor(db).process(old_data, new_data)
+        if webhook_event.data:
+            new_data = PDObjectEvent[pd_model].model_validate_json(body).data
+        else:
+            old_data = PDDeletedEvent[pd_model].model_validate_json(body).previous
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False), body=body)
 
-        elif entity == 'deal':
-            if webhook_event.data:
-                new_data = PDDeal(**webhook_event.data)
-            if webhook_event.previous:
-                old_data = PDDeal(**webhook_event.previous)
-            await PDDealProcessor(db).process(old_data, new_data)
-
-        elif entity == 'pipeline':
-            if webhook_event.data:
-                new_data = PDPipeline(**webhook_event.data)
-            if webhook_event.previous:
-                old_data = PDPipeline(**webhook_event.previous)
-            await PDPipelineProcessor(db).process(old_data, new_data)
-
-        elif entity == 'stage':
-            if webhook_event.data:
-                new_data = PDStage(**webhook_event.data)
-            if webhook_event.previous:
-                old_data = PDStage(**webhook_event.previous)
-            await PDStageProcessor(db).process(old_data, new_data)
+    try:
+        await processor_cls(db).process(old_data, new_data)
 
         logger.info(f'Successfully processed {entity} webhook')
 
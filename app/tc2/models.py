@@ -1,19 +1,33 @@
 import json
 import logging
 from datetime import datetime
-from typing import Optional
-
-from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+from typing import Annotated, Optional
+
+from pydantic import (
+    AliasChoices,
+    AliasPath,
+    BaseModel,
+    ConfigDict,
+    Field,
+    StringConstraints,
+    field_validator,
+    model_validator,
+)
+from typing_extensions import NotRequired, TypedDict
 
 logger = logging.getLogger('tc2')
 
 
-class TCSubject(BaseModel):
-    """A webhook Subject (generally a Client or Invoice)"""
+class TCSubject(TypedDict):
+    """
+    A webhook Subject (generally a Client or Invoice).
+    This is kept as the decoded JSON so that it's only parsed into a model (e.g. TCClient) once, when it's processed.
+    """
+
+    __pydantic_config__ = ConfigDict(extra='allow')
 
-    model: Optional[str] = None
+    model: NotRequired[Optional[str]]
     id: int
-    model_config = ConfigDict(extra='allow')
 
 
 class _TCSimpleRole(BaseModel):
@@ -86,22 +100,10 @@ class TCUser(BaseModel):
 
 
 class TCClientExtraAttr(BaseModel):
-    """TC2 client extra attribute"""
+    """TC2 client extra attribute, values are cleaned up by TCClient"""
 
     machine_name: str
-    value: str
-
-    @field_validator('value')
-    @classmethod
-    def validate_value(cls, v):
-        return v.strip()
-
-    @model_validator(mode='after')
-    def process_value(self):
-        # Don't convert GCLID values to lowercase as they are case-sensitive
-        if self.machine_name != 'gclid':
-            self.value = self.value.lower().strip('-')
-        return self
+    value: Annotated[str, StringConstraints(strip_whitespace=True)]
 
 
 class TCClient(BaseModel):
@@ -112,38 +114,34 @@ class TCClient(BaseModel):
     user: TCUser
     status: str
 
-    sales_person_id: Optional[int] = None
-    associated_admin_id: Optional[int] = None
-    bdr_person_id: Optional[int] = None
+    # Admins are sent as nested objects, we only need their ids
+    sales_person_id: Optional[int] = Field(
+        None, validation_alias=AliasChoices(AliasPath('sales_person', 'id'), 'sales_person_id')
+    )
+    associated_admin_id: Optional[int] = Field(
+        None, validation_alias=AliasChoices(AliasPath('associated_admin', 'id'), 'associated_admin_id')
+    )
+    bdr_person_id: Optional[int] = Field(
+        None, validation_alias=AliasChoices(AliasPath('bdr_person', 'id'), 'bdr_person_id')
+    )
 
     paid_recipients: list[TCRecipient]
     extra_attrs: Optional[list[TCClientExtraAttr]] = None
 
-    @model_validator(mode='before')
-    @classmethod
-    def parse_admins(cls, data):
-        """Extract admin IDs from nested objects"""
-        if associated_admin := data.pop('associated_admin', None):
-            data['associated_admin_id'] = associated_admin['id']
-        if bdr_person := data.pop('bdr_person', None):
-            data['bdr_person_id'] = bdr_person['id']
-        if sales_person := data.pop('sales_person', None):
-            data['sales_person_id'] = sales_person['id']
-        return data
-
-    @model_validator(mode='before')
-    @classmethod
-    def set_user_email(cls, data):
+    @model_validator(mode='after')
+    def set_user_email(self):
         """If user has no email, use first paid recipient email"""
-        if 'user' in data and not data['user'].get('email'):
-            paid_recip_with_email = next((r for r in data['paid_recipients'] if r.get('email')), None)
-            if paid_recip_with_email:
-                data['user']['email'] = paid_recip_with_email['email']
-        return data
+        if not self.user.email:
+            self.user.email = next((r.email for r in self.paid_recipients if r.email), None)
+        return self
 
     @field_validator('extra_attrs')
     @classmethod
-    def remove_null_attrs(cls, v: list[TCClientExtraAttr]):
+    def clean_extra_attrs(cls, v: list[TCClientExtraAttr]):
+        """Lowercase values (except GCLIDs, which are case-sensitive) and remove empty ones"""
+        for attr in v:
+            if attr.machine_name != 'gclid':
+                attr.value = attr.value.lower().strip('-')
         return [attr for attr in v if attr.value]
 
 
@@ -1,11 +1,14 @@
 import logging
 from datetime import datetime, timedelta, timezone
+from typing import Optional
 
-from sqlmodel import select
+from sqlmodel import select, update
 
-from app.core.database import DBSession
+from app.core.database import DBSession, upsert_insert
 from app.main_app.common import get_or_create_deal
+from app.main_app.identity import save_identities
 from app.main_app.models import Admin, Company, Contact, Deal
+from app.pipedrive.outbox import record_changes
 from app.tc2.api import get_client
 from app.tc2.models import TCClient, TCRecipient
 
@@ -39,6 +42,87 @@ def _update_syncable_fields(company: Company, tc_client: TCClient):
         setattr(company, field, value)
 
 
+def _get_extra_attrs(tc_client: TCClient) -> dict:
+    """Map the client's extra attributes by machine name"""
+    return {attr.machine_name: attr.value for attr in tc_client.extra_attrs or []}
+
+
+def _update_extra_attr_fields(company: Company, extra_attrs: dict):
+    """Update the company fields that come from the client's extra attributes, if they are set"""
+    if 'utm_source' in extra_attrs:
+        company.utm_source = extra_attrs['utm_source']
+    if 'utm_campaign' in extra_attrs:
+        company.utm_campaign = extra_attrs['utm_campaign']
+    if 'estimated_monthly_income' in extra_attrs:
+        company.estimated_income = extra_attrs['estimated_monthly_income']
+
+
+def _new_company(
+    tc_client: TCClient,
+    extra_attrs: dict,
+    sales_person: Admin,
+    support_person: Optional[Admin],
+    bdr_person: Optional[Admin],
+) -> Company:
+    """Build (but don't save) a new Company from TC2 client data"""
+    return Company(
+        name=tc_client.meta_agency.name[:255],
+        tc2_agency_id=tc_client.meta_agency.id,
+        tc2_cligency_id=tc_client.id,
+        tc2_status=tc_client.meta_agency.status,
+        country=tc_client.meta_agency.country,
+        website=tc_client.meta_agency.website,
+        paid_invoice_count=tc_client.meta_agency.paid_invoice_count,
+        price_plan=tc_client.meta_agency.price_plan,
+        narc=tc_client.meta_agency.narc or False,
+        pay0_dt=tc_client.meta_agency.pay0_dt,
+        pay1_dt=tc_client.meta_agency.pay1_dt,
+        pay3_dt=tc_client.meta_agency.pay3_dt,
+        card_saved_dt=tc_client.meta_agency.card_saved_dt,
+        email_confirmed_dt=tc_client.meta_agency.email_confirmed_dt,
+        gclid=tc_client.meta_agency.gclid,
+        gclid_expiry_dt=tc_client.meta_agency.gclid_expiry_dt,
+        utm_source=extra_attrs.get('utm_source'),
+        utm_campaign=extra_attrs.get('utm_campaign'),
+        signup_questionnaire=tc_client.meta_agency.signup_questionnaire,
+        estimated_income=extra_attrs.get('estimated_monthly_income'),
+        created=tc_client.meta_agency.created,
+        sales_person_id=sales_person.id,
+        support_person_id=support_person.id if support_person else None,
+        bdr_person_id=bdr_person.id if bdr_person else None,
+    )
+
+
+def _new_contact(
+    recipient: TCRecipient, company_id: int, country: Optional[str], user_email: str = None, user_phone: str = None
+) -> Contact:
+    """
+    Build (but don't save) a new Contact from a TC2 recipient.
+    The recipient's email is used if they have one, otherwise the TC2 user's. Recipients don't have a phone, so the
+    user's is always used.
+    """
+    contact_email = recipient.email or user_email
+    return Contact(
+        tc2_sr_id=recipient.id,
+        first_name=recipient.first_name[:255] if recipient.first_name else None,
+        last_name=recipient.last_name[:255] if recipient.last_name else None,
+        email=contact_email[:255] if contact_email else None,
+        phone=user_phone[:255] if user_phone else None,
+        country=country,
+        company_id=company_id,
+    )
+
+
+def _should_create_deal(tc_client: TCClient) -> bool:
+    """Whether a new deal should be created for the client, based on its status and age"""
+    return (
+        tc_client.meta_agency.status in [Company.STATUS_PENDING_EMAIL_CONF, Company.STATUS_TRIAL]
+        and tc_client.meta_agency.created > datetime.now(timezone.utc) - timedelta(days=90)
+        and tc_client.meta_agency.paid_invoice_count == 0
+        and tc_client.sales_person_id is not None
+    )
+
+
 def _close_open_deals_if_narc_or_terminated(company: Company, db: DBSession):
     """
     Close all open deals for a company if it's marked as NARC or terminated.
@@ -67,7 +151,7 @@ async def get_or_create_company_from_tc2(tc2_cligency_id: int, db: DBSession) ->
 
     # Fetch from TC2 API without holding DB session
     tc_client_data = await get_client(tc2_cligency_id)
-    tc_client = TCClient(**tc_client_data)
+    tc_client = TCClient.model_validate(tc_client_data)
 
     # Now process with DB
     company = await process_tc_client(tc_client, db)
@@ -118,55 +202,19 @@ async def process_tc_client(tc_client: TCClient, db: DBSession, create_deal: boo
         # You may want to handle this differently - perhaps assign to a default admin
         return None
 
-    # Get extra attributes and map to company fields
-    extra_attrs_dict = {}
-    if tc_client.extra_attrs:
-        for attr in tc_client.extra_attrs:
-            extra_attrs_dict[attr.machine_name] = attr.value
+    extra_attrs = _get_extra_attrs(tc_client)
 
     if company:
         _update_syncable_fields(company, tc_client)
         _close_open_deals_if_narc_or_terminated(company, db)
-
-        # handle extra attrs
-        if 'utm_source' in extra_attrs_dict:
-            company.utm_source = extra_attrs_dict['utm_source']
-        if 'utm_campaign' in extra_attrs_dict:
-            company.utm_campaign = extra_attrs_dict['utm_campaign']
-        if 'estimated_monthly_income' in extra_attrs_dict:
-            company.estimated_income = extra_attrs_dict['estimated_monthly_income']
+        _update_extra_attr_fields(company, extra_attrs)
 
         db.add(company)
         db.commit()
         db.refresh(company)
     else:
         # Create new company
-        company = Company(
-            name=tc_client.meta_agency.name[:255],
-            tc2_agency_id=tc_client.meta_agency.id,
-            tc2_cligency_id=tc_client.id,
-            tc2_status=tc_client.meta_agency.status,
-            country=tc_client.meta_agency.country,
-            website=tc_client.meta_agency.website,
-            paid_invoice_count=tc_client.meta_agency.paid_invoice_count,
-            price_plan=tc_client.meta_agency.price_plan,
-            narc=tc_client.meta_agency.narc or False,
-            pay0_dt=tc_client.meta_agency.pay0_dt,
-            pay1_dt=tc_client.meta_agency.pay1_dt,
-            pay3_dt=tc_client.meta_agency.pay3_dt,
-            card_saved_dt=tc_client.meta_agency.card_saved_dt,
-            email_confirmed_dt=tc_client.meta_agency.email_confirmed_dt,
-            gclid=tc_client.meta_agency.gclid,
-            gclid_expiry_dt=tc_client.meta_agency.gclid_expiry_dt,
-            utm_source=extra_attrs_dict.get('utm_source'),
-            utm_campaign=extra_attrs_dict.get('utm_campaign'),
-            signup_questionnaire=tc_client.meta_agency.signup_questionnaire,
-            estimated_income=extra_attrs_dict.get('estimated_monthly_income'),
-            created=tc_client.meta_agency.created,
-            sales_person_id=sales_person.id,
-            support_person_id=support_person.id if support_person else None,
-            bdr_person_id=bdr_person.id if bdr_person else None,
-        )
+        company = _new_company(tc_client, extra_attrs, sales_person, support_person, bdr_person)
         db.add(company)
         db.commit()
         db.refresh(company)
@@ -177,21 +225,12 @@ async def process_tc_client(tc_client: TCClient, db: DBSession, create_deal: boo
                 primary_contact = contact
 
     # Create deal if requested and conditions are met
-    if create_deal and not company.narc:
-        # Determine if we should create a deal based on company status and age
-        should_create_deal = (
-            tc_client.meta_agency.status in [Company.STATUS_PENDING_EMAIL_CONF, Company.STATUS_TRIAL]
-            and tc_client.meta_agency.created > datetime.now(timezone.utc) - timedelta(days=90)
-            and tc_client.meta_agency.paid_invoice_count == 0
-            and tc_client.sales_person_id is not None
-        )
-
-        if should_create_deal:
-            try:
-                deal = await get_or_create_deal(company, primary_contact, db)
-                logger.info(f'Deal {deal.id} created/found for company {company.id}')
-            except Exception as e:
-                logger.error(f'Failed to create deal for company {company.id}: {e}')
+    if create_deal and not company.narc and _should_create_deal(tc_client):
+        try:
+            deal = await get_or_create_deal(company, primary_contact, db)
+            logger.info(f'Deal {deal.id} created/found for company {company.id}')
+        except Exception as e:
+            logger.error(f'Failed to create deal for company {company.id}: {e}')
 
     return company
 
@@ -214,21 +253,9 @@ async def process_tc_recipient(
     """
     contact = db.exec(select(Contact).where(Contact.tc2_sr_id == recipient.id)).one_or_none()
 
-    # Use recipient email/phone if available, otherwise fallback to user email/phone
-    contact_email = recipient.email or user_email
-    contact_phone = user_phone  # Recipients don't have phone, always use user phone
-
     if not contact:
         # Create new contact
-        contact = Contact(
-            tc2_sr_id=recipient.id,
-            first_name=recipient.first_name[:255] if recipient.first_name else None,
-            last_name=recipient.last_name[:255] if recipient.last_name else None,
-            email=contact_email[:255] if contact_email else None,
-            phone=contact_phone[:255] if contact_phone else None,
-            country=company.country,
-            company_id=company.id,
-        )
+        contact = _new_contact(recipient, company.id, company.country, user_email, user_phone)
         db.add(contact)
         db.commit()
         db.refresh(contact)
@@ -236,3 +263,171 @@ async def process_tc_recipient(
     # we return contact back without updating it if it already exists
 
     return contact
+
+
+async def process_tc_clients(
+    tc_clients: list[TCClient], db: DBSession, create_deal: bool = True
+) -> list[Optional[Company]]:
+    """
+    Process a batch of TC2 clients, as sent together in one webhook, with the same result as calling
+    `process_tc_client` for each in turn.
+
+    Admins, companies and contacts are looked up with one `IN` query each rather than per client, new companies and
+    contacts are upserted with `INSERT ... ON CONFLICT` and everything is committed once. Deals are then created for
+    the companies that need them.
+
+    A new client whose agency already has a company (under another cligency id) is skipped, as the upsert can only
+    resolve a conflict on `tc2_cligency_id` and `tc2_agency_id` is unique too.
+
+    Returns:
+        The Company for each client, in the same order, or None where the client's sales person wasn't found or its
+        agency already has a company
+    """
+    if not tc_clients:
+        return []
+
+    admin_ids = {
+        admin_id
+        for tc_client in tc_clients
+        for admin_id in (tc_client.sales_person_id, tc_client.associated_admin_id, tc_client.bdr_person_id)
+        if admin_id
+    }
+    admins = {a.tc2_admin_id: a for a in db.exec(select(Admin).where(Admin.tc2_admin_id.in_(admin_ids)))}
+    cligency_ids = {tc_client.id for tc_client in tc_clients}
+    companies = {
+        c.tc2_cligency_id: c for c in db.exec(select(Company).where(Company.tc2_cligency_id.in_(cligency_ids)))
+    }
+    new_agency_ids = {tc_client.meta_agency.id for tc_client in tc_clients if tc_client.id not in companies}
+    taken_agency_ids = set(
+        db.exec(select(Company.tc2_agency_id).where(Company.tc2_agency_id.in_(new_agency_ids))).all()
+    )
+
+    new_companies: dict[int, Company] = {}
+    new_contacts: dict[int, Contact] = {}
+    # The first paid recipient of each new company, used as the contact on its deal
+    primary_sr_ids: dict[int, int] = {}
+    closing_deals_company_ids = set()
+    # Indexes of the clients whose sales person was found
+    processed: list[int] = []
+
+    for i, tc_client in enumerate(tc_clients):
+        logger.info(
+            f'Processing client {tc_client.id}: sales_person_id={tc_client.sales_person_id}, support_person_id={tc_client.associated_admin_id}, bdr_person_id={tc_client.bdr_person_id}'
+        )
+        sales_person = admins.get(tc_client.sales_person_id)
+        if not sales_person:
+            logger.error(f'Sales person {tc_client.sales_person_id} not found for client {tc_client.id}')
+            continue
+        if tc_client.bdr_person_id and tc_client.bdr_person_id not in admins:
+            logger.warning(f'BDR person {tc_client.bdr_person_id} not found for client {tc_client.id}')
+
+        # A client sent twice in the same webhook updates the company created by its first event
+        company = companies.get(tc_client.id) or new_companies.get(tc_client.id)
+        if not company and tc_client.meta_agency.id in taken_agency_ids:
+            logger.error(f'Agency {tc_client.meta_agency.id} of client {tc_client.id} already has a company')
+            continue
+
+        processed.append(i)
+        extra_attrs = _get_extra_attrs(tc_client)
+        if company:
+            _update_syncable_fields(company, tc_client)
+            _update_extra_attr_fields(company, extra_attrs)
+            if company.id and (company.narc or company.tc2_status == Company.STATUS_TERMINATED):
+                closing_deals_company_ids.add(company.id)
+        else:
+            taken_agency_ids.add(tc_client.meta_agency.id)
+            new_companies[tc_client.id] = _new_company(
+                tc_client,
+                extra_attrs,
+                sales_person,
+                admins.get(tc_client.associated_admin_id),
+                admins.get(tc_client.bdr_person_id),
+            )
+            for recipient in tc_client.paid_recipients:
+                if recipient.id not in new_contacts:
+                    new_contacts[recipient.id] = _new_contact(
+                        recipient,
+                        tc_client.id,
+                        tc_client.meta_agency.country,
+                        tc_client.user.email,
+                        tc_client.user.phone,
+                    )
+            if tc_client.paid_recipients:
+                primary_sr_ids[tc_client.id] = tc_client.paid_recipients[0].id
+
+    for company in companies.values():
+        db.add(company)
+
+    if closing_deals_company_ids:
+        closed_deals = db.exec(
+            update(Deal)
+            .where(Deal.company_id.in_(closing_deals_company_ids), Deal.status == Deal.STATUS_OPEN)
+            .values(status=Deal.STATUS_LOST)
+            .returning(Deal.id, Deal.company_id)
+        ).all()
+        for deal_id, company_id in closed_deals:
+            record_changes(db, company_id, {f'deal:{deal_id}': ['status']})
+        if closed_deals:
+            logger.info(
+                f'Closed {len(closed_deals)} open deals for narc/terminated companies {closing_deals_company_ids}'
+            )
+
+    if new_companies:
+        # Another worker may have created the company since we looked, in which case we update it as if it existed
+        stmt = upsert_insert(db, Company).values([c.model_dump(exclude={'id'}) for c in new_companies.values()])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Company.tc2_cligency_id],
+            set_={field: getattr(stmt.excluded, field) for field in COMPANY_SYNCABLE_FIELDS},
+        )
+        company_ids = dict(db.exec(stmt.returning(Company.tc2_cligency_id, Company.id)).all())
+        # Including any created by another worker, as we don't know what it's synced
+        for company_id in company_ids.values():
+            record_changes(db, company_id, {f'company:{company_id}': None})
+
+        if new_contacts:
+            contact_rows = []
+            for contact in new_contacts.values():
+                # Contacts were built with the company's cligency id, swap it for the new company's id
+                contact.company_id = company_ids[contact.company_id]
+                contact_rows.append(contact.model_dump(exclude={'id'}))
+            # Contacts that already exist are left as they are
+            new_contact_ids = db.exec(
+                upsert_insert(db, Contact)
+                .values(contact_rows)
+                .on_conflict_do_nothing(index_elements=['tc2_sr_id'])
+                .returning(Contact.id, Contact.company_id, Contact.email, Contact.phone, Contact.country)
+            ).all()
+            for contact_id, company_id, *_ in new_contact_ids:
+                record_changes(db, company_id, {f'contact:{contact_id}': None})
+            # Saved with the ORM's listeners for contacts it saves
+            save_identities(db.connection(), [(c[0], *c[2:]) for c in new_contact_ids])
+
+    db.commit()
+
+    companies = {
+        c.tc2_cligency_id: c for c in db.exec(select(Company).where(Company.tc2_cligency_id.in_(cligency_ids)))
+    }
+    primary_contacts = {}
+    if primary_sr_ids:
+        contacts = {
+            c.tc2_sr_id: c for c in db.exec(select(Contact).where(Contact.tc2_sr_id.in_(primary_sr_ids.values())))
+        }
+        primary_contacts = {cligency_id: contacts.get(sr_id) for cligency_id, sr_id in primary_sr_ids.items()}
+
+    if create_deal:
+        deal_company_ids = set()
+        for tc_client in (tc_clients[i] for i in processed):
+            company = companies[tc_client.id]
+            if company.narc or company.id in deal_company_ids or not _should_create_deal(tc_client):
+                continue
+            deal_company_ids.add(company.id)
+            try:
+                deal = await get_or_create_deal(company, primary_contacts.get(tc_client.id), db)
+                logger.info(f'Deal {deal.id} created/found for company {company.id}')
+            except Exception as e:
+                logger.error(f'Failed to create deal for company {company.id}: {e}')
+
+    results = [None] * len(tc_clients)
+    for i in processed:
+        results[i] = companies[tc_clients[i].id]
+    return results
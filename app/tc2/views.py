@@ -1,59 +1,91 @@
+import hashlib
+import hmac
 import logging
+from functools import cache
 from typing import Optional
 
-from fastapi import APIRouter, BackgroundTasks, Header
+from fastapi import APIRouter, BackgroundTasks, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+from starlette.datastructures import Headers
 
 from app.core.config import settings
 from app.core.database import get_session
-from app.pipedrive.tasks import purge_company_from_pipedrive, sync_company_to_pipedrive
-from app.tc2.models import TCClient, TCWebhook
-from app.tc2.process import process_tc_client
+from app.main_app.models import TC2Event
+from app.pipedrive.outbox import relay_outbox
+from app.tc2.models import TCWebhook
+from app.tc2.worker import process_tc2_events, tc2_event_pool
 
 logger = logging.getLogger('hermes.tc2')
 
 router = APIRouter(prefix='/tc2', tags=['tc2'])
 
 
+@cache
+def _tc2_hmac() -> hmac.HMAC:
+    """The HMAC used to sign TC2 webhooks, keyed once and copied for each webhook"""
+    return hmac.new(settings.tc2_shared_key.encode(), digestmod=hashlib.sha256)
+
+
+def verify_tc2_signature(body: bytes, signature: Optional[str]) -> bool:
+    """Check the webhook's signature (the hex HMAC-SHA256 of the raw body) in constant time"""
+    if not signature:
+        return False
+    mac = _tc2_hmac().copy()
+    mac.update(body)
+    return hmac.compare_digest(mac.hexdigest(), signature)
+
+
+def is_signed_tc2_webhook(body: bytes, headers: Headers) -> bool:
+    """Whether a TC2 webhook is signed, or signatures aren't checked in dev mode"""
+    return settings.dev_mode or verify_tc2_signature(body, headers.get('X-Webhook-Signature'))
+
+
 @router.post('/callback/', name='tc2-callback')
-async def tc2_callback(
-    webhook: TCWebhook,
-    background_tasks: BackgroundTasks,
-    webhook_signature: Optional[str] = Header(None, alias='X-Webhook-Signature'),
-):
+async def tc2_callback(request: Request, background_tasks: BackgroundTasks):
     """
     Process TC2 webhooks: TC2 → Hermes → Pipedrive
 
-    Handles Client and Invoice events from TutorCruncher.
+    Handles Client and Invoice events from TutorCruncher. Client events are stored and acknowledged, then processed
+    by the TC2 event workers.
     """
-    # Verify HMAC signature (skip in dev mode)
-    if not settings.dev_mode:
-        # TODO: Get request body for signature verification
-        # For now, we'll skip this but it should be implemented
-        pass
+    body = await request.body()
+    # Verify HMAC signature before parsing anything (skip in dev mode)
+    if not is_signed_tc2_webhook(body, request.headers):
+        logger.warning('Rejecting TC2 webhook with invalid signature')
+        return JSONResponse({'status': 'error', 'message': 'Invalid signature'}, status_code=403)
 
+    try:
+        webhook = TCWebhook.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False), body=body)
+
+    events = []
     for event in webhook.events:
-        if event.subject.model == 'Client':
+        if event.subject.get('model') == 'Client':
             if event.action == 'AGREE_TERMS':
                 logger.info('Ignoring AGREE_TERMS event')
                 continue
 
-            try:
-                # Process the client (creates/updates Company and Contacts)
-                with get_session() as db:
-                    company = await process_tc_client(TCClient(**event.subject.model_dump()), db)
+            events.append(TC2Event(action=event.action, tc2_cligency_id=event.subject['id'], data=event.subject))
 
-                if company:
-                    # Queue background task to sync to Pipedrive
-                    if company.narc:
-                        # NARC companies are deleted/purged from Pipedrive
-                        background_tasks.add_task(purge_company_from_pipedrive, company.id)
-                    else:
-                        background_tasks.add_task(sync_company_to_pipedrive, company.id)
+        else:
+            logger.info(f'Ignoring event with subject model {event.subject.get("model")}')
 
-            except Exception as e:
-                logger.error(f'Error processing TC2 client event: {e}', exc_info=True)
+    if events:
+        # Store the events so they're processed even if we restart before getting to them
+        with get_session() as db:
+            # The events are passed to the workers after the session is closed
+            db.expire_on_commit = False
+            db.add_all(events)
+            db.commit()
 
+        if tc2_event_pool.running:
+            tc2_event_pool.submit(events)
         else:
-            logger.info(f'Ignoring event with subject model {event.subject.model}')
+            # Without the worker pool (when the app's lifespan hasn't run, e.g. in tests) process them now
+            if await process_tc2_events([event.id for event in events]):
+                relay_outbox(background_tasks)
 
     return {'status': 'ok'}
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from sqlmodel import select
+
+from app.core.config import settings
+from app.core.database import get_session
+from app.core.pool import pool_user
+from app.main_app.models import PipedriveOutbox, TC2Event
+from app.pipedrive.outbox import add_to_outbox, pd_outbox_relay
+from app.tc2.models import TCClient
+from app.tc2.process import process_tc_client, process_tc_clients
+
+logger = logging.getLogger('hermes.tc2')
+
+
+async def process_tc2_events(event_ids: list[int]) -> dict[int, bool]:
+    """
+    Process stored TC2 events (creating/updating Companies and Contacts) and mark them as processed, adding the
+    updated companies' syncs to the Pipedrive outbox in the same transaction.
+
+    The clients are processed together, falling back to one at a time so that one bad client doesn't stop the rest
+    from being processed. Events that can't be parsed, or whose client fails to process, are marked as failed.
+
+    Returns:
+        The narc flag of each company that was updated, by company id
+    """
+    with get_session() as db:
+        events = db.exec(select(TC2Event).where(TC2Event.id.in_(event_ids)).order_by(TC2Event.id)).all()
+        # The parsed clients, by the id of their event
+        tc_clients: dict[int, TCClient] = {}
+        errors = {}
+        for event in events:
+            try:
+                tc_clients[event.id] = TCClient.model_validate(event.data)
+            except Exception as e:
+                logger.error(f'Error processing TC2 client event: {e}', exc_info=True)
+                errors[event.id] = str(e)
+
+        companies = []
+        if tc_clients:
+            try:
+                companies = await process_tc_clients(list(tc_clients.values()), db)
+            except Exception as e:
+                logger.error(f'Error processing TC2 clients in bulk, processing individually: {e}', exc_info=True)
+                db.rollback()
+                for event_id, tc_client in tc_clients.items():
+                    try:
+                        companies.append(await process_tc_client(tc_client, db))
+                    except Exception as e:
+                        logger.error(f'Error processing TC2 client event: {e}', exc_info=True)
+                        db.rollback()
+                        errors[event_id] = str(e)
+        company_narcs = {company.id: company.narc for company in companies if company}
+        for company_id, narc in company_narcs.items():
+            # NARC companies are deleted/purged from Pipedrive
+            action = PipedriveOutbox.ACTION_PURGE_COMPANY if narc else PipedriveOutbox.ACTION_SYNC_COMPANY
+            add_to_outbox(db, action, company_id)
+
+        now = datetime.now(timezone.utc)
+        for event in events:
+            event.processed = now
+            if event.id in errors:
+                event.status = TC2Event.STATUS_FAILED
+                event.error = errors[event.id]
+            else:
+                event.status = TC2Event.STATUS_PROCESSED
+            db.add(event)
+        db.commit()
+
+    return company_narcs
+
+
+def _process_tc2_events_in_thread(event_ids: list[int]) -> dict[int, bool]:
+    """Run `process_tc2_events` in its own event loop, as it's blocking database work, for running in a thread"""
+    return asyncio.run(process_tc2_events(event_ids))
+
+
+def _mark_events_failed(event_ids: list[int], error: str):
+    """Mark events that couldn't be processed as failed, so they aren't left pending until the next restart"""
+    with get_session() as db:
+        events = db.exec(
+            select(TC2Event).where(TC2Event.id.in_(event_ids), TC2Event.status == TC2Event.STATUS_PENDING)
+        ).all()
+        now = datetime.now(timezone.utc)
+        for event in events:
+            event.status = TC2Event.STATUS_FAILED
+            event.processed = now
+            event.error = error
+            db.add(event)
+        db.commit()
+
+
+class TC2EventPool:
+    """
+    Processes stored TC2 events in the background.
+
+    Events are split between the workers by cligency, so each cligency's events are always processed by the same
+    worker in the order they were received, while different cligencies are processed in parallel. Each worker takes
+    all of its waiting events (up to `batch_size`) at once so they can be processed in bulk, in a thread (with its own
+    session) so the workers' database work doesn't block the event loop or each other.
+
+    Events in a batch that fails are marked as failed.
+    """
+
+    def __init__(self, workers: int, batch_size: int):
+        self.workers = workers
+        self.batch_size = batch_size
+        self._queues: list[asyncio.Queue] = []
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def backlog(self) -> int:
+        """The number of events waiting to be processed"""
+        return sum(queue.qsize() for queue in self._queues)
+
+    async def start(self):
+        self._queues = [asyncio.Queue() for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._work(queue)) for queue in self._queues]
+        logger.info(f'Started {self.workers} TC2 event workers')
+
+        # Events received before the last shutdown that were never processed
+        with get_session() as db:
+            pending = db.exec(
+                select(TC2Event).where(TC2Event.status == TC2Event.STATUS_PENDING).order_by(TC2Event.id)
+            ).all()
+            if pending:
+                logger.info(f'Requeueing {len(pending)} pending TC2 events')
+                self.submit(pending)
+
+    async def stop(self, timeout: float = 10):
+        """Wait (up to `timeout` seconds) for queued events to be processed then stop the workers"""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues)), timeout)
+        except asyncio.TimeoutError:
+            # Anything left is still pending in the DB, so will be requeued on startup
+            logger.warning('Timed out waiting for TC2 events to be processed')
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._queues, self._tasks = [], []
+
+    def submit(self, events: list[TC2Event]):
+        """Queue events to be processed"""
+        for event in events:
+            self._queues[event.tc2_cligency_id % self.workers].put_nowait(event.id)
+
+    async def _work(self, queue: asyncio.Queue):
+        while True:
+            event_ids = [await queue.get()]
+            while len(event_ids) < self.batch_size and not queue.empty():
+                event_ids.append(queue.get_nowait())
+
+            try:
+                with pool_user('tc2_events'):
+                    company_narcs = await asyncio.to_thread(_process_tc2_events_in_thread, event_ids)
+            except Exception as e:
+                logger.error(f'Error processing TC2 events {event_ids}: {e}', exc_info=True)
+                try:
+                    await asyncio.to_thread(_mark_events_failed, event_ids, str(e))
+                except Exception as mark_error:
+                    logger.error(f'Error marking TC2 events {event_ids} as failed: {mark_error}', exc_info=True)
+            else:
+                if company_narcs:
+                    pd_outbox_relay.notify()
+            finally:
+                for _ in event_ids:
+                    queue.task_done()
+
+
+tc2_event_pool = TC2EventPool(settings.tc2_event_workers, settings.tc2_event_batch_size)
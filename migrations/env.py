@@ -6,7 +6,22 @@ from sqlmodel import SQLModel
 from alembic import context
 
 # Import all models to ensure they are registered with SQLModel
-from app.main_app.models import Admin, Company, Config, Contact, Deal, Meeting, Pipeline, Stage
+from app.main_app.models import (
+    Admin,
+    Company,
+    Config,
+    Contact,
+    ContactIdentity,
+    Deal,
+    IdempotentResponse,
+    Meeting,
+    Pipeline,
+    PipedriveOutbox,
+    PipedriveSyncCursor,
+    RoundRobinCursor,
+    Stage,
+    TC2Event,
+)
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,53 @@
+"""index callbooker contact and company lookups
+
+Revision ID: d83b6f4e1a59
+Revises: c51d3e8a7f02
+Create Date: 2026-10-18 17:10:44.918203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd83b6f4e1a59'
+down_revision: Union[str, Sequence[str], None] = 'c51d3e8a7f02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # Built concurrently so bookings aren't blocked on large tables, which can't be done in a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_company_name_lower', 'company', [sa.text('lower(name)')], unique=False, postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_company_name_trgm',
+            'company',
+            ['name'],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_ops={'name': 'gin_trgm_ops'},
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_contact_company_id_last_name_lower',
+            'contact',
+            ['company_id', sa.text('lower(last_name)')],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_contact_company_id_last_name_lower', table_name='contact', postgresql_concurrently=True)
+        op.drop_index('ix_company_name_trgm', table_name='company', postgresql_concurrently=True)
+        op.drop_index('ix_company_name_lower', table_name='company', postgresql_concurrently=True)
@@ -0,0 +1,45 @@
+"""index company search filters
+
+Revision ID: 6f2d8b3e9c14
+Revises: a1c6e3f85d27
+Create Date: 2026-10-18 19:20:05.140382
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6f2d8b3e9c14'
+down_revision: Union[str, Sequence[str], None] = 'a1c6e3f85d27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The company search's filters, each indexed with the (name, id) the results are ordered by
+FILTER_COLUMNS = ('country', 'price_plan', 'tc2_status', 'sales_person_id', 'support_person_id', 'bdr_person_id')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Built concurrently so companies can still be written while they're built
+    with op.get_context().autocommit_block():
+        op.create_index('ix_company_name_id', 'company', ['name', 'id'], unique=False, postgresql_concurrently=True)
+        for column in FILTER_COLUMNS:
+            op.create_index(
+                f'ix_company_{column}_name_id',
+                'company',
+                [column, 'name', 'id'],
+                unique=False,
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for column in reversed(FILTER_COLUMNS):
+            op.drop_index(f'ix_company_{column}_name_id', table_name='company', postgresql_concurrently=True)
+        op.drop_index('ix_company_name_id', table_name='company', postgresql_concurrently=True)
@@ -0,0 +1,31 @@
+"""idempotent responses can be pending
+
+Revision ID: b83e0d4c7a61
+Revises: 6f2d8b3e9c14
+Create Date: 2026-10-19 09:30:12.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b83e0d4c7a61'
+down_revision: Union[str, Sequence[str], None] = '6f2d8b3e9c14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A request's key is claimed, with no response, before it's processed
+    op.alter_column('idempotentresponse', 'status_code', existing_type=sa.Integer(), nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DELETE FROM idempotentresponse WHERE status_code IS NULL')
+    op.alter_column('idempotentresponse', 'status_code', existing_type=sa.Integer(), nullable=False)
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Reconcile Hermes with Pipedrive, finding (and with --live, fixing) objects that have drifted apart.
+
+Without --live the corrections are only logged, so it's safe to run at any time to check for drift.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+
+import click
+
+from app.pipedrive.reconcile import ENTITIES, reconcile
+
+logging.basicConfig(level=logging.INFO)
+
+
+@click.command()
+@click.option('--entity', 'entities', type=click.Choice(list(ENTITIES)), multiple=True)
+@click.option('--live', is_flag=True)
+def main(entities, live):
+    start = datetime.now()
+    results = asyncio.run(reconcile(list(entities), live))
+    for name, counts in results.items():
+        print(f'{name}: {dict(counts) or "no corrections"}')
+    print(f'{"Applied" if live else "Not applying"} corrections')
+    print(f'Reconcile took {(datetime.now() - start).total_seconds():0.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Tests for working hours calculation across timezones and DST changes.
+"""
+
+import time as time_mod
+from datetime import datetime, time, timedelta, timezone
+
+from app.callbooker.availability import WorkingHours, get_day_start_ends, get_working_hours
+
+utc = timezone.utc
+
+
+def _windows(tz_name: str, start: datetime, end: datetime, min_start=time(10), max_end=time(17, 30)):
+    return list(WorkingHours(tz_name, min_start, max_end).day_windows(start, end))
+
+
+class TestWorkingHours:
+    """Test UTC working hour windows"""
+
+    def test_london_bst_ends(self):
+        """Clocks go back on Sunday 25th Oct 2026, so working hours move an hour later in UTC"""
+        windows = _windows('Europe/London', datetime(2026, 10, 22, tzinfo=utc), datetime(2026, 10, 27, tzinfo=utc))
+
+        assert windows == [
+            (datetime(2026, 10, 22, 9, tzinfo=utc), datetime(2026, 10, 22, 16, 30, tzinfo=utc)),
+            (datetime(2026, 10, 23, 9, tzinfo=utc), datetime(2026, 10, 23, 16, 30, tzinfo=utc)),
+            (datetime(2026, 10, 26, 10, tzinfo=utc), datetime(2026, 10, 26, 17, 30, tzinfo=utc)),
+            (datetime(2026, 10, 27, 10, tzinfo=utc), datetime(2026, 10, 27, 17, 30, tzinfo=utc)),
+        ]
+
+    def test_london_bst_starts(self):
+        """Clocks go forward on Sunday 29th Mar 2026"""
+        windows = _windows('Europe/London', datetime(2026, 3, 27, tzinfo=utc), datetime(2026, 3, 30, tzinfo=utc))
+
+        assert windows == [
+            (datetime(2026, 3, 27, 10, tzinfo=utc), datetime(2026, 3, 27, 17, 30, tzinfo=utc)),
+            (datetime(2026, 3, 30, 9, tzinfo=utc), datetime(2026, 3, 30, 16, 30, tzinfo=utc)),
+        ]
+
+    def test_us_dst_starts(self):
+        """New York moves from -5 to -4 on Sunday 8th Mar 2026"""
+        windows = _windows(
+            'America/New_York', datetime(2026, 3, 6, 12, tzinfo=utc), datetime(2026, 3, 9, 23, tzinfo=utc)
+        )
+
+        assert windows == [
+            (datetime(2026, 3, 6, 15, tzinfo=utc), datetime(2026, 3, 6, 22, 30, tzinfo=utc)),
+            (datetime(2026, 3, 9, 14, tzinfo=utc), datetime(2026, 3, 9, 21, 30, tzinfo=utc)),
+        ]
+
+    def test_southern_hemisphere(self):
+        """Sydney's DST starts on 4th Oct 2026, when the UTC offset goes from +10 to +11"""
+        windows = _windows('Australia/Sydney', datetime(2026, 10, 1, 15, tzinfo=utc), datetime(2026, 10, 5, tzinfo=utc))
+
+        assert windows == [
+            (datetime(2026, 10, 2, 0, tzinfo=utc), datetime(2026, 10, 2, 7, 30, tzinfo=utc)),
+            (datetime(2026, 10, 4, 23, tzinfo=utc), datetime(2026, 10, 5, 6, 30, tzinfo=utc)),
+        ]
+
+    def test_nonexistent_local_time(self):
+        """01:30 doesn't exist in London on 29th Mar 2026, it's treated as 02:30 BST"""
+        wh = WorkingHours('Europe/London', time(1, 30), time(17, 30))
+
+        assert wh._to_utc(datetime(2026, 3, 29).date(), time(1, 30)) == datetime(2026, 3, 29, 1, 30, tzinfo=utc)
+
+    def test_skips_weekends_in_local_time(self):
+        """Friday evening UTC is Saturday in Auckland, so it's skipped"""
+        windows = _windows(
+            'Pacific/Auckland', datetime(2026, 7, 10, 13, tzinfo=utc), datetime(2026, 7, 12, 13, tzinfo=utc)
+        )
+
+        assert windows == [(datetime(2026, 7, 12, 22, tzinfo=utc), datetime(2026, 7, 13, 5, 30, tzinfo=utc))]
+
+    def test_spans_years(self):
+        windows = _windows('Europe/London', datetime(2026, 12, 31, tzinfo=utc), datetime(2027, 1, 1, tzinfo=utc))
+
+        assert windows == [
+            (datetime(2026, 12, 31, 10, tzinfo=utc), datetime(2026, 12, 31, 17, 30, tzinfo=utc)),
+            (datetime(2027, 1, 1, 10, tzinfo=utc), datetime(2027, 1, 1, 17, 30, tzinfo=utc)),
+        ]
+
+    def test_shared_between_admins_in_same_zone(self):
+        london = get_working_hours('Europe/London', time(10), time(17, 30))
+
+        assert get_working_hours('Europe/London', time(10), time(17, 30)) is london
+        assert get_working_hours('Europe/London', time(9), time(17, 30)) is not london
+        assert get_working_hours('US/Eastern', time(10), time(17, 30)) is not london
+
+    def test_cached_lookups_are_fast(self):
+        """Once a year's windows are calculated, a 90 day lookup is just dict gets"""
+        wh = get_working_hours('Europe/London', time(10), time(17, 30))
+        start = datetime(2026, 1, 5, tzinfo=utc)
+        end = start + timedelta(days=90)
+        list(wh.day_windows(start, end))
+
+        t0 = time_mod.perf_counter()
+        for _ in range(1000):
+            list(wh.day_windows(start, end))
+        assert time_mod.perf_counter() - t0 < 1
+
+
+class TestGetDayStartEnds:
+    """Test get_day_start_ends uses the config's working hours"""
+
+    async def test_includes_days_either_side(self, db):
+        windows = [
+            w
+            async for w in get_day_start_ends(
+                datetime(2026, 10, 27, 12, tzinfo=utc), datetime(2026, 10, 27, 13, tzinfo=utc), 'Europe/London'
+            )
+        ]
+
+        assert windows == [
+            (datetime(2026, 10, 26, 10, tzinfo=utc), datetime(2026, 10, 26, 17, 30, tzinfo=utc)),
+            (datetime(2026, 10, 27, 10, tzinfo=utc), datetime(2026, 10, 27, 17, 30, tzinfo=utc)),
+            (datetime(2026, 10, 28, 10, tzinfo=utc), datetime(2026, 10, 28, 17, 30, tzinfo=utc)),
+        ]
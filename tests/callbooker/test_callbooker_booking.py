@@ -8,7 +8,7 @@ from unittest.mock import patch
 from pytz import utc
 from sqlmodel import select
 
-from app.main_app.models import Admin, Company, Config, Contact, Deal, Meeting, Pipeline, Stage
+from app.main_app.models import Admin, Company, Config, Contact, Deal, Meeting, PipedriveOutbox, Pipeline, Stage
 from tests.helpers import fake_gcal_builder
 
 CB_MEETING_DATA = {
@@ -38,7 +38,7 @@ class TestSalesCallBooking:
     """Test sales call booking flow"""
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_creates_company_and_contact(
         self, mock_gcal_builder, mock_add_task, client, db, test_pipeline, test_stage, test_config
     ):
@@ -69,7 +69,7 @@ class TestSalesCallBooking:
         assert meeting.meeting_type == Meeting.TYPE_SALES
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_finds_existing_company_by_id(
         self, mock_gcal_builder, mock_add_task, client, db, test_pipeline, test_stage, test_config
     ):
@@ -92,7 +92,7 @@ class TestSalesCallBooking:
         assert companies[0].id == company.id
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_finds_existing_contact_by_email(
         self, mock_gcal_builder, mock_add_task, client, db, test_pipeline, test_stage, test_config
     ):
@@ -142,7 +142,7 @@ class TestSalesCallBooking:
         assert r.json() == {'status': 'error', 'message': 'You already have a meeting booked around this time.'}
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_exactly_2_hours_before_existing_meeting(
         self, mock_gcal_builder, mock_add_task, client, db, test_pipeline, test_stage, test_config
     ):
@@ -177,7 +177,7 @@ class TestSalesCallBooking:
         assert 'already have a meeting' in r.json()['message']
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_just_outside_2_hour_window(
         self, mock_gcal_builder, mock_add_task, client, db, test_pipeline, test_stage, test_config
     ):
@@ -211,7 +211,7 @@ class TestSalesCallBooking:
         assert r.status_code == 200
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_truncates_very_long_names(
         self, mock_gcal_builder, mock_add_task, client, db, test_pipeline, test_stage, test_config
     ):
@@ -249,7 +249,7 @@ class TestSalesCallBooking:
         assert len(contact.last_name) <= 255
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_with_configured_payg_pipeline(
         self, mock_gcal_builder, mock_add_task, client, db, test_admin
     ):
@@ -292,7 +292,7 @@ class TestSalesCallBooking:
         assert deal.pipeline_id == payg_pipeline.id
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_finds_company_by_name(
         self, mock_gcal_builder, mock_add_task, client, db, test_pipeline, test_stage, test_admin, test_config
     ):
@@ -327,7 +327,7 @@ class TestSalesCallBooking:
         assert companies[0].id == existing_company.id
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_finds_contact_by_phone(
         self, mock_gcal_builder, mock_add_task, client, db, test_pipeline, test_stage, test_admin, test_config
     ):
@@ -384,7 +384,7 @@ class TestSalesCallBooking:
         assert r.status_code == 422
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_with_bdr_person(
         self, mock_gcal_builder, mock_add_task, client, db, test_pipeline, test_stage, test_config
     ):
@@ -412,7 +412,7 @@ class TestSalesCallBooking:
         assert company.bdr_person_id == bdr_person.tc2_admin_id
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_with_bdr_person_resolves_tc2_admin_id(
         self, mock_gcal_builder, mock_add_task, client, db, test_pipeline, test_stage, test_config
     ):
@@ -458,7 +458,7 @@ class TestSalesCallBooking:
             db.commit = original_commit
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_uses_pipeline_dft_entry_stage(
         self, mock_gcal_builder, mock_add_task, client, db, test_admin
     ):
@@ -502,7 +502,7 @@ class TestSalesCallBooking:
         assert deal.stage_id == stage2.id  # Should use the configured default stage
 
     @patch('app.pipedrive.api.pipedrive_request')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_duplicate_company_names_uses_most_recent(
         self, mock_gcal_builder, mock_pipedrive, client, db, test_pipeline, test_stage, test_config
     ):
@@ -540,7 +540,7 @@ class TestSalesCallBooking:
         assert meeting.company_id == company2.id
 
     @patch('app.pipedrive.api.pipedrive_request')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_duplicate_email_contacts_uses_most_recent(
         self, mock_gcal_builder, mock_pipedrive, client, db, test_pipeline, test_stage, test_config
     ):
@@ -575,7 +575,7 @@ class TestSalesCallBooking:
         assert deal is not None
 
     @patch('app.pipedrive.api.pipedrive_request')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_duplicate_phone_contacts_uses_most_recent(
         self, mock_gcal_builder, mock_pipedrive, client, db, test_pipeline, test_stage, test_config
     ):
@@ -629,7 +629,7 @@ class TestSupportCallBooking:
     """Test support call booking flow"""
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_support_call_creates_contact(
         self, mock_gcal_builder, mock_add_task, client, db, test_pipeline, test_stage, test_config
     ):
@@ -724,7 +724,7 @@ class TestCallbookerValidation:
         assert r.status_code == 422
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_with_single_name(
         self, mock_gcal_builder, mock_add_task, client, db, test_pipeline, test_stage, test_config
     ):
@@ -773,7 +773,7 @@ class TestCallbookerValidation:
         assert r.status_code == 422
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_support_call_with_single_name(
         self, mock_gcal_builder, mock_add_task, client, db, test_pipeline, test_stage, test_config
     ):
@@ -801,7 +801,7 @@ class TestCallbookerValidation:
         assert contact.last_name == 'Cher'
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_accepts_naive_datetime(
         self, mock_gcal_builder, mock_add_task, client, db, test_pipeline, test_stage, test_config
     ):
@@ -831,7 +831,7 @@ class TestCallbookerValidation:
         assert meeting is not None
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_accepts_non_utc_timezone(
         self, mock_gcal_builder, mock_add_task, client, db, test_pipeline, test_stage, test_config
     ):
@@ -864,27 +864,22 @@ class TestCallbookerValidation:
         assert meeting is not None
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_rollback_on_google_calendar_failure(
         self, mock_gcal_builder, mock_add_task, client, db, test_pipeline, test_stage, test_config
     ):
         """Test that meeting is NOT persisted if Google Calendar event creation fails"""
-        from unittest.mock import Mock
+        import httpx
 
-        from googleapiclient.errors import HttpError
-
-        # Mock Google Calendar to raise an error when creating event
-        mock_resource = mock_gcal_builder.return_value
-        mock_resource.freebusy.return_value.query.return_value.execute.return_value = {
-            'calendars': {'test@example.com': {'busy': []}}
-        }
         # Simulate Google Calendar API error during event creation
-        mock_resp = Mock()
-        mock_resp.status = 403
-        mock_resp.reason = 'Forbidden'
-        mock_resource.events.return_value.insert.return_value.execute.side_effect = HttpError(
-            resp=mock_resp, content=b'Forbidden'
-        )
+        def fake_request(method, path, **kwargs):
+            if path == 'freeBusy':
+                return {'calendars': {'test@example.com': {'busy': []}}}
+            raise httpx.HTTPStatusError(
+                'Forbidden', request=httpx.Request(method, path), response=httpx.Response(403, content=b'Forbidden')
+            )
+
+        mock_gcal_builder.side_effect = fake_request
 
         admin = db.create(Admin(first_name='Test', last_name='Admin', username='test@example.com'))
 
@@ -915,10 +910,13 @@ class TestCallbookerValidation:
         # Company and contact should still be created (they're committed earlier in the flow)
         company = db.exec(select(Company)).first()
         assert company is not None  # Company creation happened before meeting
+        # As is its sync, but not the meeting's
+        outbox = db.exec(select(PipedriveOutbox)).all()
+        assert {(e.action, e.object_id) for e in outbox} == {(PipedriveOutbox.ACTION_SYNC_COMPANY, company.id)}
 
         # Verify we can book again at the same time (no phantom meeting blocking)
-        mock_resource.events.return_value.insert.return_value.execute.side_effect = None  # Clear error
-        mock_resource.events.return_value.insert.return_value.execute.return_value = {'id': 'event123'}
+        mock_gcal_builder.side_effect = None  # Clear error
+        mock_gcal_builder.return_value = {'calendars': {'test@example.com': {'busy': []}}, 'id': 'event123'}
 
         admins = db.exec(select(Admin)).all()
         assert len(admins) == 1
@@ -929,7 +927,7 @@ class TestCallbookerValidation:
         assert len(meetings) == 1
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_admin_busy_check_via_google_calendar(
         self, mock_gcal_builder, mock_add_task, client, db, test_pipeline, test_stage, test_config
     ):
@@ -964,7 +962,7 @@ class TestCallbookerValidation:
         assert len(meetings) == 0
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_complete_google_calendar_workflow_end_to_end(
         self, mock_gcal_builder, mock_add_task, client, db, test_pipeline, test_stage, test_config
     ):
@@ -974,13 +972,11 @@ class TestCallbookerValidation:
         This test validates:
         1. Admin availability check via Google Calendar freebusy API
         2. Meeting creation with Google Calendar event
-        3. Database connection release before external API calls (asyncio.to_thread)
+        3. The meeting committed before the Google Calendar request is made
         4. Compensating transaction on Google Calendar failure
         5. Multiple booking attempts with different time slots
         6. Calendar event data formatting and attendees
         """
-        from unittest.mock import Mock
-
         # Setup admin with specific email for calendar testing
         admin = db.create(
             Admin(
@@ -993,19 +989,13 @@ class TestCallbookerValidation:
             )
         )
 
-        # Mock Google Calendar resource with detailed tracking
-        mock_resource = Mock()
-        mock_gcal_builder.return_value = mock_resource
-
-        # Track all freebusy queries
+        # Track all freebusy queries and calendar event creations
         freebusy_calls = []
+        event_creations = []
 
-        class MockFreeBusyQuery:
-            def __init__(self, body):
-                freebusy_calls.append(body)
-                self.body = body
-
-            def execute(self):
+        def fake_request(method, path, *, params=None, data):
+            if (method, path) == ('POST', 'freeBusy'):
+                freebusy_calls.append(data)
                 busy_start = datetime(2026, 7, 3, 10, 0, tzinfo=utc)
                 busy_end = datetime(2026, 7, 3, 11, 0, tzinfo=utc)
                 return {
@@ -1020,22 +1010,11 @@ class TestCallbookerValidation:
                         }
                     }
                 }
+            assert (method, path) == ('POST', 'calendars/test%40example.com/events')
+            event_creations.append({'params': params, 'event': data})
+            return {'id': f'event_{len(event_creations)}', 'htmlLink': 'https://calendar.google.com/event123'}
 
-        mock_resource.freebusy.return_value.query.side_effect = MockFreeBusyQuery
-
-        # Track all calendar event creations
-        event_creations = []
-
-        class MockEventInsert:
-            def __init__(self, calendarId=None, body=None, **kwargs):
-                event_creations.append({'calendar_id': calendarId, 'event': body})
-                self.calendar_id = calendarId
-                self.body = body
-
-            def execute(self):
-                return {'id': f'event_{len(event_creations)}', 'htmlLink': 'https://calendar.google.com/event123'}
-
-        mock_resource.events.return_value.insert.side_effect = MockEventInsert
+        mock_gcal_builder.side_effect = fake_request
 
         # Test 1: Attempt to book during busy time (10:00-10:30) - should fail
         busy_time = datetime(2026, 7, 3, 10, 15, tzinfo=utc)
@@ -1123,6 +1102,7 @@ class TestCallbookerValidation:
         calendar_event = event_creations[0]['event']
 
         # Verify event details
+        assert event_creations[0]['params'] == {'sendUpdates': 'all', 'conferenceDataVersion': 1}
         assert calendar_event['summary'] == meeting.name
         assert 'Jane' in calendar_event['description']
         assert 'Acme Inc' in calendar_event['description']
@@ -1143,11 +1123,17 @@ class TestCallbookerValidation:
         # Verify conferencing (Google Meet) is requested
         assert 'conferenceData' in calendar_event
 
-        # Verify background tasks were queued
-        assert mock_add_task.call_count >= 2
+        # Verify the Pipedrive syncs were added to the outbox with the booking, and delivery was queued
+        # Example Corp was created, with its sync, before the first booking failed
+        example_corp = db.exec(select(Company).where(Company.name == 'Example Corp')).one()
+        outbox = db.exec(select(PipedriveOutbox)).all()
+        assert {(e.action, e.object_id) for e in outbox} == {
+            (PipedriveOutbox.ACTION_SYNC_COMPANY, example_corp.id),
+            (PipedriveOutbox.ACTION_SYNC_COMPANY, company.id),
+            (PipedriveOutbox.ACTION_SYNC_MEETING, meeting.id),
+        }
         call_args = [call.args[0].__name__ for call in mock_add_task.call_args_list]
-        assert 'sync_company_to_pipedrive' in call_args
-        assert 'sync_meeting_to_pipedrive' in call_args
+        assert 'drain_outbox' in call_args
 
         # Test 3: Attempt duplicate booking within 2 hours - should fail
         duplicate_time = free_time + timedelta(hours=1)
@@ -1202,7 +1188,7 @@ class TestCallbookerValidation:
         assert len(event_creations) == 2
 
     @patch('app.pipedrive.api.pipedrive_request')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_creates_pipedrive_activity_with_meeting_type(
         self, mock_gcal_builder, mock_pipedrive, client, db, test_pipeline, test_stage, test_config
     ):
@@ -0,0 +1,152 @@
+"""
+Tests for the async Google Calendar client.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import httpx
+import pytest
+from pytz import utc
+
+from app.callbooker import google
+from app.callbooker.google import AdminGoogleCalendar, get_access_token
+from app.core.config import settings
+
+
+@pytest.fixture(autouse=True)
+def reset_google_state():
+    google._client = None
+    google._tokens.clear()
+    google._token_locks.clear()
+    yield
+    google._client = None
+    google._tokens.clear()
+    google._token_locks.clear()
+
+
+def _token_response(token: str = 'token-1', expires_in: int = 3600) -> httpx.Response:
+    return httpx.Response(
+        200,
+        json={'access_token': token, 'expires_in': expires_in},
+        request=httpx.Request('POST', 'https://oauth2.googleapis.com/token'),
+    )
+
+
+class TestAccessTokens:
+    """Test service account token caching"""
+
+    @patch('app.callbooker.google._make_assertion', return_value='signed-jwt')
+    @patch('httpx.AsyncClient.post')
+    async def test_token_is_cached_per_subject(self, mock_post, mock_assertion):
+        mock_post.return_value = _token_response()
+
+        assert await get_access_token('a@example.com') == 'token-1'
+        assert await get_access_token('a@example.com') == 'token-1'
+        assert mock_post.call_count == 1
+        assert mock_post.call_args.kwargs['data'] == {
+            'grant_type': 'urn:ietf:params:oauth:grant-type:jwt-bearer',
+            'assertion': 'signed-jwt',
+        }
+
+        mock_post.return_value = _token_response('token-2')
+        assert await get_access_token('b@example.com') == 'token-2'
+        assert mock_post.call_count == 2
+        mock_assertion.assert_called_with('b@example.com')
+
+    @patch('app.callbooker.google._make_assertion', return_value='signed-jwt')
+    @patch('httpx.AsyncClient.post')
+    async def test_expired_token_is_refreshed(self, mock_post, mock_assertion):
+        mock_post.return_value = _token_response()
+        await get_access_token('a@example.com')
+
+        google._tokens['a@example.com'] = ('token-1', time.time() - 1)
+        mock_post.return_value = _token_response('token-2')
+
+        assert await get_access_token('a@example.com') == 'token-2'
+        assert mock_post.call_count == 2
+
+    @patch('app.callbooker.google._make_assertion', return_value='signed-jwt')
+    @patch('httpx.AsyncClient.post')
+    async def test_concurrent_callers_share_one_token_request(self, mock_post, mock_assertion):
+        async def slow_token(*args, **kwargs):
+            await asyncio.sleep(0.01)
+            return _token_response()
+
+        mock_post.side_effect = slow_token
+
+        tokens = await asyncio.gather(*[get_access_token('a@example.com') for _ in range(100)])
+
+        assert set(tokens) == {'token-1'}
+        assert mock_post.call_count == 1
+
+    def test_make_assertion(self):
+        import rsa
+        from google.auth import jwt
+
+        _, private_key = rsa.newkeys(1024)
+        google._get_signer.cache_clear()
+        with patch.object(settings, 'g_private_key', private_key.save_pkcs1().decode()):
+            assertion = google._make_assertion('a@example.com')
+        google._get_signer.cache_clear()
+
+        claims = jwt.decode(assertion, verify=False)
+        assert claims['sub'] == 'a@example.com'
+        assert claims['iss'] == settings.g_client_email
+        assert claims['aud'] == settings.g_token_uri
+        assert claims['scope'] == 'https://www.googleapis.com/auth/calendar'
+        assert claims['exp'] - claims['iat'] == 3600
+
+
+class TestAdminGoogleCalendar:
+    """Test Calendar API requests"""
+
+    @patch('app.callbooker.google.get_access_token', return_value='token-1')
+    @patch('httpx.AsyncClient.request')
+    async def test_get_free_busy_slots(self, mock_request, mock_token):
+        busy = {'calendars': {'admin@example.com': {'busy': []}}}
+        mock_request.return_value = httpx.Response(200, json=busy, request=httpx.Request('POST', 'https://x'))
+        start = datetime(2026, 1, 5, 10, tzinfo=utc)
+
+        result = await AdminGoogleCalendar(admin_email='admin@example.com').get_free_busy_slots(
+            start, start + timedelta(days=1)
+        )
+
+        assert result == busy
+        method, url = mock_request.call_args.args
+        assert method == 'POST'
+        assert url == 'https://www.googleapis.com/calendar/v3/freeBusy'
+        assert mock_request.call_args.kwargs['headers'] == {'Authorization': 'Bearer token-1'}
+        assert mock_request.call_args.kwargs['json']['items'] == [{'id': 'admin@example.com'}]
+
+    @patch('app.callbooker.google.get_access_token', return_value='token-1')
+    @patch('httpx.AsyncClient.request')
+    async def test_create_cal_event(self, mock_request, mock_token):
+        mock_request.return_value = httpx.Response(200, json={'id': 'e1'}, request=httpx.Request('POST', 'https://x'))
+        start = datetime(2026, 1, 5, 10, tzinfo=utc)
+
+        await AdminGoogleCalendar(admin_email='admin@example.com').create_cal_event(
+            summary='Demo', description='Desc', start=start, end=start + timedelta(minutes=30), contact_email='c@x.com'
+        )
+
+        method, url = mock_request.call_args.args
+        assert url == 'https://www.googleapis.com/calendar/v3/calendars/admin%40example.com/events'
+        assert mock_request.call_args.kwargs['params'] == {'sendUpdates': 'all', 'conferenceDataVersion': 1}
+        event = mock_request.call_args.kwargs['json']
+        assert event['attendees'] == [{'email': 'admin@example.com'}, {'email': 'c@x.com'}]
+
+    @patch('app.callbooker.google.get_access_token', return_value='token-1')
+    @patch('httpx.AsyncClient.request')
+    async def test_create_cal_event_error(self, mock_request, mock_token):
+        mock_request.return_value = httpx.Response(403, request=httpx.Request('POST', 'https://x'))
+        start = datetime(2026, 1, 5, 10, tzinfo=utc)
+
+        with pytest.raises(httpx.HTTPStatusError):
+            await AdminGoogleCalendar(admin_email='admin@example.com').create_cal_event(
+                summary='Demo', description='Desc', start=start, end=start, contact_email='c@x.com'
+            )
+
+    def test_client_is_shared(self):
+        assert google._get_client() is google._get_client()
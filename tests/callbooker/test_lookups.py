@@ -0,0 +1,139 @@
+"""
+Tests for finding a booking's existing contact and company.
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, insert, text
+from sqlmodel import select
+
+from app.callbooker.models import CBSalesCall
+from app.callbooker.process import get_or_create_contact_company
+from app.main_app.identity import save_identities
+from app.main_app.models import Company, Contact, ContactIdentity
+from tests.conftest import engine
+
+
+def _event(admin_id: int, **kwargs) -> CBSalesCall:
+    data = {
+        'admin_id': admin_id,
+        'name': 'Brain Junes',
+        'email': 'brain@junes.com',
+        'company_name': 'Junes Ltd',
+        'country': 'GB',
+        'estimated_income': 1000,
+        'currency': 'GBP',
+        'price_plan': Company.PP_PAYG,
+        'meeting_dt': datetime.now(timezone.utc) + timedelta(days=1),
+        **kwargs,
+    }
+    return CBSalesCall(**data)
+
+
+def _query_plan(db, statement) -> str:
+    compiled = statement.compile(engine, compile_kwargs={'literal_binds': True})
+    return ' '.join(r[-1] for r in db.exec(text(f'EXPLAIN QUERY PLAN {compiled}')).all())
+
+
+class TestLookups:
+    """Test existing contacts and companies are matched however the booking writes their details"""
+
+    async def test_email_case_insensitive(self, db, test_admin, test_company):
+        contact = db.create(Contact(last_name='Junes', email='Brain@Junes.com', company_id=test_company.id))
+
+        company, found = await get_or_create_contact_company(_event(test_admin.id), db)
+
+        assert (company.id, found.id) == (test_company.id, contact.id)
+
+    async def test_phone_ignores_formatting(self, db, test_admin, test_company):
+        contact = db.create(Contact(last_name='Junes', phone='+44 (0)20 7946-0958', company_id=test_company.id))
+
+        company, found = await get_or_create_contact_company(
+            _event(test_admin.id, email='other@junes.com', phone='020.7946.0958'), db
+        )
+
+        assert (company.id, found.id) == (test_company.id, contact.id)
+
+    async def test_company_name_case_insensitive(self, db, test_admin, test_company):
+        test_company.name = 'JUNES LTD'
+        db.add(test_company)
+        db.commit()
+
+        company, contact = await get_or_create_contact_company(_event(test_admin.id), db)
+
+        assert company.id == test_company.id
+        assert contact.company_id == test_company.id
+        assert db.exec(select(Company)).all() == [company]
+
+    async def test_company_name_wildcards_literal(self, db, test_admin, test_company):
+        """Names were matched with ilike, where _ and % are wildcards"""
+        test_company.name = 'Junes Ltd'
+        db.add(test_company)
+        db.commit()
+
+        company, _ = await get_or_create_contact_company(_event(test_admin.id, company_name='Junes_Ltd'), db)
+
+        assert company.id != test_company.id
+
+
+class TestLookupIndexes:
+    """Test the lookups use their indexes rather than scanning the tables"""
+
+    def test_query_plans(self, db):
+        statements = {
+            'ix_contactidentity_kind_value_contact_id': select(ContactIdentity.contact_id)
+            .where(ContactIdentity.kind == ContactIdentity.KIND_EMAIL, ContactIdentity.value == 'brain@junes.com')
+            .order_by(ContactIdentity.contact_id.desc()),
+            'ix_company_name_lower': select(Company).where(func.lower(Company.name) == 'junes ltd'),
+            'ix_contact_company_id_last_name_lower': select(Contact).where(
+                Contact.company_id == 1, func.lower(Contact.last_name) == 'junes'
+            ),
+        }
+        for index, statement in statements.items():
+            assert index in _query_plan(db, statement)
+
+    async def test_booking_lookups_benchmark(self, db, test_admin):
+        """
+        Benchmark finding a booking's contact by phone, after looking for them by email, in a large CRM with and
+        without the identities' index.
+        """
+        count = 20_000
+        db.execute(
+            insert(Company),
+            [
+                {'name': f'Company {i}', 'sales_person_id': test_admin.id, 'price_plan': Company.PP_PAYG}
+                for i in range(count)
+            ],
+        )
+        company_ids = db.exec(select(Company.id)).all()
+        contacts = db.execute(
+            insert(Contact).returning(Contact.id, Contact.email, Contact.phone, Contact.country),
+            [
+                {
+                    'company_id': company_id,
+                    'last_name': f'Contact {i}',
+                    'email': f'contact-{i}@example.com',
+                    'phone': f'020 {i:08}',
+                    'country': 'GB',
+                }
+                for i, company_id in enumerate(company_ids)
+            ],
+        ).all()
+        save_identities(db.connection(), contacts)
+        db.commit()
+        event = _event(test_admin.id, email='new@example.com', phone=f'+4420{count // 2:08}')
+
+        async def book() -> float:
+            start = time.perf_counter()
+            company, contact = await get_or_create_contact_company(event, db)
+            elapsed = time.perf_counter() - start
+            assert contact.email == f'contact-{count // 2}@example.com'
+            return elapsed
+
+        indexed = [await book() for _ in range(5)]
+        db.exec(text('DROP INDEX ix_contactidentity_kind_value_contact_id'))
+        db.commit()
+        unindexed = [await book() for _ in range(5)]
+
+        assert min(indexed) * 5 < min(unindexed)
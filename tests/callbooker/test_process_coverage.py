@@ -2,6 +2,7 @@
 Tests for callbooker process edge cases to achieve 100% coverage.
 """
 
+import json
 from datetime import datetime, timedelta
 from unittest.mock import AsyncMock, patch
 
@@ -38,7 +39,7 @@ class TestCallbookerProcessEdgeCases:
             assert len(session_open) == 0, 'Google Calendar API call was made while database session was still open'
             return True
 
-        def check_session_during_gcal_create(*args, **kwargs):
+        async def check_session_during_gcal_create(*args, **kwargs):
             assert len(session_open) == 0, (
                 'Google Calendar create_cal_event was made while database session was still open'
             )
@@ -116,7 +117,7 @@ class TestCallbookerProcessEdgeCases:
         assert r.status_code == 400
         assert 'Config not found' in r.json()['message']
 
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_stage_not_found_raises_error(
         self, mock_gcal_builder, client, db, test_admin, test_pipeline, test_config
     ):
@@ -155,7 +156,7 @@ class TestCallbookerProcessEdgeCases:
         assert 'Stage' in r.json()['message'] and 'not found' in r.json()['message']
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_with_startup_pipeline_config(
         self, mock_gcal_builder, mock_add_task, client, db, test_pipeline, test_stage, test_admin
     ):
@@ -193,7 +194,7 @@ class TestCallbookerProcessEdgeCases:
         assert deal.pipeline_id == test_pipeline.id
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_with_enterprise_pipeline_config(
         self, mock_gcal_builder, mock_add_task, client, db, test_pipeline, test_stage, test_admin
     ):
@@ -230,7 +231,7 @@ class TestCallbookerProcessEdgeCases:
         deal = db.exec(select(Deal)).first()
         assert deal.pipeline_id == test_pipeline.id
 
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_fails_when_admin_not_free(
         self, mock_gcal, client, db, test_admin, test_company, test_pipeline, test_stage, test_config
     ):
@@ -238,31 +239,24 @@ class TestCallbookerProcessEdgeCases:
         # Mock Google Calendar to show admin has a busy slot at the requested time
         future_dt = datetime.now(utc) + timedelta(days=1)
 
-        class MockGCal:
-            def freebusy(self):
-                return self
-
-            def query(self, body):
-                return self
-
-            def execute(self):
-                # Return busy slot that overlaps with requested meeting time
-                busy_start = future_dt
-                busy_end = future_dt + timedelta(hours=1)
-                return {
-                    'calendars': {
-                        test_admin.email: {
-                            'busy': [
-                                {
-                                    'start': busy_start.isoformat().replace('+00:00', 'Z'),
-                                    'end': busy_end.isoformat().replace('+00:00', 'Z'),
-                                }
-                            ]
-                        }
+        def fake_request(*args, **kwargs):
+            # Return busy slot that overlaps with requested meeting time
+            busy_start = future_dt
+            busy_end = future_dt + timedelta(hours=1)
+            return {
+                'calendars': {
+                    test_admin.email: {
+                        'busy': [
+                            {
+                                'start': busy_start.isoformat().replace('+00:00', 'Z'),
+                                'end': busy_end.isoformat().replace('+00:00', 'Z'),
+                            }
+                        ]
                     }
                 }
+            }
 
-        mock_gcal.side_effect = lambda *args, **kwargs: MockGCal()
+        mock_gcal.side_effect = fake_request
 
         meeting_data = {
             'admin_id': test_admin.id,
@@ -299,21 +293,14 @@ class TestAvailabilityEndpoint:
         assert r.status_code == 404
         assert 'Admin not found' in r.json()['message']
 
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_availability_returns_slots(self, mock_gcal, client, db, test_admin):
         """Test availability endpoint returns slots when admin exists"""
 
-        class MockGCal:
-            def freebusy(self):
-                return self
+        def fake_request(*args, **kwargs):
+            return {'calendars': {test_admin.email: {'busy': []}}}
 
-            def query(self, body):
-                return self
-
-            def execute(self):
-                return {'calendars': {test_admin.email: {'busy': []}}}
-
-        mock_gcal.side_effect = lambda *args, **kwargs: MockGCal()
+        mock_gcal.side_effect = fake_request
 
         start_dt = datetime(2026, 1, 5, 10, 0, tzinfo=utc)
         end_dt = datetime(2026, 1, 5, 12, 0, tzinfo=utc)
@@ -328,35 +315,28 @@ class TestAvailabilityEndpoint:
         assert data['status'] == 'ok'
         assert 'slots' in data
 
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_availability_filters_overlapping_busy_slots(self, mock_gcal, client, db, test_admin):
         """Test availability endpoint filters out slots that overlap with busy calendar slots"""
 
-        class MockGCal:
-            def freebusy(self):
-                return self
-
-            def query(self, body):
-                return self
-
-            def execute(self):
-                # Admin is busy 10:00-11:00 UTC
-                busy_start = datetime(2026, 1, 5, 10, 0, tzinfo=utc)
-                busy_end = datetime(2026, 1, 5, 11, 0, tzinfo=utc)
-                return {
-                    'calendars': {
-                        test_admin.email: {
-                            'busy': [
-                                {
-                                    'start': busy_start.isoformat().replace('+00:00', 'Z'),
-                                    'end': busy_end.isoformat().replace('+00:00', 'Z'),
-                                }
-                            ]
-                        }
+        def fake_request(*args, **kwargs):
+            # Admin is busy 10:00-11:00 UTC
+            busy_start = datetime(2026, 1, 5, 10, 0, tzinfo=utc)
+            busy_end = datetime(2026, 1, 5, 11, 0, tzinfo=utc)
+            return {
+                'calendars': {
+                    test_admin.email: {
+                        'busy': [
+                            {
+                                'start': busy_start.isoformat().replace('+00:00', 'Z'),
+                                'end': busy_end.isoformat().replace('+00:00', 'Z'),
+                            }
+                        ]
                     }
                 }
+            }
 
-        mock_gcal.side_effect = lambda *args, **kwargs: MockGCal()
+        mock_gcal.side_effect = fake_request
 
         start_dt = datetime(2026, 1, 5, 10, 0, tzinfo=utc)
         end_dt = datetime(2026, 1, 5, 14, 0, tzinfo=utc)
@@ -371,3 +351,24 @@ class TestAvailabilityEndpoint:
         assert data['status'] == 'ok'
         # Should have some slots but not at 10:00-11:00
         assert isinstance(data['slots'], list)
+
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
+    async def test_availability_stream_returns_ndjson(self, mock_gcal, client, db, test_admin):
+        """Test availability endpoint streams the same slots as NDJSON lines when stream=true"""
+        mock_gcal.return_value = {'calendars': {test_admin.email: {'busy': []}}}
+
+        params = {
+            'admin_id': test_admin.id,
+            'start_dt': datetime(2026, 1, 5, 10, 0, tzinfo=utc).isoformat(),
+            'end_dt': datetime(2026, 1, 6, 17, 0, tzinfo=utc).isoformat(),
+        }
+        r = client.get(client.app.url_path_for('get-availability'), params=params)
+        slots = r.json()['slots']
+
+        r = client.get(client.app.url_path_for('get-availability'), params={**params, 'stream': True})
+
+        assert r.status_code == 200
+        assert r.headers['content-type'] == 'application/x-ndjson'
+        lines = r.text.splitlines()
+        assert len(lines) == len(slots) > 0
+        assert [json.loads(line) for line in lines] == slots
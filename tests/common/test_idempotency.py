@@ -0,0 +1,209 @@
+"""
+Tests for answering repeated webhook and booking requests with the stored response.
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from sqlmodel import select
+
+from app.common.idempotency import (
+    claim_key,
+    get_idempotency_key,
+    purge_expired_responses,
+    release_key,
+    store_response,
+)
+from app.main_app.models import IdempotentResponse, TC2Event
+from tests.conftest import engine
+from tests.helpers import count_queries, tc2_client_data
+
+
+def _webhook_body(*clients: dict) -> bytes:
+    events = [{'action': 'UPDATE', 'verb': 'update', 'subject': {**c, 'model': 'Client'}} for c in clients]
+    return json.dumps({'events': events, '_request_time': 1234567890}).encode()
+
+
+class TestIdempotencyKey:
+    def test_key_from_body(self):
+        key = get_idempotency_key('/tc2/callback/', b'{}')
+
+        assert len(key) == 64
+        assert get_idempotency_key('/tc2/callback/', b'{}') == key
+        assert get_idempotency_key('/tc2/callback/', b'{ }') != key
+        assert get_idempotency_key('/pipedrive/callback/', b'{}') != key
+
+    def test_explicit_key(self):
+        key = get_idempotency_key('/callbooker/sales/book/', b'{}', 'abc')
+
+        assert get_idempotency_key('/callbooker/sales/book/', b'{"other": 1}', 'abc') == key
+        assert get_idempotency_key('/callbooker/sales/book/', b'{}', 'abd') != key
+        assert get_idempotency_key('/callbooker/sales/book/', b'{}') != key
+
+    def test_no_key_without_header(self):
+        assert get_idempotency_key('/callbooker/sales/book/', b'{}', key_from_body=False) is None
+        assert get_idempotency_key('/callbooker/sales/book/', b'{}', 'abc', key_from_body=False) is not None
+
+
+class TestStoredResponses:
+    def test_claim_store_and_replay(self, db):
+        assert claim_key('k', pending_ttl=60) is None
+        assert claim_key('k', pending_ttl=60).status_code is None
+
+        store_response('k', 200, 'application/json', '{"status":"ok"}', ttl=60)
+
+        stored = claim_key('k', pending_ttl=60)
+        assert (stored.status_code, stored.media_type, stored.content) == (200, 'application/json', '{"status":"ok"}')
+        assert claim_key('other', pending_ttl=60) is None
+
+    def test_claim_is_one_query(self, db):
+        with count_queries(engine) as queries:
+            claim_key('k', pending_ttl=60)
+
+        assert len(queries) == 1
+
+    def test_released_key_claimed_again(self, db):
+        claim_key('k', pending_ttl=60)
+        release_key('k')
+
+        assert claim_key('k', pending_ttl=60) is None
+
+    def test_release_leaves_stored_response(self, db):
+        store_response('k', 200, None, '', ttl=60)
+        release_key('k')
+
+        assert claim_key('k', pending_ttl=60).status_code == 200
+
+    def test_expired_response_claimed_again(self, db):
+        store_response('k', 200, 'application/json', '{"old":1}', ttl=-1)
+        assert claim_key('k', pending_ttl=60) is None
+
+        store_response('k', 201, 'application/json', '{"new":1}', ttl=60)
+        assert claim_key('k', pending_ttl=60).content == '{"new":1}'
+
+    def test_unfinished_request_claimed_again_once_pending_expires(self, db):
+        claim_key('k', pending_ttl=-1)
+
+        assert claim_key('k', pending_ttl=60) is None
+
+    def test_purge_expired(self, db):
+        store_response('old', 200, None, '', ttl=-1)
+        store_response('new', 200, None, '', ttl=60)
+
+        purge_expired_responses()
+
+        assert [r.key for r in db.exec(select(IdempotentResponse))] == ['new']
+
+
+class TestIdempotencyMiddleware:
+    """Test repeated requests get the stored response"""
+
+    @patch('app.pipedrive.outbox.sync_company_to_pipedrive')
+    def test_repeated_webhook_not_processed_again(self, mock_sync, client, db, test_admin):
+        body = _webhook_body(tc2_client_data(1, test_admin.tc2_admin_id))
+        url = client.app.url_path_for('tc2-callback')
+
+        r1 = client.post(url, content=body)
+        r2 = client.post(url, content=body)
+
+        assert r1.status_code == r2.status_code == 200
+        assert r1.json() == r2.json() == {'status': 'ok'}
+        assert 'Idempotent-Replayed' not in r1.headers
+        assert r2.headers['Idempotent-Replayed'] == 'true'
+        assert r2.headers['content-type'] == 'application/json'
+        assert len(db.exec(select(TC2Event)).all()) == 1
+        assert mock_sync.call_count == 1
+
+    @patch('app.pipedrive.outbox.sync_company_to_pipedrive')
+    def test_different_webhooks_processed(self, mock_sync, client, db, test_admin):
+        url = client.app.url_path_for('tc2-callback')
+
+        client.post(url, content=_webhook_body(tc2_client_data(1, test_admin.tc2_admin_id)))
+        r = client.post(url, content=_webhook_body(tc2_client_data(2, test_admin.tc2_admin_id)))
+
+        assert 'Idempotent-Replayed' not in r.headers
+        assert len(db.exec(select(TC2Event)).all()) == 2
+
+    @patch('app.pipedrive.outbox.sync_company_to_pipedrive')
+    def test_idempotency_key_header(self, mock_sync, client, db, test_admin):
+        url = client.app.url_path_for('tc2-callback')
+
+        client.post(url, content=_webhook_body(tc2_client_data(1, 1)), headers={'Idempotency-Key': 'a'})
+        r = client.post(url, content=_webhook_body(tc2_client_data(2, 1)), headers={'Idempotency-Key': 'a'})
+        assert r.headers['Idempotent-Replayed'] == 'true'
+
+        r = client.post(url, content=_webhook_body(tc2_client_data(1, 1)), headers={'Idempotency-Key': 'b'})
+        assert 'Idempotent-Replayed' not in r.headers
+        assert len(db.exec(select(TC2Event)).all()) == 2
+
+    def test_failed_requests_not_stored(self, client, db):
+        url = client.app.url_path_for('book-sales-call')
+
+        r1 = client.post(url, json={'invalid': True})
+        r2 = client.post(url, json={'invalid': True})
+
+        assert r1.status_code == r2.status_code == 422
+        assert 'Idempotent-Replayed' not in r2.headers
+        assert db.exec(select(IdempotentResponse)).all() == []
+
+    @patch('app.pipedrive.outbox.sync_company_to_pipedrive')
+    def test_repeat_while_processing_conflicts(self, mock_sync, client, db, test_admin):
+        body = _webhook_body(tc2_client_data(1, test_admin.tc2_admin_id))
+        claim_key(get_idempotency_key('/tc2/callback/', body), pending_ttl=60)
+
+        r = client.post(client.app.url_path_for('tc2-callback'), content=body)
+
+        assert r.status_code == 409
+        assert r.json() == {'status': 'error', 'message': 'The same request is already being processed'}
+        assert r.headers['Retry-After'] == '1'
+        assert db.exec(select(TC2Event)).all() == []
+
+    def test_failed_request_releases_key(self, client, db):
+        url = client.app.url_path_for('book-sales-call')
+
+        r = client.post(url, json={'invalid': True}, headers={'Idempotency-Key': 'a'})
+
+        assert r.status_code == 422
+        assert db.exec(select(IdempotentResponse)).all() == []
+
+    def test_booking_without_key_not_stored(self, client, db):
+        url = client.app.url_path_for('book-sales-call')
+
+        with patch('app.common.idempotency.claim_key') as mock_claim:
+            client.post(url, json={'invalid': True})
+
+        assert not mock_claim.called
+
+    def test_other_endpoints_not_stored(self, client, db):
+        client.get('/health')
+        client.get(client.app.url_path_for('choose-sales-person'), params={'plan': 'payg', 'country_code': 'GB'})
+
+        assert db.exec(select(IdempotentResponse)).all() == []
+
+    @patch('app.pipedrive.outbox.sync_company_to_pipedrive')
+    def test_storage_errors_dont_fail_requests(self, mock_sync, client, db, test_admin):
+        body = _webhook_body(tc2_client_data(1, test_admin.tc2_admin_id))
+        with (
+            patch('app.common.idempotency.claim_key', side_effect=RuntimeError('db down')),
+            patch('app.common.idempotency.store_response', side_effect=RuntimeError('db down')),
+        ):
+            r = client.post(client.app.url_path_for('tc2-callback'), content=body)
+
+        assert r.status_code == 200
+        assert len(db.exec(select(TC2Event)).all()) == 1
+
+    @patch('app.pipedrive.outbox.sync_company_to_pipedrive')
+    def test_expired_response_processed_again(self, mock_sync, client, db, test_admin):
+        body = _webhook_body(tc2_client_data(1, test_admin.tc2_admin_id))
+        url = client.app.url_path_for('tc2-callback')
+        client.post(url, content=body)
+
+        stored = db.exec(select(IdempotentResponse)).one()
+        stored.expires = datetime.now(timezone.utc) - timedelta(seconds=1)
+        db.add(stored)
+        db.commit()
+
+        r = client.post(url, content=body)
+        assert 'Idempotent-Replayed' not in r.headers
+        assert len(db.exec(select(TC2Event)).all()) == 2
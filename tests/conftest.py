@@ -9,7 +9,8 @@ from sqlmodel import SQLModel, create_engine
 
 from app.core import database
 from app.core.database import DBSession
-from app.main import app
+from app.main import app, ingress_limits
+from app.main_app.routing import admin_routing
 
 # Import all models to ensure they're registered with SQLModel before creating tables
 
@@ -25,8 +26,22 @@ TestingSessionLocal = sessionmaker(class_=DBSession, autocommit=False, autoflush
 
 @pytest.fixture(autouse=True)
 def use_test_session_factory(monkeypatch):
-    """Use test session factory for all tests"""
+    """Use test session factory for all tests, the test database also standing in for the replica"""
     monkeypatch.setattr(database, 'SessionCls', TestingSessionLocal)
+    monkeypatch.setattr(database, 'ReadSessionCls', TestingSessionLocal)
+
+
+@pytest.fixture(autouse=True)
+def reset_admin_routing():
+    """Load the admins for the round-robins from each test's database"""
+    admin_routing.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def reset_ingress_limits():
+    """Start each test with no requests counted against the endpoint rate limits"""
+    for limit in ingress_limits.values():
+        limit.reset()
 
 
 @pytest.fixture(name='session')
@@ -55,10 +70,11 @@ def client_fixture(session: DBSession):
     def get_session_override():
         return session
 
-    # Override the get_db dependency
-    from app.core.database import get_db
+    # Override the get_db and get_read_db dependencies
+    from app.core.database import get_db, get_read_db
 
     app.dependency_overrides[get_db] = get_session_override
+    app.dependency_overrides[get_read_db] = get_session_override
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
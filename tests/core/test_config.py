@@ -0,0 +1,22 @@
+"""
+Tests for the app's settings.
+"""
+
+import pytest
+from pydantic import ValidationError
+
+from app.core.config import Settings
+
+
+class TestSettings:
+    """Test settings are checked at startup"""
+
+    def test_tc2_shared_key_required_outside_dev_mode(self):
+        with pytest.raises(ValidationError, match='tc2_shared_key must be set'):
+            Settings(dev_mode=False, tc2_shared_key=None)
+
+    def test_tc2_shared_key_not_required_in_dev_mode(self):
+        assert Settings(dev_mode=True, tc2_shared_key=None).tc2_shared_key is None
+
+    def test_tc2_shared_key_set(self):
+        assert Settings(dev_mode=False, tc2_shared_key='shared-key').tc2_shared_key == 'shared-key'
@@ -0,0 +1,164 @@
+"""
+Tests for the ingress rate limits and load shedding.
+"""
+
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+from app.core import database
+from app.core.limits import TokenBuckets, get_source
+from app.main import db_pool_saturation, ingress_limits, tc2_backlog_saturation
+
+WEBHOOK = {'events': [], '_request_time': 1234567890}
+
+
+class TestTokenBuckets:
+    """Test per source token buckets"""
+
+    def test_burst_then_rate(self):
+        buckets = TokenBuckets(rate=2, burst=3)
+        with patch('app.core.limits.time.monotonic', return_value=100):
+            assert [buckets.take('a') for _ in range(3)] == [0, 0, 0]
+            assert buckets.take('a') == 0.5
+            # Other sources have their own bucket
+            assert buckets.take('b') == 0
+
+        with patch('app.core.limits.time.monotonic', return_value=100.5):
+            assert buckets.take('a') == 0
+            assert buckets.take('a') == 0.5
+
+    def test_idle_sources_are_forgotten(self):
+        buckets = TokenBuckets(rate=1, burst=2)
+        with patch('app.core.limits.MAX_TRACKED_SOURCES', 2):
+            with patch('app.core.limits.time.monotonic', return_value=100):
+                buckets.take('a')
+            with patch('app.core.limits.time.monotonic', return_value=103):
+                buckets.take('b')
+                buckets.take('c')
+
+        assert set(buckets._buckets) == {'b', 'c'}
+
+
+class TestGetSource:
+    def test_client_address(self):
+        assert get_source({'headers': [], 'client': ('1.2.3.4', 1234)}) == '1.2.3.4'
+
+    def test_forwarded_for(self):
+        scope = {'headers': [(b'x-forwarded-for', b'9.9.9.9, 5.6.7.8')], 'client': ('10.0.0.1', 1234)}
+        assert get_source(scope) == '5.6.7.8'
+
+
+class TestIngressLimitMiddleware:
+    """Test webhook and booking endpoints are limited"""
+
+    def test_rate_limited_per_source(self, client, db, monkeypatch):
+        url = client.app.url_path_for('tc2-callback')
+        monkeypatch.setattr(ingress_limits['/tc2/callback/'], 'buckets', TokenBuckets(rate=0.5, burst=2))
+
+        assert client.post(url, json=WEBHOOK).status_code == 200
+        assert client.post(url, json=WEBHOOK).status_code == 200
+        r = client.post(url, json=WEBHOOK)
+        assert r.status_code == 429
+        assert r.json() == {'status': 'error', 'message': 'Too many requests'}
+        assert r.headers['Retry-After'] == '2'
+
+        r = client.post(url, json=WEBHOOK, headers={'X-Forwarded-For': '5.6.7.8'})
+        assert r.status_code == 200
+
+    def test_endpoints_limited_separately(self, client, db, monkeypatch):
+        monkeypatch.setattr(ingress_limits['/tc2/callback/'], 'buckets', TokenBuckets(rate=0.5, burst=1))
+
+        assert client.post(client.app.url_path_for('tc2-callback'), json=WEBHOOK).status_code == 200
+        assert client.post(client.app.url_path_for('tc2-callback'), json=WEBHOOK).status_code == 429
+        r = client.post(client.app.url_path_for('pipedrive-callback'), json={'meta': {'entity': 'note'}})
+        assert r.status_code == 200
+
+    def test_other_endpoints_not_limited(self, client, db, monkeypatch):
+        monkeypatch.setattr(ingress_limits['/callbooker/sales/book/'], 'buckets', TokenBuckets(rate=0.5, burst=0))
+
+        assert client.get('/health').status_code == 200
+        assert client.post(client.app.url_path_for('book-sales-call'), json={}).status_code == 429
+        assert client.post(client.app.url_path_for('book-support-call'), json={}).status_code != 429
+
+    def test_too_many_in_flight(self, client, db, monkeypatch):
+        limit = ingress_limits['/tc2/callback/']
+        monkeypatch.setattr(limit, 'in_flight', limit.max_concurrency)
+
+        r = client.post(client.app.url_path_for('tc2-callback'), json=WEBHOOK)
+
+        assert r.status_code == 503
+        assert r.headers['Retry-After'] == '1'
+
+    def test_shed_requests_dont_use_rate_limit(self, client, db, monkeypatch):
+        limit = ingress_limits['/tc2/callback/']
+        monkeypatch.setattr(limit, 'buckets', TokenBuckets(rate=0.5, burst=1))
+        monkeypatch.setattr(limit, 'in_flight', limit.max_concurrency)
+        with patch.object(db_pool_saturation, 'value', lambda: db_pool_saturation.limit):
+            assert client.post(client.app.url_path_for('tc2-callback'), json=WEBHOOK).status_code == 503
+        assert client.post(client.app.url_path_for('tc2-callback'), json=WEBHOOK).status_code == 503
+
+        monkeypatch.setattr(limit, 'in_flight', 0)
+        assert client.post(client.app.url_path_for('tc2-callback'), json=WEBHOOK).status_code == 200
+
+    def test_in_flight_released(self, client, db):
+        limit = ingress_limits['/tc2/callback/']
+        for _ in range(limit.max_concurrency + 1):
+            assert client.post(client.app.url_path_for('tc2-callback'), json=WEBHOOK).status_code == 200
+        assert limit.in_flight == 0
+
+    @pytest.mark.parametrize('saturation', [db_pool_saturation, tc2_backlog_saturation], ids=['db', 'tc2'])
+    def test_shed_when_saturated(self, saturation, client, db, monkeypatch):
+        monkeypatch.setattr(saturation, 'value', lambda: saturation.limit)
+
+        r = client.post(client.app.url_path_for('tc2-callback'), json=WEBHOOK)
+
+        assert r.status_code == 503
+        assert r.json() == {'status': 'error', 'message': 'Service overloaded'}
+        assert r.headers['Retry-After'] == '5'
+
+    def test_booking_not_shed_for_tc2_backlog(self, client, db, monkeypatch):
+        monkeypatch.setattr(tc2_backlog_saturation, 'value', lambda: tc2_backlog_saturation.limit)
+
+        r = client.post(client.app.url_path_for('book-sales-call'), json={})
+
+        assert r.status_code != 503
+
+
+class TestSaturationSignals:
+    """Test saturation signals are exposed on the health endpoint"""
+
+    def test_health(self, client, db):
+        r = client.get('/health')
+
+        assert r.status_code == 200
+        data = r.json()
+        assert data['status'] == 'healthy'
+        assert data['saturation'] == {
+            'db_pool_usage': {'value': 0, 'limit': 0.9, 'saturated': False},
+            'tc2_event_backlog': {'value': 0, 'limit': 10000, 'saturated': False},
+        }
+        assert data['endpoints']['/tc2/callback/'] == {'in_flight': 0, 'max_concurrency': 10}
+        assert set(data['endpoints']) == {'/tc2/callback/', '/pipedrive/callback/', '/callbooker/sales/book/'}
+
+    def test_health_saturated(self, client, monkeypatch):
+        monkeypatch.setattr(tc2_backlog_saturation, 'value', lambda: 20_000)
+
+        data = client.get('/health').json()
+
+        assert data['status'] == 'saturated'
+        assert data['saturation']['tc2_event_backlog']['saturated'] is True
+
+    def test_db_pool_usage(self, monkeypatch):
+        engine = create_engine('sqlite://', poolclass=QueuePool, pool_size=5, max_overflow=5)
+        monkeypatch.setattr(database, 'engine', engine)
+        monkeypatch.setattr(database.settings, 'db_max_overflow', 5)
+
+        conns = [engine.connect() for _ in range(3)]
+        assert database.db_pool_usage() == 0.3
+        for conn in conns:
+            conn.close()
+        assert database.db_pool_usage() == 0
+        engine.dispose()
@@ -0,0 +1,126 @@
+"""
+Tests for checking pooled DB connections are alive.
+"""
+
+import logging
+import time
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core.database import DBSession
+from app.core.pool import ping_idle_connections
+from tests.helpers import count_queries
+
+logger = logging.getLogger('hermes.tests')
+
+
+@pytest.fixture
+def make_engine(tmp_path):
+    engines = []
+
+    def make_engine(**kwargs):
+        # Connections aren't reset as they're checked in, so a dead one stays in the pool like it would in Postgres
+        engine = create_engine(f'sqlite:///{tmp_path}/liveness.db', pool_size=1, pool_reset_on_return=None, **kwargs)
+        engines.append(engine)
+        return engine
+
+    yield make_engine
+    for engine in engines:
+        engine.dispose()
+
+
+def _kill_pooled_connection(engine):
+    with engine.connect() as conn:
+        conn.connection.dbapi_connection.close()
+
+
+def _query(engine) -> int:
+    with sessionmaker(class_=DBSession, bind=engine)() as db:
+        return db.exec(text('SELECT 1')).scalar()
+
+
+class TestIdlePing:
+    """Test connections are only pinged after being idle"""
+
+    def test_pinged_when_idle(self, make_engine):
+        engine = make_engine()
+        ping_idle_connections(engine, idle_secs=60)
+        _query(engine)
+
+        with patch.object(engine.dialect, 'do_ping', wraps=engine.dialect.do_ping) as do_ping:
+            _query(engine)
+            assert do_ping.call_count == 0
+
+            with patch('app.core.pool.time.monotonic', return_value=time.monotonic() + 61):
+                _query(engine)
+            assert do_ping.call_count == 1
+
+    def test_dead_idle_connection_replaced(self, make_engine):
+        engine = make_engine()
+        ping_idle_connections(engine, idle_secs=0)
+        _query(engine)
+        _kill_pooled_connection(engine)
+
+        assert _query(engine) == 1
+
+
+class TestRetryOnDeadConnection:
+    """Test a statement is run again on a new connection when its connection is dead"""
+
+    def test_first_statement_retried(self, make_engine, monkeypatch):
+        monkeypatch.setattr(settings, 'db_liveness', 'retry')
+        engine = make_engine()
+        _query(engine)
+        _kill_pooled_connection(engine)
+
+        assert _query(engine) == 1
+
+    def test_later_statement_not_retried(self, make_engine, monkeypatch):
+        monkeypatch.setattr(settings, 'db_liveness', 'retry')
+        engine = make_engine()
+
+        with sessionmaker(class_=DBSession, bind=engine)() as db:
+            db.exec(text('SELECT 1'))
+            db.connection().connection.dbapi_connection.close()
+            # The transaction's earlier work would be lost, so it's up to the caller
+            with pytest.raises(DBAPIError):
+                db.exec(text('SELECT 1'))
+
+    def test_not_retried_with_pre_ping(self, make_engine):
+        engine = make_engine()
+        _query(engine)
+        _kill_pooled_connection(engine)
+
+        with pytest.raises(DBAPIError):
+            _query(engine)
+
+
+class TestLivenessBenchmark:
+    """Compare the round trips of each way of checking connections, for many short sessions like the sync tasks'"""
+
+    def test_round_trips(self, make_engine, monkeypatch):
+        sessions = 200
+        round_trips = {}
+        for liveness in ('pre_ping', 'idle', 'retry'):
+            monkeypatch.setattr(settings, 'db_liveness', liveness)
+            engine = make_engine(pool_pre_ping=liveness == 'pre_ping')
+            if liveness == 'idle':
+                ping_idle_connections(engine, idle_secs=30)
+            _query(engine)
+
+            start = time.perf_counter()
+            with patch.object(engine.dialect, 'do_ping', wraps=engine.dialect.do_ping) as do_ping:
+                with count_queries(engine) as queries:
+                    for _ in range(sessions):
+                        _query(engine)
+            round_trips[liveness] = len(queries) + do_ping.call_count
+            logger.info(
+                f'{liveness}: {round_trips[liveness]} round trips, {(time.perf_counter() - start) * 1000:0.1f}ms'
+            )
+
+        assert round_trips == {'pre_ping': sessions * 2, 'idle': sessions, 'retry': sessions}
@@ -0,0 +1,91 @@
+"""
+Tests for observing the DB connection pool.
+"""
+
+import logging
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.core import pool
+from app.core.pool import ObservedQueuePool, PoolStats, PoolUserMiddleware, current_pool_user, pool_user
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    stats = PoolStats(long_held_secs=60)
+    monkeypatch.setattr(pool, 'pool_stats', stats)
+    return stats
+
+
+@pytest.fixture
+def engine(stats):
+    engine = create_engine('sqlite://', poolclass=ObservedQueuePool, pool_size=1, max_overflow=1)
+    stats.attach(engine)
+    yield engine
+    engine.dispose()
+
+
+class TestPoolStats:
+    """Test checkouts are recorded by the task using them"""
+
+    def test_checkouts(self, stats, engine):
+        with pool_user('task'):
+            with engine.connect() as conn:
+                conn.execute(text('SELECT 1'))
+                assert stats.users['task'].in_use == 1
+            with engine.connect():
+                pass
+
+        info = stats.info(engine.pool)
+        assert info['size'] == 1
+        assert info['checked_out'] == 0
+        task = info['users']['task']
+        assert (task['checkouts'], task['in_use'], task['overflows'], task['long_held']) == (2, 0, 0, 0)
+        assert task['max_wait_ms'] >= task['mean_wait_ms'] >= 0
+        assert task['max_held_ms'] >= task['mean_held_ms'] > 0
+
+    def test_overflow(self, stats, engine):
+        with engine.connect(), engine.connect():
+            assert stats.info(engine.pool)['overflow'] == 1
+
+        assert stats.users['unknown'].overflows == 1
+
+    def test_long_held(self, stats, engine, caplog):
+        stats.long_held_secs = 0
+        with caplog.at_level(logging.WARNING, logger='hermes.pool'):
+            with pool_user('slow task'), engine.connect():
+                pass
+
+        assert stats.users['slow task'].long_held == 1
+        assert [h['user'] for h in stats.info(engine.pool)['long_held']] == ['slow task']
+        assert 'slow task held a database connection' in caplog.text
+
+
+class TestPoolUser:
+    """Test connections are tagged with the route of the request or the task using them"""
+
+    def test_route(self):
+        app = FastAPI()
+        app.add_middleware(PoolUserMiddleware)
+
+        @app.get('/things/{thing_id}/')
+        def get_thing(thing_id: int):
+            return {'user': current_pool_user()}
+
+        @app.post('/tasks/')
+        async def run_task():
+            with pool_user('task'):
+                return {'user': current_pool_user()}
+
+        client = TestClient(app)
+        assert client.get('/things/123/').json() == {'user': 'GET /things/{thing_id}/'}
+        assert client.post('/tasks/').json() == {'user': 'task'}
+        assert current_pool_user() == 'unknown'
+
+    def test_debug_pool(self, client):
+        r = client.get('/debug/pool')
+        assert r.status_code == 200
+        assert {'users', 'size', 'checked_out', 'overflow', 'long_held'} <= set(r.json())
@@ -0,0 +1,51 @@
+"""
+Tests for routing read-only endpoints to the read replica.
+"""
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import SQLModel, create_engine, select
+
+from app.core import database
+from app.core.database import DBSession, get_read_db
+from app.main import app
+from app.main_app.models import Admin, Company, RoundRobinCursor
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch, client):
+    """A SQLite copy of the schema standing in for the replica, with different data to the primary"""
+    engine = create_engine(f'sqlite:///{tmp_path}/replica.db', connect_args={'check_same_thread': False})
+    SQLModel.metadata.create_all(engine)
+    ReplicaSession = sessionmaker(class_=DBSession, autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(database, 'ReadSessionCls', ReplicaSession)
+    app.dependency_overrides.pop(get_read_db)
+    with ReplicaSession() as db:
+        yield db
+    engine.dispose()
+
+
+class TestReadReplica:
+    """Test read-only endpoints read from the replica, and the others from the primary"""
+
+    def test_companies(self, client, db, replica, test_admin):
+        replica_admin = replica.create(Admin(username='replica@example.com'))
+        replica.create(Company(name='Acme', sales_person_id=replica_admin.id, price_plan='payg', country='GB'))
+        db.create(Company(name='Acme Primary', sales_person_id=test_admin.id, price_plan='payg', country='GB'))
+
+        r = client.get(client.app.url_path_for('get-companies'), params={'country': 'GB'})
+        assert [c['name'] for c in r.json()] == ['Acme']
+
+        r = client.get(client.app.url_path_for('search-companies'), params={'country': 'GB'})
+        assert [c['name'] for c in r.json()['companies']] == ['Acme']
+
+    def test_round_robin_on_primary(self, client, db, replica):
+        # Taking a turn writes the round-robin's cursor
+        admin = db.create(Admin(username='support@example.com', is_support_person=True))
+
+        r = client.get(client.app.url_path_for('choose-support-person'))
+
+        assert r.status_code == 200
+        assert r.json()['id'] == admin.id
+        assert db.exec(select(RoundRobinCursor)).one().turns == 1
+        assert replica.exec(select(RoundRobinCursor)).all() == []
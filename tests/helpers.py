@@ -2,9 +2,13 @@
 Test helpers and utilities for Hermes v4 tests.
 """
 
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import Any, Dict, Optional
 
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
 
 class MockResponse:
     """Mock HTTP response object for testing"""
@@ -63,7 +67,7 @@ def fake_gcal_builder(
     meeting_dur_mins: int = 90,
 ):
     """
-    Mock Google Calendar resource builder for testing.
+    Mock Google Calendar API request for testing.
 
     Args:
         admin_email: Email address to use in calendar response
@@ -72,62 +76,97 @@ def fake_gcal_builder(
         meeting_dur_mins: Duration of busy period in minutes
 
     Returns:
-        MockGCalResource class (not instance) that can be used with mock.side_effect
+        Function that can be used as the side_effect of a mocked AdminGoogleCalendar._request
     """
 
     def as_iso_8601(dt: datetime):
         return dt.isoformat().replace('+00:00', 'Z')
 
-    class MockGCalResource:
-        def execute(self):
-            from datetime import timezone
-
-            utc = timezone.utc
-            start = start_dt or datetime(2026, 7, 8, 11, tzinfo=utc)
-            end = start + timedelta(minutes=meeting_dur_mins)
-            return {'calendars': {admin_email: {'busy': [{'start': as_iso_8601(start), 'end': as_iso_8601(end)}]}}}
-
-        def query(self, body: dict):
-            self.body = body
-            return self
+    def fake_request(method: str, path: str, **kwargs):
+        from datetime import timezone
 
-        def freebusy(self, *args, **kwargs):
-            return self
+        if path != 'freeBusy':
+            # Creating events, we don't use the response
+            return {}
 
-        def events(self):
-            return self
+        utc = timezone.utc
+        start = start_dt or datetime(2026, 7, 8, 11, tzinfo=utc)
+        end = start + timedelta(minutes=meeting_dur_mins)
+        return {'calendars': {admin_email: {'busy': [{'start': as_iso_8601(start), 'end': as_iso_8601(end)}]}}}
 
-        def insert(self, *args, **kwargs):
-            return self
-
-    return MockGCalResource
+    return fake_request
 
 
 def create_mock_gcal_resource(admin_email: str):
     """
-    Create a mock Google Calendar resource with empty calendar.
+    Create a mock Google Calendar API response with empty calendar.
 
     Args:
         admin_email: Email address to use in calendar response
 
     Returns:
-        MockGCalResource instance with no busy periods
+        Response data with no busy periods, for use as the return_value of a mocked AdminGoogleCalendar._request
     """
+    return {'calendars': {admin_email: {'busy': []}}}
 
-    class MockGCalResource:
-        def execute(self):
-            return {'calendars': {admin_email: {'busy': []}}}
 
-        def query(self, body: dict):
-            return self
+@contextmanager
+def count_queries(engine: Engine):
+    """
+    Record the SQL statements executed against the engine inside the block.
 
-        def freebusy(self, *args, **kwargs):
-            return self
+    Usage:
+        with count_queries(engine) as queries:
+            ...
+        assert len(queries) == 3
+    """
+    queries = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
 
-        def events(self):
-            return self
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield queries
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
 
-        def insert(self, *args, **kwargs):
-            return self
 
-    return MockGCalResource()
+@contextmanager
+def assert_max_queries(engine: Engine, max_queries: int):
+    """
+    Fail if more than `max_queries` SQL statements are executed against the engine inside the block, listing them, so
+    a lazy load creeping back into code that's meant to load everything up front is caught.
+    """
+    with count_queries(engine) as queries:
+        yield queries
+    assert len(queries) <= max_queries, f'{len(queries)} queries, expected at most {max_queries}:\n' + '\n'.join(
+        queries
+    )
+
+
+def tc2_client_data(cligency_id: int, sales_person_id: int, **meta_agency) -> dict:
+    """TC2 Client webhook data for a client with two paid recipients, overriding meta_agency fields with kwargs"""
+    return {
+        'id': cligency_id,
+        'meta_agency': {
+            'id': cligency_id + 10000,
+            'name': f'Agency {cligency_id}',
+            'country': 'United Kingdom (GB)',
+            'website': 'https://example.com',
+            'status': 'active',
+            'paid_invoice_count': 5,
+            'created': '2024-01-01T00:00:00Z',
+            'price_plan': 'monthly-payg',
+            'narc': False,
+            **meta_agency,
+        },
+        'user': {'first_name': 'John', 'last_name': 'Doe', 'email': 'john@example.com', 'phone': '+1234567890'},
+        'status': 'active',
+        'sales_person': {'id': sales_person_id},
+        'paid_recipients': [
+            {'id': cligency_id + 20000, 'first_name': 'John', 'last_name': 'Doe', 'email': f'john{cligency_id}@x.com'},
+            {'id': cligency_id + 30000, 'first_name': 'Jane', 'last_name': 'Doe', 'email': None},
+        ],
+        'extra_attrs': [{'machine_name': 'utm_source', 'value': 'google'}],
+    }
@@ -0,0 +1,95 @@
+"""
+Tests for contacts' normalised identities.
+"""
+
+from sqlmodel import select
+
+from app.main_app.identity import find_contact, normalise_email, normalise_phone
+from app.main_app.models import Contact, ContactIdentity
+from app.pipedrive.models import Person
+from app.pipedrive.process import PersonProcessor
+
+
+def _identities(db, contact_id: int) -> set[tuple[str, str]]:
+    return {(i.kind, i.value) for i in db.exec(select(ContactIdentity).where(ContactIdentity.contact_id == contact_id))}
+
+
+class TestNormalise:
+    """Test emails and phone numbers are normalised however they're written"""
+
+    def test_email(self):
+        assert normalise_email(' Brain@Junes.COM ') == 'brain@junes.com'
+        assert normalise_email('not an email') is None
+        assert normalise_email(None) is None
+
+    def test_phone(self):
+        for phone in ('+44 (0)20 7946-0958', '0044 20 7946 0958', '+44.20.7946.0958'):
+            assert normalise_phone(phone) == '+442079460958'
+        assert normalise_phone('020 7946 0958', 'GB') == '+442079460958'
+        assert normalise_phone('(415) 555-0100', 'US') == '+14155550100'
+        # We don't know the country's dialling code, so can't tell what it'd be internationally
+        assert normalise_phone('020 7946 0958', 'XX') == '02079460958'
+        assert normalise_phone('020 7946 0958') == '02079460958'
+
+    def test_not_a_phone(self):
+        assert normalise_phone('ask for Brain') is None
+        assert normalise_phone('123') is None
+        assert normalise_phone(None) is None
+
+
+class TestIdentities:
+    """Test contacts' identities are kept up to date as they're saved"""
+
+    def test_saved_with_contact(self, db, test_company):
+        contact = db.create(
+            Contact(
+                last_name='Junes',
+                email='Brain@Junes.com',
+                phone='020 7946 0958',
+                country='GB',
+                company_id=test_company.id,
+            )
+        )
+
+        assert _identities(db, contact.id) == {('email', 'brain@junes.com'), ('phone', '+442079460958')}
+
+        contact.email = 'brain@example.com'
+        contact.phone = None
+        db.add(contact)
+        db.commit()
+        assert _identities(db, contact.id) == {('email', 'brain@example.com')}
+
+        db.delete(contact)
+        db.commit()
+        assert _identities(db, contact.id) == set()
+
+    def test_find_contact(self, db, test_company):
+        older = db.create(Contact(last_name='Junes', email='brain@junes.com', company_id=test_company.id))
+        latest = db.create(Contact(last_name='Junes', email='BRAIN@junes.com', company_id=test_company.id))
+        by_phone = db.create(Contact(last_name='Junes', phone='+1 415 555 0100', company_id=test_company.id))
+
+        assert find_contact(db, email='brain@JUNES.com') == latest
+        assert find_contact(db, email='brain@junes.com', where=(Contact.id != latest.id,)) == older
+        assert find_contact(db, email='other@junes.com', phone='(415) 555-0100', country='US') == by_phone
+        assert find_contact(db, email='other@junes.com') is None
+
+
+class TestIngestMatching:
+    """Test contacts from Pipedrive are matched to the same person from elsewhere"""
+
+    async def test_pipedrive_person(self, db, test_company):
+        test_company.pd_org_id = 10
+        test_company.country = 'GB'
+        db.add(test_company)
+        db.commit()
+        booked = db.create(
+            Contact(last_name='Junes', phone='+44 20 7946 0958', country='GB', company_id=test_company.id)
+        )
+        person = Person.model_validate(
+            {'id': 20, 'name': 'Brain Junes', 'org_id': 10, 'phones': [{'value': '020 7946 0958'}]}
+        )
+
+        await PersonProcessor(db).process(None, person)
+
+        contact = db.exec(select(Contact)).one()
+        assert (contact.id, contact.pd_person_id, contact.first_name) == (booked.id, 20, 'Brain')
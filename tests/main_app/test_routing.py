@@ -0,0 +1,75 @@
+"""
+Tests for the admins each round-robin chooses from.
+"""
+
+from app.main_app.models import Admin
+from app.main_app.routing import AdminRouting, admin_data, admin_routing, country_region
+from tests.conftest import engine
+from tests.helpers import count_queries
+
+
+def _sales_person(db, name: str, **flags) -> Admin:
+    flags = {'sells_payg': True, **flags}
+    return db.create(Admin(first_name=name, username=f'{name.lower()}@example.com', is_sales_person=True, **flags))
+
+
+class TestCountryRegion:
+    """Test countries are sold in the right region"""
+
+    def test_regions(self):
+        assert country_region('US') == 'us'
+        assert country_region('GB') == 'gb'
+        assert country_region('FR') == 'eu'
+        assert country_region('NO') == 'eu'
+        assert country_region('BR') == 'row'
+
+
+class TestAdminRouting:
+    """Test the round-robins' admins are loaded once and reloaded when admins change"""
+
+    def test_sales_people_by_plan_and_region(self, db):
+        gb = _sales_person(db, 'Gb', sells_gb=True)
+        gb_eu = _sales_person(db, 'Eu', sells_gb=True, sells_eu=True)
+        _sales_person(db, 'Startup', sells_payg=False, sells_startup=True, sells_gb=True)
+
+        assert [a['id'] for a in admin_routing.sales_people(db, 'payg', 'gb')[1]] == [gb.id, gb_eu.id]
+        assert admin_routing.sales_people(db, 'payg', 'eu') == ('sales:payg:eu', (admin_data(gb_eu),))
+        # No one sells PAYG in the US, so it's shared with everyone who sells PAYG
+        key, admins = admin_routing.sales_people(db, 'payg', 'us')
+        assert (key, [a['id'] for a in admins]) == ('sales:payg', [gb.id, gb_eu.id])
+        assert admin_routing.sales_people(db, 'enterprise', 'gb') == ('sales:enterprise', ())
+
+    def test_choosing_doesnt_query_admins(self, client, db):
+        _sales_person(db, 'Gb', sells_gb=True)
+        client.get(client.app.url_path_for('choose-sales-person'), params={'plan': 'payg', 'country_code': 'GB'})
+
+        with count_queries(engine) as queries:
+            r = client.get(
+                client.app.url_path_for('choose-sales-person'), params={'plan': 'payg', 'country_code': 'GB'}
+            )
+
+        assert r.status_code == 200
+        assert not any('FROM admin' in q for q in queries)
+
+    def test_reloaded_when_admins_change(self, db):
+        admin = _sales_person(db, 'Gb', sells_gb=True)
+        assert admin_routing.sales_people(db, 'payg', 'gb')[0] == 'sales:payg:gb'
+
+        admin.sells_gb = False
+        db.add(admin)
+        db.flush()
+        # Not until the change is committed
+        assert admin_routing.sales_people(db, 'payg', 'gb')[0] == 'sales:payg:gb'
+        db.commit()
+
+        assert admin_routing.sales_people(db, 'payg', 'gb')[0] == 'sales:payg'
+
+    def test_reloaded_after_ttl(self, db):
+        routing = AdminRouting(ttl=0)
+        assert routing.support_people(db) == ()
+
+        # Added by another process, so the routing isn't told
+        with engine.begin() as conn:
+            conn.execute(Admin.__table__.insert().values(username='support@example.com', is_support_person=True))
+
+        assert [a['email'] for a in routing.support_people(db)] == ['support@example.com']
@@ -0,0 +1,111 @@
+"""
+Tests for searching companies.
+"""
+
+from sqlalchemy import insert, text
+
+from app.main_app.models import Company
+from app.main_app.search import CompanySearch, encode_cursor, search_statement
+from tests.conftest import engine
+
+
+def _add_companies(db, sales_person_id: int, *names: str, **fields):
+    db.execute(
+        insert(Company),
+        [{'name': name, 'sales_person_id': sales_person_id, 'price_plan': 'payg', **fields} for name in names],
+    )
+    db.commit()
+
+
+def _search(client, **params) -> dict:
+    r = client.get(client.app.url_path_for('search-companies'), params=params)
+    assert r.status_code == 200, r.text
+    assert r.headers['content-type'] == 'application/json'
+    return r.json()
+
+
+class TestSearchCompanies:
+    """Test the company search endpoint"""
+
+    async def test_pages(self, client, db, test_admin):
+        # Names that are the same are ordered by id
+        names = ['Delta', 'alpha', 'Bravo', 'Bravo', 'Charlie', 'Echo', 'Foxtrot']
+        _add_companies(db, test_admin.id, *names)
+        expected = sorted(zip(names, range(1, len(names) + 1)))
+
+        found, after = [], None
+        while True:
+            page = _search(client, limit=3, **({'after': after} if after else {}))
+            assert len(page['companies']) <= 3
+            found += page['companies']
+            if not (after := page['next']):
+                break
+
+        assert [(c['name'], c['id']) for c in found] == expected
+        assert set(found[0]) == {
+            'id',
+            'name',
+            'pd_org_id',
+            'tc2_cligency_id',
+            'tc2_agency_id',
+            'country',
+            'price_plan',
+        }
+
+    async def test_batches(self, client, db, test_admin, monkeypatch):
+        monkeypatch.setattr('app.main_app.search.STREAM_BATCH_SIZE', 2)
+        _add_companies(db, test_admin.id, *(f'Company {i}' for i in range(7)))
+
+        page = _search(client, limit=5)
+        assert [c['name'] for c in page['companies']] == [f'Company {i}' for i in range(5)]
+        page = _search(client, limit=5, after=page['next'])
+        assert [c['name'] for c in page['companies']] == ['Company 5', 'Company 6']
+        assert page['next'] is None
+
+    async def test_filters(self, client, db, test_admin):
+        _add_companies(db, test_admin.id, 'Acme GB', 'Acme 100% US', country='GB', tc2_status='trial')
+        _add_companies(db, test_admin.id, 'Acme US', country='US', tc2_status='active')
+        _add_companies(db, test_admin.id, 'Acmes Startup', country='US', price_plan='startup')
+
+        def names(**params) -> list[str]:
+            return [c['name'] for c in _search(client, **params)['companies']]
+
+        assert names(country='GB') == ['Acme 100% US', 'Acme GB']
+        assert names(name='acme us') == ['Acme US']
+        assert names(name_prefix='acme ') == ['Acme 100% US', 'Acme GB', 'Acme US']
+        assert names(q='e us') == ['Acme US']
+        # Wildcards are matched literally
+        assert names(q='100%') == ['Acme 100% US']
+        assert names(name_prefix='Acme_') == []
+        assert names(price_plan='startup') == ['Acmes Startup']
+        assert names(country='US', tc2_status='active') == ['Acme US']
+        assert names(sales_person_id=test_admin.id, limit=1) == ['Acme 100% US']
+        assert names(sales_person_id=test_admin.id + 1) == []
+
+    async def test_invalid_filters(self, client):
+        url = client.app.url_path_for('search-companies')
+
+        assert client.get(url, params={'website': 'acme.com'}).status_code == 422
+        assert client.get(url, params={'sales_person_id': 'steve'}).status_code == 422
+        assert client.get(url, params={'price_plan': 'free'}).status_code == 422
+        assert client.get(url, params={'q': 'ac'}).status_code == 422
+        assert client.get(url, params={'limit': 5000}).status_code == 422
+        assert client.get(url, params={'after': 'not a cursor'}).status_code == 422
+        assert client.get(url, params={'after': encode_cursor('Acme', 1)[:-4]}).status_code == 422
+
+
+class TestSearchIndexes:
+    """Test the search's filters are read in order from an index, rather than scanning and sorting the companies"""
+
+    def test_query_plans(self, db):
+        for search, index in (
+            (CompanySearch(), 'ix_company_name_id'),
+            (CompanySearch(country='GB'), 'ix_company_country_name_id'),
+            (CompanySearch(price_plan='payg'), 'ix_company_price_plan_name_id'),
+            (CompanySearch(sales_person_id=1), 'ix_company_sales_person_id_name_id'),
+        ):
+            stmt = search_statement(search).limit(100)
+            compiled = stmt.compile(engine, compile_kwargs={'literal_binds': True})
+            plan = ' '.join(r[-1] for r in db.exec(text(f'EXPLAIN QUERY PLAN {compiled}')).all())
+            assert index in plan
+            assert 'TEMP B-TREE' not in plan
@@ -2,9 +2,11 @@
 Tests for core Hermes endpoints.
 """
 
-from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
 
-from app.main_app.models import Admin, Company
+from app.core.database import get_session
+from app.main_app.models import Admin, Company, RoundRobinCursor
+from app.main_app.views import take_turn
 
 
 class TestRoundRobinEndpoints:
@@ -56,16 +58,49 @@ class TestRoundRobinEndpoints:
             )
         )
 
-        db.create(Company(name='Latest Company', sales_person_id=admin1.id, price_plan='payg', country='GB'))
+        ids = []
+        for _ in range(4):
+            r = client.get(
+                client.app.url_path_for('choose-sales-person'), params={'plan': 'payg', 'country_code': 'GB'}
+            )
+            assert r.status_code == 200
+            ids.append(r.json()['id'])
+
+        assert ids == [admin1.id, admin2.id, admin1.id, admin2.id]
+
+    async def test_choose_sales_person_round_robin_per_plan_and_region(self, client, db):
+        """Test each price plan and region has its own round robin"""
+        admins = [
+            db.create(
+                Admin(
+                    first_name=f'Admin{i}',
+                    last_name='Test',
+                    username=f'admin{i}@example.com',
+                    is_sales_person=True,
+                    sells_payg=True,
+                    sells_startup=True,
+                    sells_gb=True,
+                    sells_us=True,
+                )
+            )
+            for i in range(2)
+        ]
 
-        r = client.get(client.app.url_path_for('choose-sales-person'), params={'plan': 'payg', 'country_code': 'GB'})
+        def choose(plan: str, country_code: str) -> int:
+            r = client.get(
+                client.app.url_path_for('choose-sales-person'), params={'plan': plan, 'country_code': country_code}
+            )
+            assert r.status_code == 200
+            return r.json()['id']
 
-        assert r.status_code == 200
-        data = r.json()
-        assert data['id'] == admin2.id
+        assert choose('payg', 'GB') == admins[0].id
+        assert choose('payg', 'US') == admins[0].id
+        assert choose('startup', 'GB') == admins[0].id
+        assert choose('payg', 'GB') == admins[1].id
+        assert db.get(RoundRobinCursor, 'sales:payg:gb').turns == 2
 
-    async def test_choose_sales_person_round_robin_missing_person(self, client, db):
-        """Test round robin when current person is missing from list"""
+    async def test_choose_sales_person_round_robin_admin_removed(self, client, db):
+        """Test the round robin carries on when an admin stops selling"""
         admin_1 = db.create(
             Admin(
                 first_name='Admin1',
@@ -76,32 +111,25 @@ class TestRoundRobinEndpoints:
                 sells_gb=True,
             )
         )
-        db.create(
-            Admin(
-                first_name='Admin2',
-                last_name='Test',
-                username='admin2@example.com',
-                is_sales_person=True,
-                sells_payg=True,
-                sells_gb=True,
-            )
-        )
-
-        # Create a company with a sales person that no longer exists or is not active
-        db.create(
-            Company(
-                name='Test Company',
-                price_plan='payg',
-                sales_person_id=999,  # Non-existent admin
-            )
-        )
+        db.create(RoundRobinCursor(key='sales:payg:gb', turns=5))
 
-        # Should start from the beginning of the list
         r = client.get(client.app.url_path_for('choose-sales-person'), params={'plan': 'payg', 'country_code': 'GB'})
 
         assert r.status_code == 200
         assert r.json()['id'] == admin_1.id
 
+    def test_concurrent_turns(self, db):
+        """Test concurrent requests each take their own turn"""
+
+        def turn(_) -> int:
+            with get_session() as session:
+                return take_turn(session, 'sales:payg:gb')
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            turns = list(pool.map(turn, range(20)))
+
+        assert sorted(turns) == list(range(20))
+
     async def test_choose_sales_person_invalid_plan(self, client):
         """Test that invalid plan returns 422"""
         r = client.get(client.app.url_path_for('choose-sales-person'), params={'plan': 'invalid', 'country_code': 'GB'})
@@ -282,9 +310,6 @@ class TestRoundRobinEndpoints:
         assert response1.status_code == 200
         assert response1.json()['id'] == admin1.id
 
-        # Create a company with admin1 as support
-        db.create(Company(name='Test', sales_person_id=admin1.id, support_person_id=admin1.id))
-
         # Second call should return admin2
         response2 = client.get(client.app.url_path_for('choose-support-person'))
         assert response2.status_code == 200
@@ -295,12 +320,12 @@ class TestRoundRobinEndpoints:
         admin1 = db.create(
             Admin(first_name='Support1', last_name='Admin', username='support1@example.com', is_support_person=True)
         )
-        admin2 = db.create(
+        db.create(
             Admin(first_name='Support2', last_name='Admin', username='support2@example.com', is_support_person=True)
         )
 
-        # Create a company with admin2 as support (last in list)
-        db.create(Company(name='Test', sales_person_id=admin1.id, support_person_id=admin2.id))
+        # Support2 (last in list) had the last turn
+        db.create(RoundRobinCursor(key='support', turns=2))
 
         # Next call should wrap around to admin1
         r = client.get(client.app.url_path_for('choose-support-person'))
@@ -341,6 +366,18 @@ class TestCompanySearchEndpoint:
         assert len(companies) == 1
         assert companies[0]['name'] == 'Alpha Company'
 
+    async def test_get_companies_filters_on_company_columns(self, client, db, test_admin):
+        """Test the name is matched exactly, and params that aren't Company columns are ignored"""
+        db.create(Company(name='Alpha Company', sales_person_id=test_admin.id, price_plan='payg', country='GB'))
+        db.create(Company(name='alpha company', sales_person_id=test_admin.id, price_plan='payg', country='GB'))
+
+        r = client.get(
+            client.app.url_path_for('get-companies'), params={'name': 'Alpha Company', 'country': 'GB', 'foo': 'bar'}
+        )
+
+        assert r.status_code == 200
+        assert [c['name'] for c in r.json()] == ['Alpha Company']
+
     async def test_get_companies_requires_params(self, client):
         """Test that companies endpoint requires at least one parameter"""
         r = client.get(client.app.url_path_for('get-companies'))
@@ -357,18 +394,3 @@ class TestCompanySearchEndpoint:
         assert r.status_code == 200
         companies = r.json()
         assert len(companies) == 10
-
-    @patch('app.main_app.views.get_next_sales_person')
-    async def test_choose_sales_person_admin_not_found_edge_case(self, mock_get_next, client, db, test_admin):
-        """Test edge case where get_next_sales_person returns ID that doesn't exist"""
-        test_admin.sells_payg = True
-        test_admin.sells_gb = True
-        db.add(test_admin)
-        db.commit()
-
-        # Mock to return non-existent admin ID
-        mock_get_next.return_value = 999
-
-        r = client.get(client.app.url_path_for('choose-sales-person'), params={'plan': 'payg', 'country_code': 'GB'})
-
-        assert r.status_code == 404
@@ -2,6 +2,8 @@
 Tests for Pipedrive API v2 helper functions.
 """
 
+from httpx import HTTPStatusError, Request, Response, TimeoutException
+
 from app.pipedrive import api
 
 
@@ -24,3 +26,18 @@ class TestPipedriveAPIHelpers:
         changed = api.get_changed_fields(None, new_data)
 
         assert changed == new_data
+
+    def test_is_gone(self):
+        """Test that only 404 and 410 responses mean an object is gone, whatever the URL or message"""
+        request = Request('GET', 'https://api.pipedrive.com/api/v2/organizations/14041')
+
+        def error(status_code: int) -> HTTPStatusError:
+            return HTTPStatusError(
+                f'{status_code} for url {request.url}', request=request, response=Response(status_code)
+            )
+
+        assert api.is_gone(error(404))
+        assert api.is_gone(error(410))
+        assert not api.is_gone(error(500))
+        assert not api.is_gone(TimeoutException(f'Timed out requesting {request.url}', request=request))
+        assert not api.is_gone(Exception('404 Not Found'))
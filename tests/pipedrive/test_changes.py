@@ -0,0 +1,124 @@
+"""
+Tests for the Pipedrive change feed.
+"""
+
+import asyncio
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, patch
+
+from sqlmodel import select
+
+from app.main_app.models import Company, PipedriveSyncCursor, Pipeline
+from app.pipedrive.changes import PipedriveChangeFeed, pull_changes
+from app.pipedrive.field_mappings import COMPANY_PD_FIELD_MAP
+
+SINCE = datetime(2026, 10, 18, 12, tzinfo=timezone.utc)
+
+
+def _set_cursor(db, entity: str, updated_since: datetime = SINCE):
+    db.add(PipedriveSyncCursor(entity=entity, updated_since=updated_since))
+    db.commit()
+
+
+def _response(*objs: dict) -> dict:
+    return {'data': list(objs), 'additional_data': {'next_cursor': None}}
+
+
+class TestPullChanges:
+    """Test pulling an entity's changes"""
+
+    @patch('app.pipedrive.changes.api.pipedrive_request', new_callable=AsyncMock)
+    async def test_first_pull_starts_feed(self, mock_request, db):
+        assert await pull_changes('organization') == 0
+
+        mock_request.assert_not_called()
+        cursor = db.get(PipedriveSyncCursor, 'organization')
+        assert cursor.updated_since.replace(tzinfo=timezone.utc) > SINCE
+
+    @patch('app.pipedrive.changes.api.pipedrive_request', new_callable=AsyncMock)
+    async def test_processes_organizations_updated_since(self, mock_request, db, test_company):
+        _set_cursor(db, 'organization')
+        mock_request.return_value = _response(
+            # Updated at exactly the cursor time, so already processed
+            {'id': 1, 'name': 'Old', 'update_time': '2026-10-18T12:00:00Z'},
+            {
+                'id': 2,
+                'name': 'Renamed',
+                'update_time': '2026-10-18T12:05:00Z',
+                'custom_fields': {COMPANY_PD_FIELD_MAP['hermes_id']: {'type': 'double', 'value': test_company.id}},
+            },
+        )
+
+        assert await pull_changes('organization') == 1
+
+        mock_request.assert_called_once_with(
+            'organizations',
+            method='GET',
+            query_params={
+                'updated_since': '2026-10-18T12:00:00Z',
+                'sort_by': 'update_time',
+                'sort_direction': 'asc',
+                'limit': 500,
+            },
+        )
+        db.refresh(test_company)
+        assert test_company.name == 'Renamed'
+        cursor = db.get(PipedriveSyncCursor, 'organization')
+        db.refresh(cursor)
+        assert cursor.updated_since == datetime(2026, 10, 18, 12, 5)
+
+    @patch('app.pipedrive.changes.api.pipedrive_request', new_callable=AsyncMock)
+    async def test_pipelines_filtered_here(self, mock_request, db, test_pipeline):
+        _set_cursor(db, 'pipeline')
+        mock_request.return_value = _response(
+            {'id': test_pipeline.pd_pipeline_id, 'name': 'Unchanged', 'update_time': '2026-10-17T09:00:00Z'},
+            {'id': 99, 'name': 'New pipeline', 'update_time': '2026-10-18T13:00:00Z'},
+        )
+
+        assert await pull_changes('pipeline') == 1
+
+        assert mock_request.call_args.kwargs['query_params'] == {'limit': 500}
+        assert [p.name for p in db.exec(select(Pipeline).order_by(Pipeline.id))] == [test_pipeline.name, 'New pipeline']
+
+    @patch('app.pipedrive.changes.api.pipedrive_request', new_callable=AsyncMock)
+    async def test_error_doesnt_stop_feed(self, mock_request, db, test_company):
+        _set_cursor(db, 'organization')
+        test_company.pd_org_id = 2
+        db.add(test_company)
+        db.commit()
+        mock_request.return_value = _response(
+            # A new organisation whose owner isn't a Hermes admin
+            {'id': 1, 'name': 'No owner', 'owner_id': 999, 'update_time': '2026-10-18T12:01:00Z'},
+            {'id': 2, 'name': 'Renamed', 'update_time': '2026-10-18T12:02:00Z'},
+        )
+
+        assert await pull_changes('organization') == 2
+
+        assert db.exec(select(Company).where(Company.pd_org_id == 1)).first() is None
+        db.refresh(test_company)
+        assert test_company.name == 'Renamed'
+        cursor = db.get(PipedriveSyncCursor, 'organization')
+        db.refresh(cursor)
+        assert cursor.updated_since == datetime(2026, 10, 18, 12, 2)
+
+
+class TestPipedriveChangeFeed:
+    """Test running the change feed"""
+
+    async def test_disabled(self):
+        feed = PipedriveChangeFeed(0)
+        feed.start()
+
+        assert not feed.running
+
+    @patch('app.pipedrive.changes.pull_changes', new_callable=AsyncMock)
+    async def test_pulls_entities_in_order(self, mock_pull):
+        feed = PipedriveChangeFeed(3600)
+        feed.start()
+        assert feed.running
+        # Let the feed run until it's waiting for the next interval
+        await asyncio.sleep(0)
+        await feed.stop()
+
+        assert [c.args[0] for c in mock_pull.call_args_list] == ['pipeline', 'stage', 'organization', 'person', 'deal']
+        assert not feed.running
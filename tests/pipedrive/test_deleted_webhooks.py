@@ -183,10 +183,10 @@ class TestPipedriveOrganizationDeletion:
         # pd_org_id won't be set by webhook update - only by lookup during process
         assert test_company.is_deleted is False
 
-    @patch('app.pipedrive.tasks.api.get_organisation', new_callable=AsyncMock)
+    @patch('app.pipedrive.tasks.api.update_organisation', new_callable=AsyncMock)
     @patch('app.pipedrive.tasks.api.create_organisation', new_callable=AsyncMock)
     async def test_normal_flow_recreates_on_404(
-        self, mock_create_org, mock_get_org, client, db, test_company, sample_tc_webhook_data
+        self, mock_create_org, mock_update_org, client, db, test_company, sample_tc_webhook_data
     ):
         """Test normal flow: org with pd_org_id but NOT deleted recreates on 404"""
         test_company.tc2_cligency_id = 1004
@@ -199,9 +199,9 @@ class TestPipedriveOrganizationDeletion:
         # Simulate 404 from Pipedrive
         from httpx import HTTPStatusError, Request, Response
 
-        mock_get_org.side_effect = HTTPStatusError(
+        mock_update_org.side_effect = HTTPStatusError(
             '404 Not Found',
-            request=Request('GET', 'https://api.pipedrive.com/organizations/999'),
+            request=Request('PATCH', 'https://api.pipedrive.com/organizations/999'),
             response=Response(404),
         )
         mock_create_org.return_value = {'data': {'id': 1001}}
@@ -211,7 +211,7 @@ class TestPipedriveOrganizationDeletion:
 
         assert r.status_code == 200
 
-        mock_get_org.assert_called_once()
+        mock_update_org.assert_called_once()
         mock_create_org.assert_called_once()
 
         db.refresh(test_company)
@@ -446,8 +446,10 @@ class TestNewCompanyCreationFlow:
         assert test_company.paid_invoice_count == 10
         assert test_company.pd_org_id == 1500
 
-        mock_get_org.assert_called_once()
+        # Only the fields changed by the webhook are sent, without fetching the organisation to compare
+        assert not mock_get_org.called
         mock_update_org.assert_called_once()
+        assert mock_update_org.call_args.args[1]['custom_fields'][COMPANY_PD_FIELD_MAP['paid_invoice_count']] == '10'
 
     async def test_company_model_defaults_is_deleted_false(self, db, test_admin):
         """Test that Company model defaults is_deleted to False"""
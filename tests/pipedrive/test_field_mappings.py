@@ -0,0 +1,101 @@
+"""
+Tests for the compiled Pipedrive field maps.
+"""
+
+from datetime import datetime, timezone
+
+from app.core.config import settings
+from app.main_app.models import Company, Deal
+from app.pipedrive.field_mappings import (
+    COMPANY_PD_FIELD_MAP,
+    COMPANY_PD_FIELDS,
+    DEAL_PD_FIELD_MAP,
+    DEAL_PD_FIELDS,
+    _compile_field_map,
+    build_custom_fields,
+)
+from app.pipedrive.models import Organisation
+from app.pipedrive.process import OrganisationProcessor
+from app.pipedrive.tasks import _company_to_org_data
+
+
+def _company(company_id: int) -> Company:
+    return Company(
+        id=company_id,
+        name=f'Company {company_id}',
+        sales_person_id=1,
+        tc2_cligency_id=company_id,
+        paid_invoice_count=3,
+        price_plan='startup',
+        website='',
+        utm_source='google',
+        pay0_dt=datetime(2026, 1, 5, 12, tzinfo=timezone.utc),
+    )
+
+
+class TestCompiledFieldMaps:
+    """Test the field maps compiled into PDCustomFields"""
+
+    def test_company_custom_fields(self):
+        custom_fields = build_custom_fields(COMPANY_PD_FIELDS, _company(7))
+
+        assert custom_fields[COMPANY_PD_FIELD_MAP['hermes_id']] == '7'
+        assert custom_fields[COMPANY_PD_FIELD_MAP['paid_invoice_count']] == '3'
+        assert custom_fields[COMPANY_PD_FIELD_MAP['tc2_cligency_url']] == f'{settings.tc2_base_url}/clients/7/'
+        assert custom_fields[COMPANY_PD_FIELD_MAP['pay0_dt']] == '2026-01-05'
+        assert custom_fields[COMPANY_PD_FIELD_MAP['created']] == datetime.now(timezone.utc).date().isoformat()
+        assert COMPANY_PD_FIELD_MAP['website'] not in custom_fields
+        assert COMPANY_PD_FIELD_MAP['pay1_dt'] not in custom_fields
+
+    def test_deal_tc2_fields_from_company(self, db, test_deal):
+        company = db.get(Company, test_deal.company_id)
+        company.paid_invoice_count = 5
+        test_deal.paid_invoice_count = 1
+
+        custom_fields = build_custom_fields(DEAL_PD_FIELDS, test_deal)
+
+        assert custom_fields[DEAL_PD_FIELD_MAP['hermes_id']] == str(test_deal.id)
+        assert custom_fields[DEAL_PD_FIELD_MAP['paid_invoice_count']] == '5'
+
+    def test_deal_without_company(self):
+        custom_fields = build_custom_fields(DEAL_PD_FIELDS, Deal(id=1, tc2_status='trial'))
+
+        assert custom_fields == {DEAL_PD_FIELD_MAP['hermes_id']: '1', DEAL_PD_FIELD_MAP['tc2_status']: 'trial'}
+
+    def test_override_field_not_in_hermes(self):
+        fields = _compile_field_map({'hermes_id': 'a' * 40, 'not_a_field': 'b' * 40}, Company)
+
+        assert build_custom_fields(fields, _company(1)) == {'a' * 40: '1'}
+
+    def test_inbound_models_use_compiled_fields(self):
+        names = ('tc2_status', 'website', 'utm_source')
+        org = Organisation.model_validate(
+            {'custom_fields': {f.pd_field_id: {'value': 'x'} for f in COMPANY_PD_FIELDS if f.name in names}}
+        )
+
+        assert (org.tc2_status, org.website, org.utm_source) == ('x', 'x', 'x')
+        alias = Organisation.model_fields['tc2_status'].validation_alias
+        assert alias.choices[-1] == COMPANY_PD_FIELD_MAP['tc2_status']
+
+    def test_inbound_field_names(self):
+        assert 'hermes_id' not in OrganisationProcessor.custom_field_names
+        assert 'bdr_person_id' not in OrganisationProcessor.custom_field_names
+        assert OrganisationProcessor.custom_field_names[:2] == ('paid_invoice_count', 'tc2_status')
+
+    def test_same_as_looping_over_field_map(self):
+        """The compiled fields build the same custom fields as looping over the field map did"""
+
+        def loop_field_map(company: Company) -> dict:
+            custom_fields = {}
+            for field_name, pd_field_id in COMPANY_PD_FIELD_MAP.items():
+                value = company.id if field_name == 'hermes_id' else getattr(company, field_name, None)
+                if value is not None and value != '':
+                    if isinstance(value, datetime):
+                        value = value.date().isoformat()
+                    elif field_name in ('hermes_id', 'paid_invoice_count') and isinstance(value, int):
+                        value = str(value)
+                    custom_fields[pd_field_id] = value
+            return custom_fields
+
+        for company in (_company(1), Company(id=2, name='Bare', sales_person_id=1)):
+            assert _company_to_org_data(company)['custom_fields'] == loop_field_map(company)
@@ -0,0 +1,238 @@
+"""
+Tests for delivering syncs to Pipedrive through the outbox.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, call, patch
+
+from httpx import HTTPStatusError, Request, Response
+from sqlmodel import select
+
+from app.core.database import get_session
+from app.main_app.models import Company, Contact, Deal, PipedriveOutbox
+from app.pipedrive.outbox import MAX_ATTEMPTS, PipedriveOutboxRelay, add_to_outbox, drain_outbox
+
+
+def _add_entries(db, *entries: tuple[str, int]):
+    for action, object_id in entries:
+        add_to_outbox(db, action, object_id)
+    db.commit()
+
+
+@patch('app.pipedrive.outbox.sync_meeting_to_pipedrive', new_callable=AsyncMock)
+@patch('app.pipedrive.outbox.purge_company_from_pipedrive', new_callable=AsyncMock)
+@patch('app.pipedrive.outbox.sync_company_to_pipedrive', new_callable=AsyncMock)
+class TestDrainOutbox:
+    """Test delivering the outbox's entries"""
+
+    async def test_delivers_in_order(self, mock_sync, mock_purge, mock_sync_meeting, db):
+        _add_entries(db, (PipedriveOutbox.ACTION_SYNC_COMPANY, 1), (PipedriveOutbox.ACTION_SYNC_MEETING, 2))
+
+        latencies = await drain_outbox()
+
+        mock_sync.assert_called_once_with(1, {})
+        mock_sync_meeting.assert_called_once_with(2)
+        assert not mock_purge.called
+        assert len(latencies) == 2
+        assert all(0 <= latency < 60 for latency in latencies)
+        assert db.exec(select(PipedriveOutbox)).all() == []
+
+    async def test_collapses_entries_for_the_same_object(self, mock_sync, mock_purge, mock_sync_meeting, db):
+        _add_entries(
+            db,
+            (PipedriveOutbox.ACTION_SYNC_COMPANY, 1),
+            (PipedriveOutbox.ACTION_SYNC_COMPANY, 2),
+            (PipedriveOutbox.ACTION_SYNC_COMPANY, 1),
+            (PipedriveOutbox.ACTION_SYNC_COMPANY, 2),
+            # A company is purged if that's the last thing written for it
+            (PipedriveOutbox.ACTION_PURGE_COMPANY, 2),
+            (PipedriveOutbox.ACTION_SYNC_MEETING, 1),
+        )
+
+        assert len(await drain_outbox()) == 3
+
+        mock_sync.assert_called_once_with(1, {})
+        mock_purge.assert_called_once_with(2)
+        mock_sync_meeting.assert_called_once_with(1)
+        assert db.exec(select(PipedriveOutbox)).all() == []
+
+    async def test_batches(self, mock_sync, mock_purge, mock_sync_meeting, db):
+        _add_entries(db, *((PipedriveOutbox.ACTION_SYNC_COMPANY, i) for i in range(5)))
+
+        assert len(await drain_outbox(batch_size=2)) == 5
+
+        assert mock_sync.call_args_list == [call(i, {}) for i in range(5)]
+
+    async def test_failed_delivery_kept(self, mock_sync, mock_purge, mock_sync_meeting, db):
+        mock_sync.side_effect = [RuntimeError('db down'), None]
+        _add_entries(db, (PipedriveOutbox.ACTION_SYNC_COMPANY, 1), (PipedriveOutbox.ACTION_SYNC_COMPANY, 2))
+
+        assert len(await drain_outbox()) == 1
+
+        entry = db.exec(select(PipedriveOutbox)).one()
+        assert (entry.object_id, entry.attempts, entry.error) == (1, 1, 'db down')
+
+        # Given up on after too many attempts
+        entry.attempts = MAX_ATTEMPTS
+        db.add(entry)
+        db.commit()
+        assert await drain_outbox() == []
+        assert mock_sync.call_count == 2
+
+    async def test_claimed_entries_skipped(self, mock_sync, mock_purge, mock_sync_meeting, db):
+        _add_entries(db, (PipedriveOutbox.ACTION_SYNC_COMPANY, 1), (PipedriveOutbox.ACTION_SYNC_COMPANY, 2))
+        # Being delivered by another relay
+        entry = db.exec(select(PipedriveOutbox).where(PipedriveOutbox.object_id == 1)).one()
+        entry.claimed_until = datetime.now(timezone.utc) + timedelta(minutes=1)
+        db.add(entry)
+        db.commit()
+
+        assert len(await drain_outbox()) == 1
+        mock_sync.assert_called_once_with(2, {})
+
+        # Until its claim expires, if that relay died
+        entry.claimed_until = datetime.now(timezone.utc) - timedelta(seconds=1)
+        db.add(entry)
+        db.commit()
+        assert len(await drain_outbox()) == 1
+        assert mock_sync.call_args_list == [call(2, {}), call(1, {})]
+
+    async def test_concurrent_drains_deliver_once(self, mock_sync, mock_purge, mock_sync_meeting, db):
+        async def slow_sync(*args):
+            await asyncio.sleep(0.01)
+
+        mock_sync.side_effect = slow_sync
+        _add_entries(db, *((PipedriveOutbox.ACTION_SYNC_COMPANY, i) for i in range(4)))
+
+        latencies = await asyncio.gather(drain_outbox(batch_size=2), drain_outbox(batch_size=2))
+
+        assert sum(len(latency) for latency in latencies) == 4
+        assert sorted(c.args[0] for c in mock_sync.call_args_list) == [0, 1, 2, 3]
+        assert db.exec(select(PipedriveOutbox)).all() == []
+
+
+@patch('app.pipedrive.tasks.api.update_organisation', new_callable=AsyncMock)
+async def test_pipedrive_error_retried(mock_update_org, db, test_company):
+    """A sync that fails in Pipedrive stays in the outbox, with its changes, until it's delivered"""
+    test_company.pd_org_id = 10
+    test_company.name = 'Renamed'
+    db.add(test_company)
+    db.commit()
+    changes = {f'company:{test_company.id}': ['name']}
+    db.add(PipedriveOutbox(action=PipedriveOutbox.ACTION_SYNC_COMPANY, object_id=test_company.id, changes=changes))
+    db.commit()
+    mock_update_org.side_effect = [
+        HTTPStatusError('500 Server Error', request=Request('PATCH', 'https://example.com'), response=Response(500)),
+        {'data': {'id': 10}},
+    ]
+
+    assert await drain_outbox() == []
+
+    entry = db.exec(select(PipedriveOutbox)).one()
+    db.refresh(entry)
+    assert (entry.attempts, entry.error, entry.changes) == (1, '500 Server Error', changes)
+
+    assert len(await drain_outbox()) == 1
+
+    assert mock_update_org.call_args_list == [call(10, {'name': 'Renamed'})] * 2
+    assert db.exec(select(PipedriveOutbox)).all() == []
+
+
+class TestPipedriveOutboxRelay:
+    """Test the relay delivering the outbox in the background"""
+
+    @patch('app.pipedrive.outbox.sync_company_to_pipedrive', new_callable=AsyncMock)
+    async def test_delivers_when_notified(self, mock_sync, db):
+        _add_entries(db, (PipedriveOutbox.ACTION_SYNC_COMPANY, 1))
+        relay = PipedriveOutboxRelay(poll_interval=3600, batch_size=10)
+        relay.start()
+        assert relay.running
+
+        # Entries written before the relay started are delivered straight away
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+        mock_sync.assert_called_once_with(1, {})
+
+        _add_entries(db, (PipedriveOutbox.ACTION_SYNC_COMPANY, 2))
+        relay.notify()
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+        await relay.stop()
+
+        assert mock_sync.call_args_list == [call(1, {}), call(2, {})]
+        info = relay.info()
+        assert info['delivered'] == 2
+        assert 0 <= info['latency_p50'] <= info['latency_max']
+        assert not relay.running
+
+
+class TestChangeTracking:
+    """Test the changes to companies and their contacts and deals are saved with their outbox entries"""
+
+    def _changes(self, db) -> dict:
+        return db.exec(select(PipedriveOutbox)).one().changes
+
+    def test_changed_fields(self, db, test_deal):
+        with get_session() as session:
+            company = session.get(Company, test_deal.company_id)
+            deal = session.get(Deal, test_deal.id)
+            company.name = 'Renamed'
+            company.has_booked_call = True
+            session.add(company)
+            session.commit()
+            # Committed separately from the outbox entry, which is added with the deal's change
+            deal.status = Deal.STATUS_LOST
+            session.add(deal)
+            add_to_outbox(session, PipedriveOutbox.ACTION_SYNC_COMPANY, company.id)
+            session.commit()
+
+        assert self._changes(db) == {f'company:{test_deal.company_id}': ['name'], f'deal:{test_deal.id}': ['status']}
+
+    def test_new_objects(self, db, test_company):
+        with get_session() as session:
+            contact = Contact(first_name='Jane', last_name='Doe', company_id=test_company.id)
+            session.add(contact)
+            session.commit()
+            contact.email = 'jane@example.com'
+            session.add(contact)
+            add_to_outbox(session, PipedriveOutbox.ACTION_SYNC_COMPANY, test_company.id)
+            session.commit()
+            contact_id = contact.id
+
+        assert self._changes(db) == {f'contact:{contact_id}': None}
+
+    def test_rolled_back_changes_discarded(self, db, test_company):
+        with get_session() as session:
+            company = session.get(Company, test_company.id)
+            company.name = 'Rolled back'
+            session.add(company)
+            session.flush()
+            session.rollback()
+            company = session.get(Company, test_company.id)
+            company.price_plan = Company.PP_ENTERPRISE
+            session.add(company)
+            add_to_outbox(session, PipedriveOutbox.ACTION_SYNC_COMPANY, company.id)
+            session.commit()
+
+        assert self._changes(db) == {f'company:{test_company.id}': ['price_plan']}
+
+    @patch('app.pipedrive.outbox.sync_company_to_pipedrive', new_callable=AsyncMock)
+    async def test_collapsed_changes_merged(self, mock_sync, db):
+        db.add_all(
+            [
+                PipedriveOutbox(
+                    action=PipedriveOutbox.ACTION_SYNC_COMPANY, object_id=1, changes={'company:1': ['name']}
+                ),
+                PipedriveOutbox(
+                    action=PipedriveOutbox.ACTION_SYNC_COMPANY,
+                    object_id=1,
+                    changes={'company:1': ['country'], 'contact:2': None},
+                ),
+            ]
+        )
+        db.commit()
+
+        await drain_outbox()
+
+        mock_sync.assert_called_once_with(1, {'company:1': ['country', 'name'], 'contact:2': None})
@@ -0,0 +1,230 @@
+"""
+Tests for reconciling Hermes with Pipedrive.
+"""
+
+from unittest.mock import AsyncMock, patch
+
+from httpx import HTTPStatusError, Request, Response
+
+from app.main_app.models import Company, Deal
+from app.pipedrive.api import iter_pages
+from app.pipedrive.field_mappings import COMPANY_PD_FIELD_MAP, DEAL_PD_FIELD_MAP
+from app.pipedrive.reconcile import ENTITIES, Correction, apply_hermes_corrections, reconcile_entity
+from app.pipedrive.tasks import _company_to_org_data, _deal_to_pd_data
+from tests.conftest import engine
+from tests.factories import CompanyFactory
+from tests.helpers import count_queries
+
+
+def _pages(*pages: list[dict]) -> list[dict]:
+    """Pipedrive list responses for the pages, linked by cursors"""
+    return [
+        {'data': page, 'additional_data': {'next_cursor': f'cursor-{i + 1}' if i + 1 < len(pages) else None}}
+        for i, page in enumerate(pages)
+    ]
+
+
+def _pd_org(company: Company, pd_org_id: int) -> dict:
+    """The organisation as Pipedrive would return it, with each custom field's value as a {'value': ...} dict"""
+    data = _company_to_org_data(company)
+    custom_fields = {k: {'type': 'varchar', 'value': v} for k, v in data.pop('custom_fields').items()}
+    return {**data, 'id': pd_org_id, 'custom_fields': custom_fields}
+
+
+def _reconcile_mock(*pages: list[dict], existing: tuple[int, ...] = (), failing: tuple[int, ...] = ()) -> AsyncMock:
+    """
+    Pipedrive's API returning the pages from its list endpoint, and a 404 getting any single object apart from the
+    `existing` ones and the `failing` ones, which get a 500
+    """
+    responses = iter(_pages(*pages))
+
+    async def pipedrive_request(endpoint, *, method='GET', query_params=None, data=None):
+        if method != 'GET':
+            return {'data': {}}
+        if '/' not in endpoint:
+            return next(responses)
+        pd_id = int(endpoint.rsplit('/', 1)[1])
+        if pd_id in existing:
+            return {'data': {'id': pd_id}}
+        request = Request('GET', f'https://api.pipedrive.com/{endpoint}')
+        if pd_id in failing:
+            raise HTTPStatusError(f'Server error for url {request.url}', request=request, response=Response(500))
+        raise HTTPStatusError('404 Not Found', request=request, response=Response(404))
+
+    return AsyncMock(side_effect=pipedrive_request)
+
+
+class TestIterPages:
+    """Test paging through Pipedrive's list endpoints"""
+
+    @patch('app.pipedrive.reconcile.api.pipedrive_request')
+    async def test_follows_cursors(self, mock_request):
+        mock_request.side_effect = _pages([{'id': 1}, {'id': 2}], [{'id': 3}])
+
+        pages = [page async for page in iter_pages('organizations', page_size=2)]
+
+        assert pages == [[{'id': 1}, {'id': 2}], [{'id': 3}]]
+        assert [c.kwargs['query_params'] for c in mock_request.call_args_list] == [
+            {'limit': 2},
+            {'limit': 2, 'cursor': 'cursor-1'},
+        ]
+
+
+class TestReconcileOrganizations:
+    """Test reconciling organizations with companies"""
+
+    async def test_in_sync(self, db, test_company):
+        test_company.pd_org_id = 100
+        db.add(test_company)
+        db.commit()
+
+        with patch('app.pipedrive.reconcile.api.pipedrive_request', _reconcile_mock([_pd_org(test_company, 100)])):
+            counts = await reconcile_entity(ENTITIES['organization'], live=True)
+
+        assert counts == {}
+
+    async def test_custom_field_drift_updates_pipedrive(self, db, test_company):
+        test_company.pd_org_id = 100
+        test_company.paid_invoice_count = 4
+        db.add(test_company)
+        db.commit()
+        pd_org = _pd_org(test_company, 100)
+        pd_org['custom_fields'][COMPANY_PD_FIELD_MAP['paid_invoice_count']] = {'type': 'double', 'value': 2.0}
+
+        mock_request = _reconcile_mock([pd_org])
+        with patch('app.pipedrive.reconcile.api.pipedrive_request', mock_request):
+            counts = await reconcile_entity(ENTITIES['organization'], live=True)
+
+        assert counts == {Correction.ACTION_UPDATE_PIPEDRIVE: 1}
+        mock_request.assert_any_call(
+            'organizations/100',
+            method='PATCH',
+            data={'custom_fields': {COMPANY_PD_FIELD_MAP['paid_invoice_count']: '4'}},
+        )
+
+    async def test_links_and_unlinks(self, db, test_admin):
+        unlinked = CompanyFactory.create_with_db(db, sales_person_id=test_admin.id)
+        deleted_in_pd = CompanyFactory.create_with_db(db, sales_person_id=test_admin.id, pd_org_id=200)
+
+        mock_request = _reconcile_mock([_pd_org(unlinked, 100)], [{'id': 101, 'name': 'Not in Hermes'}])
+        with patch('app.pipedrive.reconcile.api.pipedrive_request', mock_request):
+            counts = await reconcile_entity(ENTITIES['organization'], live=True)
+
+        assert counts == {
+            Correction.ACTION_LINK: 1,
+            Correction.ACTION_UNLINK: 1,
+            Correction.ACTION_MISSING_IN_HERMES: 1,
+        }
+        db.refresh(unlinked)
+        db.refresh(deleted_in_pd)
+        assert unlinked.pd_org_id == 100
+        assert deleted_in_pd.pd_org_id is None
+
+    async def test_only_unlinks_objects_gone_from_pipedrive(self, db, test_admin):
+        # Created in Pipedrive after its page was fetched, and deleted from Pipedrive
+        created_since = CompanyFactory.create_with_db(db, sales_person_id=test_admin.id, pd_org_id=300)
+        deleted_in_pd = CompanyFactory.create_with_db(db, sales_person_id=test_admin.id, pd_org_id=200)
+
+        mock_request = _reconcile_mock([{'id': 101, 'name': 'Not in Hermes'}], existing=(300,))
+        with patch('app.pipedrive.reconcile.api.pipedrive_request', mock_request):
+            counts = await reconcile_entity(ENTITIES['organization'], live=True)
+
+        assert counts == {Correction.ACTION_UNLINK: 1, Correction.ACTION_MISSING_IN_HERMES: 1}
+        db.refresh(created_since)
+        db.refresh(deleted_in_pd)
+        assert created_since.pd_org_id == 300
+        assert deleted_in_pd.pd_org_id is None
+        mock_request.assert_any_call('organizations/300')
+        mock_request.assert_any_call('organizations/200')
+
+    async def test_errors_checking_objects_dont_unlink(self, db, test_admin):
+        # The error's message includes the URL, which has 404 in it
+        company = CompanyFactory.create_with_db(db, sales_person_id=test_admin.id, pd_org_id=14041)
+
+        mock_request = _reconcile_mock([], failing=(14041,))
+        with patch('app.pipedrive.reconcile.api.pipedrive_request', mock_request):
+            counts = await reconcile_entity(ENTITIES['organization'], live=True)
+
+        assert counts == {}
+        db.refresh(company)
+        assert company.pd_org_id == 14041
+
+    async def test_unlink_leaves_relinked_objects(self, db, test_admin):
+        company = CompanyFactory.create_with_db(db, sales_person_id=test_admin.id, pd_org_id=201)
+
+        apply_hermes_corrections(
+            db, ENTITIES['organization'], [Correction('organization', Correction.ACTION_UNLINK, company.id, 200)]
+        )
+
+        db.refresh(company)
+        assert company.pd_org_id == 201
+
+    async def test_not_live(self, db, test_company):
+        mock_request = _reconcile_mock([_pd_org(test_company, 100)])
+        with patch('app.pipedrive.reconcile.api.pipedrive_request', mock_request):
+            counts = await reconcile_entity(ENTITIES['organization'])
+
+        assert counts == {Correction.ACTION_LINK: 1}
+        db.refresh(test_company)
+        assert test_company.pd_org_id is None
+        assert all(c.kwargs['method'] == 'GET' for c in mock_request.call_args_list)
+
+    async def test_merged_and_duplicate(self, db, test_admin):
+        company = CompanyFactory.create_with_db(db, sales_person_id=test_admin.id)
+        merged = _pd_org(company, 100)
+        merged['custom_fields'][COMPANY_PD_FIELD_MAP['hermes_id']] = {'type': 'varchar', 'value': f'{company.id}, 999'}
+
+        with patch('app.pipedrive.reconcile.api.pipedrive_request', _reconcile_mock([merged, _pd_org(company, 101)])):
+            counts = await reconcile_entity(ENTITIES['organization'], live=True)
+
+        assert counts == {Correction.ACTION_LINK: 1, Correction.ACTION_DUPLICATE: 1}
+        db.refresh(company)
+        assert company.pd_org_id == 100
+
+    async def test_empty_pipedrive_unlinks_nothing(self, db, test_company):
+        test_company.pd_org_id = 100
+        db.add(test_company)
+        db.commit()
+
+        with patch('app.pipedrive.reconcile.api.pipedrive_request', _reconcile_mock([])):
+            counts = await reconcile_entity(ENTITIES['organization'], live=True)
+
+        assert counts == {}
+        db.refresh(test_company)
+        assert test_company.pd_org_id == 100
+
+
+class TestReconcileDeals:
+    """Test reconciling deals"""
+
+    async def test_queries_per_page(self, db, test_deal):
+        """Each page is diffed with the same few queries, however many deals it has"""
+        deals = [test_deal]
+        for i in range(20):
+            deal = Deal(
+                name=f'Deal {i}',
+                pd_deal_id=1000 + i,
+                company_id=test_deal.company_id,
+                admin_id=test_deal.admin_id,
+                pipeline_id=test_deal.pipeline_id,
+                stage_id=test_deal.stage_id,
+            )
+            deals.append(db.create(deal))
+        company = db.get(Company, test_deal.company_id)
+        company.paid_invoice_count = 2
+        db.add(company)
+        db.commit()
+
+        pd_deals = []
+        for deal in deals[1:]:
+            data = _deal_to_pd_data(deal)
+            pd_deals.append({**data, 'id': deal.pd_deal_id})
+        pd_deals[0]['custom_fields'][DEAL_PD_FIELD_MAP['paid_invoice_count']] = '1'
+
+        with patch('app.pipedrive.reconcile.api.pipedrive_request', _reconcile_mock(pd_deals)):
+            with count_queries(engine) as queries:
+                counts = await reconcile_entity(ENTITIES['deal'])
+
+        # Test deal isn't in Pipedrive, but it's not linked either
+        assert counts == {Correction.ACTION_UPDATE_PIPEDRIVE: 1}
+        assert len(queries) < 6
@@ -6,12 +6,17 @@ from datetime import datetime
 from unittest.mock import AsyncMock, patch
 
 import pytest
+from httpx import HTTPStatusError, Request, Response
 from sqlalchemy import func
 from sqlmodel import select
 
-from app.main_app.models import Company, Deal
-from app.pipedrive.field_mappings import DEAL_PD_FIELD_MAP
+from app.core.config import settings
+from app.main_app.models import Company, Contact, Deal, Meeting, PipedriveOutbox
+from app.pipedrive.field_mappings import COMPANY_PD_FIELD_MAP, DEAL_PD_FIELD_MAP
+from app.pipedrive.loaders import load_company, load_contact, load_deal, load_meeting
 from app.pipedrive.tasks import (
+    _company_to_org_data,
+    _contact_to_person_data,
     _deal_to_pd_data,
     _meeting_to_activity_data,
     partial_sync_deal_from_company,
@@ -21,6 +26,12 @@ from app.pipedrive.tasks import (
     sync_organization,
     sync_person,
 )
+from tests.conftest import engine
+from tests.helpers import assert_max_queries, count_queries
+
+
+def _not_found() -> HTTPStatusError:
+    return HTTPStatusError('404 Not Found', request=Request('GET', 'https://example.com'), response=Response(404))
 
 
 class SessionMock:
@@ -34,42 +45,146 @@ class SessionMock:
         return None
 
 
-class MockGCalResource:
-    def __init__(self, admin_username=None):
-        self.admin_username = admin_username
-
-    def freebusy(self):
-        return self
-
-    def query(self, body):
-        self.body = body
-        return self
-
-    def execute(self):
-        if self.admin_username:
-            return {'calendars': {self.admin_username: {'busy': []}}}
-        return {'calendars': {}}
-
-    def events(self):
-        return self
-
-    def insert(self, *args, **kwargs):
-        return self
+def gcal_response(admin_username=None):
+    if admin_username:
+        return {'calendars': {admin_username: {'busy': []}}}
+    return {'calendars': {}}
 
 
 class TestSyncCompanyToPipedrive:
     """Test sync_company_to_pipedrive task"""
 
     @patch('app.pipedrive.tasks.get_session')
-    @patch('app.pipedrive.tasks.sync_organization', new_callable=AsyncMock)
-    async def test_sync_company_not_found(self, mock_sync_org, mock_get_session, db):
+    @patch('app.pipedrive.tasks._send_organization', new_callable=AsyncMock)
+    async def test_sync_company_not_found(self, mock_send_org, mock_get_session, db):
         """Test syncing non-existent company logs warning"""
         mock_get_session.return_value = db
 
         await sync_company_to_pipedrive(999999)
 
         # Should log warning, not call sync functions
-        mock_sync_org.assert_not_called()
+        mock_send_org.assert_not_called()
+
+    @patch('app.core.config.settings.sync_create_deals', True)
+    @patch('app.pipedrive.tasks.get_session')
+    @patch('app.pipedrive.tasks.api.create_deal', new_callable=AsyncMock)
+    @patch('app.pipedrive.tasks.api.create_person', new_callable=AsyncMock)
+    @patch('app.pipedrive.tasks.api.create_organisation', new_callable=AsyncMock)
+    async def test_sync_company_loads_once_and_saves_once(
+        self, mock_create_org, mock_create_person, mock_create_deal, mock_get_session, db, test_deal
+    ):
+        """Test the company, contacts and deals are loaded with one session and their new ids saved with another"""
+        for i in range(3):
+            db.create(Contact(last_name=f'Contact {i}', company_id=test_deal.company_id))
+        company_id, contact_id, deal_id = test_deal.company_id, test_deal.contact_id, test_deal.id
+        db.expunge_all()
+
+        sessions, session_open = [], []
+
+        class SessionTracker:
+            def __enter__(self):
+                sessions.append(True)
+                session_open.append(True)
+                return db
+
+            def __exit__(self, *args):
+                session_open.pop()
+                return False
+
+        def created(pd_ids):
+            def create(data):
+                assert not session_open, 'API call was made while database session was still open'
+                return {'data': {'id': next(pd_ids)}}
+
+            return create
+
+        mock_get_session.side_effect = SessionTracker
+        mock_create_org.side_effect = created(iter([100]))
+        mock_create_person.side_effect = created(iter(range(200, 210)))
+        mock_create_deal.side_effect = created(iter([300]))
+
+        with count_queries(engine) as queries:
+            await sync_company_to_pipedrive(company_id)
+
+        assert len(sessions) == 2
+        # The company, its contacts and its deals, then an UPDATE each for the new ids
+        assert len([q for q in queries if q.startswith('SELECT')]) == 3
+        assert len([q for q in queries if q.startswith('UPDATE')]) == 3
+        # Each is sent with the ids created before it
+        assert {c.args[0]['org_id'] for c in mock_create_person.call_args_list} == {100}
+        deal_data = mock_create_deal.call_args.args[0]
+        assert (deal_data['org_id'], deal_data['person_id']) == (100, 200)
+
+        db.expunge_all()
+        assert db.get(Company, company_id).pd_org_id == 100
+        assert db.get(Contact, contact_id).pd_person_id == 200
+        assert sorted(c.pd_person_id for c in db.exec(select(Contact))) == [200, 201, 202, 203]
+        assert db.get(Deal, deal_id).pd_deal_id == 300
+
+    @patch('app.pipedrive.tasks.api.update_deal', new_callable=AsyncMock)
+    @patch('app.pipedrive.tasks.api.update_person', new_callable=AsyncMock)
+    @patch('app.pipedrive.tasks.api.update_organisation', new_callable=AsyncMock)
+    @patch('app.pipedrive.tasks.api.get_organisation', new_callable=AsyncMock)
+    async def test_sync_only_changed_fields(
+        self, mock_get_org, mock_update_org, mock_update_person, mock_update_deal, db, test_deal
+    ):
+        """With the changes from the outbox, just the changed fields are sent without fetching anything first"""
+        company = db.get(Company, test_deal.company_id)
+        company.pd_org_id = 10
+        company.paid_invoice_count = 0
+        company.name = 'Renamed'
+        company.tc2_cligency_id = 123
+        contact = db.get(Contact, test_deal.contact_id)
+        contact.pd_person_id = 20
+        test_deal.pd_deal_id = 30
+        test_deal.status = Deal.STATUS_LOST
+        db.add_all([company, contact, test_deal])
+        db.commit()
+
+        changes = {f'company:{company.id}': ['name', 'tc2_cligency_id'], f'deal:{test_deal.id}': ['status']}
+        await sync_company_to_pipedrive(company.id, changes)
+
+        assert not mock_get_org.called
+        tc2_url = f'{settings.tc2_base_url}/clients/123/'
+        mock_update_org.assert_called_once_with(
+            10, {'name': 'Renamed', 'custom_fields': {COMPANY_PD_FIELD_MAP['tc2_cligency_url']: tc2_url}}
+        )
+        # The person hasn't changed, and the deal gets the company's TC2 URL too
+        assert not mock_update_person.called
+        mock_update_deal.assert_called_once_with(
+            30, {'status': 'lost', 'custom_fields': {DEAL_PD_FIELD_MAP['tc2_cligency_url']: tc2_url}}
+        )
+
+    @patch('app.pipedrive.tasks.api.update_deal', new_callable=AsyncMock)
+    @patch('app.pipedrive.tasks.api.update_person', new_callable=AsyncMock)
+    @patch('app.pipedrive.tasks.api.create_organisation', new_callable=AsyncMock)
+    @patch('app.pipedrive.tasks.api.update_organisation', new_callable=AsyncMock)
+    async def test_recreated_organization_linked(
+        self, mock_update_org, mock_create_org, mock_update_person, mock_update_deal, db, test_deal
+    ):
+        """An organization recreated after being deleted from Pipedrive is sent with the persons and deals"""
+        company = db.get(Company, test_deal.company_id)
+        company.pd_org_id = 10
+        company.name = 'Renamed'
+        contact = db.get(Contact, test_deal.contact_id)
+        contact.pd_person_id = 20
+        test_deal.pd_deal_id = 30
+        db.add_all([company, contact, test_deal])
+        db.commit()
+        mock_update_org.side_effect = HTTPStatusError(
+            '404 Not Found', request=Request('PATCH', 'https://example.com'), response=Response(404)
+        )
+        mock_create_org.return_value = {'data': {'id': 11}}
+
+        await sync_company_to_pipedrive(company.id, {f'company:{company.id}': ['name']})
+
+        mock_create_org.assert_called_once()
+        assert mock_update_person.call_args.args[0] == 20
+        assert mock_update_person.call_args.args[1]['org_id'] == 11
+        assert mock_update_deal.call_args.args[0] == 30
+        assert mock_update_deal.call_args.args[1]['org_id'] == 11
+        db.expunge_all()
+        assert db.get(Company, company.id).pd_org_id == 11
 
 
 class TestSyncOrganization:
@@ -144,7 +259,7 @@ class TestSyncOrganization:
         db.commit()
 
         mock_get_session.return_value = SessionMock(db)
-        mock_get.side_effect = Exception('404 Not Found')
+        mock_get.side_effect = _not_found()
         mock_create.return_value = {'data': {'id': 1000}}
 
         await sync_organization(test_company.id)
@@ -206,7 +321,7 @@ class TestSyncPerson:
         db.commit()
 
         mock_get_session.return_value = SessionMock(db)
-        mock_get.side_effect = Exception('404 Not Found')
+        mock_get.side_effect = _not_found()
         mock_create.return_value = {'data': {'id': 1111}}
 
         await sync_person(test_contact.id)
@@ -217,7 +332,7 @@ class TestSyncPerson:
     @patch('app.pipedrive.tasks.get_session')
     @patch('app.pipedrive.tasks.api.get_person', new_callable=AsyncMock)
     async def test_sync_person_update_non_404_error(self, mock_get, mock_get_session, db, test_contact):
-        """Test person update with non-404 error logs but doesn't clear ID"""
+        """Test person update with non-404 error is raised but doesn't clear ID"""
         test_contact.pd_person_id = 999
         db.add(test_contact)
         db.commit()
@@ -225,7 +340,8 @@ class TestSyncPerson:
         mock_get_session.return_value = SessionMock(db)
         mock_get.side_effect = Exception('500 Server Error')
 
-        await sync_person(test_contact.id)
+        with pytest.raises(Exception, match='500 Server Error'):
+            await sync_person(test_contact.id)
 
         db.refresh(test_contact)
         assert test_contact.pd_person_id == 999
@@ -233,7 +349,7 @@ class TestSyncPerson:
     @patch('app.pipedrive.tasks.get_session')
     @patch('app.pipedrive.tasks.api.create_person', new_callable=AsyncMock)
     async def test_sync_person_create_failure(self, mock_create, mock_get_session, db, test_contact):
-        """Test person creation failure logs error"""
+        """Test person creation failure is raised, so the sync is retried"""
         test_contact.pd_person_id = None
         db.add(test_contact)
         db.commit()
@@ -241,7 +357,8 @@ class TestSyncPerson:
         mock_get_session.return_value = SessionMock(db)
         mock_create.side_effect = Exception('API Error')
 
-        await sync_person(test_contact.id)
+        with pytest.raises(Exception, match='API Error'):
+            await sync_person(test_contact.id)
 
         db.refresh(test_contact)
         assert test_contact.pd_person_id is None
@@ -276,7 +393,7 @@ class TestSyncDeal:
         db.commit()
 
         mock_get_session.return_value = SessionMock(db)
-        mock_get.side_effect = Exception('404 Not Found')
+        mock_get.side_effect = _not_found()
 
         await sync_deal(test_deal.id)
 
@@ -305,7 +422,7 @@ class TestSyncDeal:
     @patch('app.pipedrive.tasks.get_session')
     @patch('app.pipedrive.tasks.api.get_deal', new_callable=AsyncMock)
     async def test_sync_deal_update_non_404_error(self, mock_get, mock_get_session, db, test_deal):
-        """Test deal update with non-404 error logs but doesn't clear ID"""
+        """Test deal update with non-404 error is raised but doesn't clear ID"""
         test_deal.pd_deal_id = 999
         db.add(test_deal)
         db.commit()
@@ -313,7 +430,8 @@ class TestSyncDeal:
         mock_get_session.return_value = SessionMock(db)
         mock_get.side_effect = Exception('500 Server Error')
 
-        await sync_deal(test_deal.id)
+        with pytest.raises(Exception, match='500 Server Error'):
+            await sync_deal(test_deal.id)
 
         db.refresh(test_deal)
         assert test_deal.pd_deal_id == 999
@@ -321,7 +439,7 @@ class TestSyncDeal:
     @patch('app.pipedrive.tasks.get_session')
     @patch('app.pipedrive.tasks.api.create_deal', new_callable=AsyncMock)
     async def test_sync_deal_create_failure(self, mock_create, mock_get_session, db, test_deal):
-        """Test deal creation failure logs error"""
+        """Test deal creation failure is raised, so the sync is retried"""
         test_deal.pd_deal_id = None
         db.add(test_deal)
         db.commit()
@@ -329,7 +447,8 @@ class TestSyncDeal:
         mock_get_session.return_value = SessionMock(db)
         mock_create.side_effect = Exception('API Error')
 
-        await sync_deal(test_deal.id)
+        with pytest.raises(Exception, match='API Error'):
+            await sync_deal(test_deal.id)
 
         db.refresh(test_deal)
         assert test_deal.pd_deal_id is None
@@ -357,7 +476,7 @@ class TestSyncDeal:
     @patch('app.pipedrive.tasks.api.create_organisation', new_callable=AsyncMock)
     @patch('app.pipedrive.tasks.api.create_person', new_callable=AsyncMock)
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_callbooker_deleted_deal_not_synced_to_pipedrive(
         self,
         mock_gcal,
@@ -375,7 +494,7 @@ class TestSyncDeal:
     ):
         from pytz import utc
 
-        mock_gcal.return_value = MockGCalResource(test_admin.username)
+        mock_gcal.return_value = gcal_response(test_admin.username)
         mock_create_org.return_value = {'data': {'id': 7777}}
         mock_create_person.return_value = {'data': {'id': 8888}}
         mock_create_deal.return_value = {'data': {'id': 9999}}
@@ -420,12 +539,12 @@ class TestSyncDeal:
         # Verify create_deal was NOT called for deleted deal
         mock_create_deal.assert_not_called()
 
-    @patch('app.pipedrive.tasks.sync_organization', new_callable=AsyncMock)
-    @patch('app.pipedrive.tasks.sync_person', new_callable=AsyncMock)
+    @patch('app.pipedrive.tasks._send_organization', new_callable=AsyncMock)
+    @patch('app.pipedrive.tasks._send_person', new_callable=AsyncMock)
     @patch('app.pipedrive.tasks.api.update_deal', new_callable=AsyncMock)
     @patch('app.pipedrive.tasks.api.get_deal', new_callable=AsyncMock)
     async def test_tc2_closed_deal_synced_to_pipedrive(
-        self, mock_get_deal, mock_update_deal, mock_sync_person, mock_sync_org, db, test_deal
+        self, mock_get_deal, mock_update_deal, mock_send_person, mock_send_org, db, test_deal
     ):
         # Set up a deal that was closed by TC2 (NARC or terminated)
         test_deal.pd_deal_id = 5555
@@ -451,7 +570,7 @@ class TestSyncDeal:
     @patch('app.pipedrive.tasks.api.create_organisation', new_callable=AsyncMock)
     @patch('app.pipedrive.tasks.api.create_person', new_callable=AsyncMock)
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_callbooker_open_deal_synced_to_pipedrive(
         self,
         mock_gcal,
@@ -468,7 +587,7 @@ class TestSyncDeal:
     ):
         from pytz import utc
 
-        mock_gcal.return_value = MockGCalResource(test_admin.username)
+        mock_gcal.return_value = gcal_response(test_admin.username)
         mock_create_org.return_value = {'data': {'id': 7777}}
         mock_create_person.return_value = {'data': {'id': 8888}}
         mock_create_deal.return_value = {'data': {'id': 9999}}
@@ -725,7 +844,7 @@ class TestDealToPDData:
         db.add(test_deal.admin)
         db.commit()
 
-        result = _deal_to_pd_data(test_deal, db)
+        result = _deal_to_pd_data(test_deal)
 
         # Should use 'owner_id', not 'user_id'
         assert 'owner_id' in result
@@ -734,7 +853,7 @@ class TestDealToPDData:
 
     def test_deal_to_pd_data_includes_all_required_fields(self, db, test_deal):
         """Test that deal data includes all required fields for Pipedrive"""
-        result = _deal_to_pd_data(test_deal, db)
+        result = _deal_to_pd_data(test_deal)
 
         # Basic fields
         assert 'title' in result
@@ -758,7 +877,7 @@ class TestDealToPDData:
         db.add(test_deal)
         db.commit()
 
-        result = _deal_to_pd_data(test_deal, db)
+        result = _deal_to_pd_data(test_deal)
 
         assert 'person_id' in result
         assert result['person_id'] is None
@@ -777,7 +896,7 @@ class TestDealToPDData:
         db.add(company)
         db.commit()
 
-        result = _deal_to_pd_data(test_deal, db)
+        result = _deal_to_pd_data(test_deal)
 
         assert 'custom_fields' in result
         custom_fields = result['custom_fields']
@@ -801,7 +920,7 @@ class TestDealToPDData:
         db.add(test_deal)
         db.commit()
 
-        result = _deal_to_pd_data(test_deal, db)
+        result = _deal_to_pd_data(test_deal)
 
         assert 'custom_fields' in result
         custom_fields = result['custom_fields']
@@ -842,25 +961,25 @@ class TestSyncMeetingToPipedrive:
     @patch('app.pipedrive.tasks.get_session')
     @patch('app.pipedrive.tasks.api.create_activity', new_callable=AsyncMock)
     async def test_sync_meeting_with_error(self, mock_create, mock_get_session, db, test_meeting):
-        """Test syncing meeting with API error logs error"""
+        """Test syncing meeting with API error is raised, so the sync is retried"""
         mock_get_session.return_value = db
         mock_create.side_effect = Exception('API Error')
 
-        # Should log error but not raise
-        await sync_meeting_to_pipedrive(test_meeting.id)
+        with pytest.raises(Exception, match='API Error'):
+            await sync_meeting_to_pipedrive(test_meeting.id)
 
         mock_create.assert_called_once()
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     async def test_sales_call_endpoint_syncs_meeting(
         self, mock_gcal, mock_add_task, client, db, test_admin, test_pipeline, test_stage, test_config
     ):
-        """Test that sales call endpoint queues meeting sync"""
+        """Test that sales call endpoint adds the company's and meeting's syncs to the outbox, and delivers them"""
 
         from pytz import utc
 
-        mock_gcal.return_value = MockGCalResource(test_admin.username)
+        mock_gcal.return_value = gcal_response(test_admin.username)
 
         meeting_data = {
             'admin_id': test_admin.id,
@@ -879,20 +998,26 @@ class TestSyncMeetingToPipedrive:
         assert r.status_code == 200
         assert r.json() == {'status': 'ok'}
 
-        call_args = [call.args[0].__name__ for call in mock_add_task.call_args_list]
-        assert 'sync_company_to_pipedrive' in call_args
-        assert 'sync_meeting_to_pipedrive' in call_args
+        company = db.exec(select(Company)).one()
+        meeting = db.exec(select(Meeting)).one()
+        assert meeting.deal_id == db.exec(select(Deal)).one().id
+        entries = {(e.action, e.object_id) for e in db.exec(select(PipedriveOutbox))}
+        assert entries == {
+            (PipedriveOutbox.ACTION_SYNC_COMPANY, company.id),
+            (PipedriveOutbox.ACTION_SYNC_MEETING, meeting.id),
+        }
+        assert [call.args[0].__name__ for call in mock_add_task.call_args_list] == ['drain_outbox']
 
     @patch('fastapi.BackgroundTasks.add_task')
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
-    async def test_support_call_endpoint_does_not_sync_meeting(
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
+    async def test_support_call_endpoint_syncs_meeting(
         self, mock_gcal, mock_add_task, client, db, test_admin, test_company
     ):
-        """Test that support call endpoint does NOT queue meeting sync"""
+        """Test that support call endpoint adds the new contact's and meeting's syncs to the outbox"""
 
         from pytz import utc
 
-        mock_gcal.return_value = MockGCalResource(test_admin.username)
+        mock_gcal.return_value = gcal_response(test_admin.username)
 
         meeting_data = {
             'admin_id': test_admin.id,
@@ -907,9 +1032,13 @@ class TestSyncMeetingToPipedrive:
         assert r.status_code == 200
         assert r.json() == {'status': 'ok'}
 
-        call_args = [call.args[0].__name__ for call in mock_add_task.call_args_list]
-        assert 'sync_company_to_pipedrive' not in call_args
-        assert 'sync_meeting_to_pipedrive' not in call_args
+        meeting = db.exec(select(Meeting)).one()
+        entries = {(e.action, e.object_id) for e in db.exec(select(PipedriveOutbox))}
+        assert entries == {
+            (PipedriveOutbox.ACTION_SYNC_COMPANY, test_company.id),
+            (PipedriveOutbox.ACTION_SYNC_MEETING, meeting.id),
+        }
+        assert [call.args[0].__name__ for call in mock_add_task.call_args_list] == ['drain_outbox']
 
 
 class TestDataConversionHelpers:
@@ -917,7 +1046,7 @@ class TestDataConversionHelpers:
 
     def test_deal_to_pd_data(self, db, test_deal):
         """Test converting Deal to Pipedrive data"""
-        result = _deal_to_pd_data(test_deal, db)
+        result = _deal_to_pd_data(test_deal)
 
         assert 'title' in result
         assert 'org_id' in result
@@ -936,7 +1065,7 @@ class TestDataConversionHelpers:
         db.add(test_company)
         db.commit()
 
-        result = _meeting_to_activity_data(test_meeting, db)
+        result = _meeting_to_activity_data(test_meeting)
 
         assert 'due_date' in result
         assert 'due_time' in result
@@ -957,7 +1086,46 @@ class TestDataConversionHelpers:
         db.add(test_meeting)
         db.commit()
 
-        result = _meeting_to_activity_data(test_meeting, db)
+        result = _meeting_to_activity_data(test_meeting)
 
         assert 'deal_id' in result
         assert result['deal_id'] == 12345
+
+
+class TestPayloadQueries:
+    """Test each object's Pipedrive data is built from what it's loaded with, without lazy loading anything else"""
+
+    def test_company(self, db, test_company):
+        db.expunge_all()
+        with assert_max_queries(engine, 1):
+            data = _company_to_org_data(load_company(db, test_company.id))
+        assert data['owner_id'] == 1
+
+    def test_contact(self, db, test_contact, test_company):
+        test_company.pd_org_id = 456
+        db.add(test_company)
+        db.commit()
+        contact_id = test_contact.id
+        db.expunge_all()
+
+        with assert_max_queries(engine, 1):
+            data = _contact_to_person_data(load_contact(db, contact_id))
+        assert (data['org_id'], data['owner_id']) == (456, 1)
+
+    def test_deal(self, db, test_deal):
+        db.expunge_all()
+        with assert_max_queries(engine, 1):
+            data = _deal_to_pd_data(load_deal(db, test_deal.id))
+        assert (data['owner_id'], data['pipeline_id'], data['stage_id']) == (1, 1, 1)
+
+    def test_meeting(self, db, test_meeting, test_deal):
+        test_deal.pd_deal_id = 12345
+        test_meeting.deal_id = test_deal.id
+        db.add_all([test_deal, test_meeting])
+        db.commit()
+        meeting_id = test_meeting.id
+        db.expunge_all()
+
+        with assert_max_queries(engine, 1):
+            data = _meeting_to_activity_data(load_meeting(db, meeting_id))
+        assert (data['owner_id'], data['deal_id']) == (1, 12345)
@@ -283,6 +283,32 @@ class TestPipedriveWebhookEndpoint:
         assert r.status_code == 200
         assert r.json() == {'status': 'ok'}
 
+    async def test_pipedrive_callback_previous_only_parsed_for_deletes(self, client, db, test_company):
+        """An update is processed from its data, even if the previous data wouldn't parse"""
+        webhook_data = {
+            'meta': {'entity': 'organization', 'action': 'change'},
+            'data': {'id': 999, COMPANY_PD_FIELD_MAP['hermes_id']: test_company.id, 'name': 'Updated Name'},
+            'previous': {'id': 'invalid'},
+        }
+
+        r = client.post(client.app.url_path_for('pipedrive-callback'), json=webhook_data)
+
+        assert r.status_code == 200
+        db.refresh(test_company)
+        assert test_company.name == 'Updated Name'
+
+    async def test_pipedrive_callback_not_json(self, client, db):
+        r = client.post(client.app.url_path_for('pipedrive-callback'), content=b'not json')
+
+        assert r.status_code == 422
+
+    async def test_pipedrive_callback_invalid_entity_data(self, client, db):
+        webhook_data = {'meta': {'entity': 'organization', 'action': 'change'}, 'data': {'id': 'not-an-id'}}
+
+        r = client.post(client.app.url_path_for('pipedrive-callback'), json=webhook_data)
+
+        assert r.status_code == 422
+
     async def test_pipedrive_callback_person_invalid_previous(self, client, db):
         """Test webhook for person with invalid previous data"""
         webhook_data = {
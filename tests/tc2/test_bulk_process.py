@@ -0,0 +1,187 @@
+"""
+Tests for processing TC2 clients in bulk.
+"""
+
+from datetime import datetime, timezone
+
+from sqlmodel import select
+
+from app.main_app.identity import find_contact
+from app.main_app.models import Company, Contact, Deal
+from app.tc2.models import TCClient
+from app.tc2.process import process_tc_client, process_tc_clients
+from tests.conftest import engine
+from tests.helpers import count_queries, tc2_client_data
+
+
+def _tc_client(cligency_id: int, sales_person_id: int, **meta_agency) -> TCClient:
+    return TCClient(**tc2_client_data(cligency_id, sales_person_id, **meta_agency))
+
+
+def _trial_meta() -> dict:
+    return {'status': 'trial', 'paid_invoice_count': 0, 'created': datetime.now(timezone.utc).isoformat()}
+
+
+class TestProcessTCClients:
+    """Test process_tc_clients"""
+
+    async def test_creates_companies_and_contacts(self, db, test_admin):
+        companies = await process_tc_clients([_tc_client(1, test_admin.tc2_admin_id), _tc_client(2, 999)], db)
+
+        assert companies[1] is None
+        company = companies[0]
+        assert company.id is not None
+        assert company.name == 'Agency 1'
+        assert company.tc2_agency_id == 10001
+        assert company.country == 'GB'
+        assert company.price_plan == 'payg'
+        assert company.utm_source == 'google'
+        assert company.sales_person_id == test_admin.id
+
+        contacts = db.exec(select(Contact).where(Contact.company_id == company.id).order_by(Contact.tc2_sr_id)).all()
+        assert [(c.tc2_sr_id, c.email, c.phone, c.country) for c in contacts] == [
+            (20001, 'john1@x.com', '+1234567890', 'GB'),
+            (30001, 'john@example.com', '+1234567890', 'GB'),
+        ]
+        assert db.exec(select(Company).where(Company.tc2_cligency_id == 2)).first() is None
+        # Their identities are saved, though they're inserted without the ORM
+        assert find_contact(db, email='JOHN1@x.com') == contacts[0]
+
+    async def test_updates_existing_company(self, db, test_admin):
+        [company] = await process_tc_clients([_tc_client(1, test_admin.tc2_admin_id)], db)
+        company.name = 'Renamed in Pipedrive'
+        db.add(company)
+        db.commit()
+
+        [updated] = await process_tc_clients(
+            [_tc_client(1, test_admin.tc2_admin_id, paid_invoice_count=10, price_plan='monthly-startup')], db
+        )
+
+        assert updated.id == company.id
+        assert updated.name == 'Renamed in Pipedrive'
+        assert updated.paid_invoice_count == 10
+        assert updated.price_plan == 'startup'
+        assert len(db.exec(select(Contact)).all()) == 2
+
+    async def test_same_client_twice_in_batch(self, db, test_admin):
+        companies = await process_tc_clients(
+            [_tc_client(1, test_admin.tc2_admin_id), _tc_client(1, test_admin.tc2_admin_id, paid_invoice_count=7)], db
+        )
+
+        assert companies[0] is companies[1]
+        assert companies[0].paid_invoice_count == 7
+        assert len(db.exec(select(Company)).all()) == 1
+
+    async def test_agency_with_another_company_is_skipped(self, db, test_admin):
+        [existing] = await process_tc_clients([_tc_client(1, test_admin.tc2_admin_id)], db)
+
+        # Client 2 is in client 1's agency, and client 4 in client 3's
+        companies = await process_tc_clients(
+            [
+                _tc_client(2, test_admin.tc2_admin_id, id=10001),
+                _tc_client(3, test_admin.tc2_admin_id),
+                _tc_client(4, test_admin.tc2_admin_id, id=10003),
+            ],
+            db,
+        )
+
+        assert companies[0] is None
+        assert companies[1].tc2_cligency_id == 3
+        assert companies[2] is None
+        assert {c.tc2_cligency_id for c in db.exec(select(Company))} == {1, 3}
+        assert {c.company_id for c in db.exec(select(Contact))} == {existing.id, companies[1].id}
+
+    async def test_existing_contacts_are_left_alone(self, db, test_admin, test_contact):
+        test_contact.tc2_sr_id = 20001
+        db.add(test_contact)
+        db.commit()
+        data = tc2_client_data(1, test_admin.tc2_admin_id)
+
+        [company] = await process_tc_clients([TCClient(**data)], db)
+
+        db.refresh(test_contact)
+        assert test_contact.company_id != company.id
+        assert [c.tc2_sr_id for c in db.exec(select(Contact).where(Contact.company_id == company.id))] == [30001]
+
+    async def test_closes_open_deals_for_narc_companies(self, db, test_admin, test_deal):
+        company = db.get(Company, test_deal.company_id)
+        company.tc2_cligency_id = 1
+        db.add(company)
+        db.commit()
+
+        await process_tc_clients([_tc_client(1, test_admin.tc2_admin_id, narc=True)], db)
+
+        db.refresh(test_deal)
+        assert test_deal.status == Deal.STATUS_LOST
+
+    async def test_creates_deals_for_new_trials(self, db, test_admin, test_config):
+        companies = await process_tc_clients(
+            [
+                _tc_client(1, test_admin.tc2_admin_id, **_trial_meta()),
+                _tc_client(2, test_admin.tc2_admin_id),
+                _tc_client(3, test_admin.tc2_admin_id, narc=True, **_trial_meta()),
+            ],
+            db,
+        )
+
+        deals = db.exec(select(Deal)).all()
+        assert len(deals) == 1
+        assert deals[0].company_id == companies[0].id
+        assert deals[0].contact_id == db.exec(select(Contact).where(Contact.tc2_sr_id == 20001)).one().id
+
+    async def test_no_deals_when_not_requested(self, db, test_admin, test_config):
+        await process_tc_clients([_tc_client(1, test_admin.tc2_admin_id, **_trial_meta())], db, create_deal=False)
+
+        assert db.exec(select(Deal)).all() == []
+
+    async def test_same_result_as_processing_individually(self, db, test_admin, test_config):
+        def snapshot():
+            companies = db.exec(select(Company).order_by(Company.tc2_cligency_id)).all()
+            contacts = db.exec(select(Contact).order_by(Contact.tc2_sr_id)).all()
+            deals = db.exec(select(Deal).order_by(Deal.name)).all()
+            return (
+                [c.model_dump(exclude={'id'}) for c in companies],
+                [(c.company.tc2_cligency_id, c.model_dump(exclude={'id', 'company_id', 'created'})) for c in contacts],
+                [(d.company.tc2_cligency_id, d.contact.tc2_sr_id, d.status) for d in deals],
+            )
+
+        trial_meta = _trial_meta()
+
+        def clients():
+            return [
+                _tc_client(1, test_admin.tc2_admin_id, **trial_meta),
+                _tc_client(2, test_admin.tc2_admin_id, status='terminated'),
+                _tc_client(3, test_admin.tc2_admin_id, narc=True),
+            ]
+
+        for tc_client in clients():
+            await process_tc_client(tc_client, db)
+        individually = snapshot()
+        for model in (Deal, Contact, Company):
+            for obj in db.exec(select(model)).all():
+                db.delete(obj)
+            db.commit()
+
+        await process_tc_clients(clients(), db)
+
+        assert snapshot() == individually
+
+    async def test_fewer_queries_than_processing_individually(self, db, test_admin, test_config):
+        """
+        Benchmark the statements needed for a webhook of 50 clients, half new and half already in Hermes, against
+        processing each client on its own.
+        """
+        for i in range(25):
+            await process_tc_client(_tc_client(i, test_admin.tc2_admin_id), db)
+
+        with count_queries(engine) as individual_queries:
+            for i in range(50):
+                await process_tc_client(_tc_client(i, test_admin.tc2_admin_id), db)
+
+        with count_queries(engine) as bulk_queries:
+            await process_tc_clients([_tc_client(i, test_admin.tc2_admin_id) for i in range(50, 100)], db)
+            await process_tc_clients([_tc_client(i, test_admin.tc2_admin_id) for i in range(50)], db)
+
+        assert len(db.exec(select(Company)).all()) == 100
+        assert len(individual_queries) > 250
+        assert len(bulk_queries) < 20
@@ -0,0 +1,127 @@
+"""
+Tests for parsing TC2 webhook payloads.
+"""
+
+import copy
+import json
+import time
+
+from pydantic import BaseModel, ConfigDict
+
+from app.tc2.models import TCClient, TCWebhook
+from tests.helpers import tc2_client_data
+
+
+def _large_client_data(cligency_id: int) -> dict:
+    """Client data shaped like a real webhook's, with all admins and plenty of extra attributes"""
+    data = tc2_client_data(cligency_id, 1)
+    data['associated_admin'] = {'id': 2, 'first_name': 'Sam', 'last_name': 'Support'}
+    data['bdr_person'] = {'id': 3, 'first_name': 'Bo', 'last_name': 'Bdr'}
+    data['meta_agency']['signup_questionnaire'] = {'how_did_you_hear': 'Google', 'students': '10-50'}
+    data['extra_attrs'] = [
+        {'machine_name': name, 'value': f' Value-{cligency_id} '}
+        for name in ('utm_source', 'utm_campaign', 'gclid', 'estimated_monthly_income', 'other_1', 'other_2')
+    ]
+    return data
+
+
+def _webhook_body(clients: list[dict]) -> bytes:
+    events = [{'action': 'UPDATE', 'verb': 'update', 'subject': {**c, 'model': 'Client'}} for c in clients]
+    return json.dumps({'events': events, '_request_time': 1234567890}).encode()
+
+
+class TestTCClient:
+    """Test TCClient parsing"""
+
+    def test_admin_ids_from_nested_admins(self):
+        tc_client = TCClient.model_validate(_large_client_data(1))
+
+        assert (tc_client.sales_person_id, tc_client.associated_admin_id, tc_client.bdr_person_id) == (1, 2, 3)
+
+    def test_admin_ids(self):
+        data = tc2_client_data(1, 1)
+        del data['sales_person']
+        data.update(sales_person_id=4, bdr_person=None)
+
+        tc_client = TCClient.model_validate(data)
+
+        assert (tc_client.sales_person_id, tc_client.associated_admin_id, tc_client.bdr_person_id) == (4, None, None)
+
+    def test_user_email_from_recipient(self):
+        data = tc2_client_data(1, 1)
+        data['user']['email'] = None
+        data['paid_recipients'][0]['email'] = None
+
+        assert TCClient.model_validate(data).user.email is None
+
+        data['paid_recipients'][1]['email'] = 'jane@example.com'
+        assert TCClient.model_validate(data).user.email == 'jane@example.com'
+
+    def test_extra_attrs_cleaned(self):
+        data = tc2_client_data(1, 1)
+        data['extra_attrs'] = [
+            {'machine_name': 'utm_source', 'value': '  Google-Ads- '},
+            {'machine_name': 'gclid', 'value': ' AbC-123 '},
+            {'machine_name': 'utm_campaign', 'value': '   '},
+            {'machine_name': 'estimated_monthly_income', 'value': '--'},
+        ]
+
+        tc_client = TCClient.model_validate(data)
+
+        assert [(a.machine_name, a.value) for a in tc_client.extra_attrs] == [
+            ('utm_source', 'google-ads'),
+            ('gclid', 'AbC-123'),
+        ]
+
+    def test_data_not_changed(self):
+        data = _large_client_data(1)
+        data['user']['email'] = None
+        original = copy.deepcopy(data)
+
+        TCClient.model_validate(data)
+
+        assert data == original
+
+
+class TestTCWebhook:
+    """Test TCWebhook parsing"""
+
+    def test_subjects_kept_as_data(self):
+        client_data = _large_client_data(1)
+        body = _webhook_body([client_data])
+
+        webhook = TCWebhook.model_validate_json(body)
+
+        subject = webhook.events[0].subject
+        assert subject == {**client_data, 'model': 'Client'}
+        assert TCClient.model_validate(subject).id == 1
+
+    def test_parse_is_faster_than_dump_and_reparse(self):
+        """
+        Benchmark parsing a large webhook's clients straight from the webhook's data against parsing each subject
+        into a model, dumping it and parsing that as a TCClient.
+        """
+
+        class SubjectModel(BaseModel):
+            model_config = ConfigDict(extra='allow')
+
+        body = _webhook_body([_large_client_data(i) for i in range(200)])
+
+        def parse():
+            return [TCClient.model_validate(e.subject) for e in TCWebhook.model_validate_json(body).events]
+
+        def dump_and_reparse():
+            events = TCWebhook.model_validate_json(body).events
+            return [TCClient(**SubjectModel(**e.subject).model_dump()) for e in events]
+
+        assert parse() == dump_and_reparse()
+
+        # The runs are interleaved and the best of each kept, so the comparison isn't thrown by whatever else the
+        # machine is doing
+        parse_times, dump_and_reparse_times = [], []
+        for _ in range(10):
+            for func, times in ((parse, parse_times), (dump_and_reparse, dump_and_reparse_times)):
+                start = time.perf_counter()
+                func()
+                times.append(time.perf_counter() - start)
+        assert min(parse_times) < min(dump_and_reparse_times)
@@ -123,12 +123,12 @@ class TestTC2Integration:
         assert company is not None
         assert company.name == 'Test Agency'
 
-    @patch('app.pipedrive.tasks.sync_deal', new_callable=AsyncMock)
+    @patch('app.pipedrive.tasks._send_deal', new_callable=AsyncMock)
     @patch('httpx.AsyncClient.request')
     async def test_tc2_webhook_partial_syncs_deal_for_paying_agencies(
         self,
         mock_request,
-        mock_sync_deal,
+        mock_send_deal,
         client,
         db,
         test_admin,
@@ -167,14 +167,16 @@ class TestTC2Integration:
         await sync_company_to_pipedrive(company.id)
 
         # Paying agencies get partial sync (only_sync_deal_fields=True)
-        mock_sync_deal.assert_awaited_once_with(deal.id, True)
+        mock_send_deal.assert_awaited_once()
+        sent_deal, only_syncable_deal_fields, *_ = mock_send_deal.await_args.args
+        assert (sent_deal.id, only_syncable_deal_fields) == (deal.id, True)
 
-    @patch('app.pipedrive.tasks.sync_deal', new_callable=AsyncMock)
+    @patch('app.pipedrive.tasks._send_deal', new_callable=AsyncMock)
     @patch('httpx.AsyncClient.request')
     async def test_tc2_webhook_syncs_deals_for_unpaid_agencies(
         self,
         mock_request,
-        mock_sync_deal,
+        mock_send_deal,
         client,
         db,
         test_admin,
@@ -215,7 +217,9 @@ class TestTC2Integration:
         await sync_company_to_pipedrive(company.id)
 
         # Unpaid agencies get full sync (only_sync_deal_fields=False)
-        mock_sync_deal.assert_awaited_once_with(deal.id, False)
+        mock_send_deal.assert_awaited_once()
+        sent_deal, only_syncable_deal_fields, *_ = mock_send_deal.await_args.args
+        assert (sent_deal.id, only_syncable_deal_fields) == (deal.id, False)
 
     @patch('httpx.AsyncClient.request')
     async def test_deal_pd_id_preserved_when_pipedrive_returns_404(
@@ -1998,7 +2002,7 @@ class TestTC2SyncableFields:
 class TestGetOrCreateDealConsolidation:
     """Test consolidated get_or_create_deal function with filters"""
 
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     @patch('fastapi.BackgroundTasks.add_task')
     @patch('httpx.AsyncClient.request')
     async def test_callbooker_flow_with_multiple_deals_gets_only_open_deal(
@@ -2152,7 +2156,7 @@ class TestGetOrCreateDealConsolidation:
         first_deal = db.exec(select(Deal).where(Deal.company_id == company.id)).first()
         assert first_deal.id == lost_deal.id
 
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     @patch('fastapi.BackgroundTasks.add_task')
     async def test_callbooker_flow_creates_new_open_deal_when_only_lost_deals_exist(
         self, mock_add_task, mock_gcal_builder, client, db, test_admin, test_config
@@ -2311,7 +2315,7 @@ class TestGetOrCreateDealConsolidation:
         assert deal2.status == Deal.STATUS_LOST
         assert deal3.status == Deal.STATUS_WON
 
-    @patch('app.callbooker.google.AdminGoogleCalendar._create_resource')
+    @patch('app.callbooker.google.AdminGoogleCalendar._request')
     @patch('fastapi.BackgroundTasks.add_task')
     async def test_callbooker_multiple_open_deals_returns_first_open(
         self, mock_add_task, mock_gcal_builder, client, db, test_admin, test_config
@@ -2768,8 +2772,9 @@ class TestPartialDealSyncIntegration:
 
         requests_made.clear()
 
-        # Should not raise - error is caught and logged
-        await sync_company_to_pipedrive(company.id)
+        # The error is raised, so the outbox retries the sync
+        with pytest.raises(Exception, match='Pipedrive API Error: 500'):
+            await sync_company_to_pipedrive(company.id)
 
         # Verify the correct payload was attempted before the error
         deal_patch_requests = self.get_deal_patch_requests(requests_made)
@@ -0,0 +1,143 @@
+"""
+Tests for verifying TC2 webhook signatures.
+"""
+
+import hashlib
+import hmac
+import json
+import time
+from unittest.mock import patch
+
+import pytest
+from sqlmodel import select
+
+from app.core.config import settings
+from app.main_app.models import IdempotentResponse, TC2Event
+from app.tc2 import views
+from app.tc2.models import TCWebhook
+from app.tc2.views import verify_tc2_signature
+from tests.helpers import tc2_client_data
+
+
+@pytest.fixture(autouse=True)
+def verify_signatures():
+    views._tc2_hmac.cache_clear()
+    with patch.object(settings, 'dev_mode', False), patch.object(settings, 'tc2_shared_key', 'shared-key'):
+        yield
+    views._tc2_hmac.cache_clear()
+
+
+def _sign(body: bytes, key: str = 'shared-key') -> str:
+    return hmac.new(key.encode(), body, hashlib.sha256).hexdigest()
+
+
+def _webhook_body(*clients: dict) -> bytes:
+    events = [{'action': 'UPDATE', 'verb': 'update', 'subject': {**c, 'model': 'Client'}} for c in clients]
+    return json.dumps({'events': events, '_request_time': 1234567890}).encode()
+
+
+class TestTC2WebhookSignature:
+    """Test the TC2 callback only accepts signed webhooks"""
+
+    @patch('app.pipedrive.outbox.sync_company_to_pipedrive')
+    def test_valid_signature(self, mock_sync, client, db, test_admin):
+        body = _webhook_body(tc2_client_data(1, test_admin.tc2_admin_id))
+
+        r = client.post(
+            client.app.url_path_for('tc2-callback'), content=body, headers={'X-Webhook-Signature': _sign(body)}
+        )
+
+        assert r.status_code == 200
+        assert db.exec(select(TC2Event)).one().tc2_cligency_id == 1
+
+    @pytest.mark.parametrize(
+        'headers',
+        [{}, {'X-Webhook-Signature': ''}, {'X-Webhook-Signature': 'not-a-signature'}],
+        ids=['missing', 'empty', 'forged'],
+    )
+    def test_invalid_signature_rejected_before_parsing(self, headers, client, db, test_admin):
+        body = _webhook_body(tc2_client_data(1, test_admin.tc2_admin_id))
+
+        with patch.object(TCWebhook, 'model_validate_json') as mock_parse:
+            r = client.post(client.app.url_path_for('tc2-callback'), content=body, headers=headers)
+
+        assert r.status_code == 403
+        assert r.json() == {'status': 'error', 'message': 'Invalid signature'}
+        assert not mock_parse.called
+        assert db.exec(select(TC2Event)).all() == []
+
+    @pytest.mark.parametrize('headers', [{}, {'X-Webhook-Signature': 'not-a-signature'}], ids=['missing', 'forged'])
+    def test_invalid_signature_rejected_before_idempotency(self, headers, client, db, test_admin):
+        body = _webhook_body(tc2_client_data(1, test_admin.tc2_admin_id))
+
+        with (
+            patch('app.common.idempotency.claim_key') as mock_claim,
+            patch('app.common.idempotency.release_key') as mock_release,
+        ):
+            r = client.post(client.app.url_path_for('tc2-callback'), content=body, headers=headers)
+
+        assert r.status_code == 403
+        assert not mock_claim.called
+        assert not mock_release.called
+        assert db.exec(select(IdempotentResponse)).all() == []
+
+    def test_signed_with_wrong_key(self, client, db, test_admin):
+        body = _webhook_body(tc2_client_data(1, test_admin.tc2_admin_id))
+
+        r = client.post(
+            client.app.url_path_for('tc2-callback'),
+            content=body,
+            headers={'X-Webhook-Signature': _sign(body, 'other-key')},
+        )
+
+        assert r.status_code == 403
+
+    def test_body_changed_after_signing(self, client, db, test_admin):
+        body = _webhook_body(tc2_client_data(1, test_admin.tc2_admin_id))
+        signature = _sign(body)
+
+        r = client.post(
+            client.app.url_path_for('tc2-callback'),
+            content=body.replace(b'Agency 1', b'Agency 2'),
+            headers={'X-Webhook-Signature': signature},
+        )
+
+        assert r.status_code == 403
+
+    def test_signed_invalid_payload(self, client, db):
+        body = b'{"events": "nope"}'
+
+        r = client.post(
+            client.app.url_path_for('tc2-callback'), content=body, headers={'X-Webhook-Signature': _sign(body)}
+        )
+
+        assert r.status_code == 422
+
+    @patch('app.pipedrive.outbox.sync_company_to_pipedrive')
+    def test_not_checked_in_dev_mode(self, mock_sync, client, db, test_admin):
+        with patch.object(settings, 'dev_mode', True):
+            r = client.post(
+                client.app.url_path_for('tc2-callback'), content=_webhook_body(tc2_client_data(1, 1)), headers={}
+            )
+
+        assert r.status_code == 200
+
+    def test_verification_is_cheap_compared_to_parsing(self):
+        """
+        Benchmark verifying a large webhook's signature against parsing it, which we'd otherwise do for every junk
+        webhook.
+        """
+        body = _webhook_body(*[tc2_client_data(i, 1) for i in range(100)])
+        signature = _sign(body)
+
+        def timed(func, n=50):
+            start = time.perf_counter()
+            for _ in range(n):
+                func()
+            return time.perf_counter() - start
+
+        verify_time = timed(lambda: verify_tc2_signature(body, signature))
+        parse_time = timed(lambda: TCWebhook.model_validate_json(body))
+
+        assert verify_tc2_signature(body, signature)
+        assert verify_time < parse_time / 5
@@ -0,0 +1,224 @@
+"""
+Tests for processing TC2 webhook events in the background.
+"""
+
+import asyncio
+from unittest.mock import patch
+
+from sqlmodel import select
+
+from app.main_app.models import Company, PipedriveOutbox, TC2Event
+from app.tc2 import worker
+from app.tc2.worker import TC2EventPool, process_tc2_events
+from tests.helpers import tc2_client_data
+
+
+def _webhook(*clients: dict) -> dict:
+    return {
+        'events': [{'action': 'UPDATE', 'verb': 'update', 'subject': {**c, 'model': 'Client'}} for c in clients],
+        '_request_time': 1234567890,
+    }
+
+
+def _store_events(db, *clients: dict) -> list[TC2Event]:
+    events = [TC2Event(action='UPDATE', tc2_cligency_id=c['id'], data=c) for c in clients]
+    db.add_all(events)
+    db.commit()
+    for event in events:
+        db.refresh(event)
+    return events
+
+
+class TestTC2Callback:
+    """Test the TC2 callback stores events and, without the worker pool running, processes them straight away"""
+
+    @patch('app.pipedrive.outbox.sync_company_to_pipedrive')
+    def test_webhook_stores_and_processes_events(self, mock_sync, client, db, test_admin):
+        webhook = _webhook(*[tc2_client_data(i, test_admin.tc2_admin_id) for i in range(3)])
+
+        with patch('app.tc2.worker.process_tc_client') as mock_process:
+            r = client.post(client.app.url_path_for('tc2-callback'), json=webhook)
+
+        assert r.status_code == 200
+        assert not mock_process.called
+        assert len(db.exec(select(Company)).all()) == 3
+        events = db.exec(select(TC2Event).order_by(TC2Event.id)).all()
+        assert [(e.tc2_cligency_id, e.action, e.status) for e in events] == [
+            (0, 'UPDATE', TC2Event.STATUS_PROCESSED),
+            (1, 'UPDATE', TC2Event.STATUS_PROCESSED),
+            (2, 'UPDATE', TC2Event.STATUS_PROCESSED),
+        ]
+        assert all(e.processed for e in events)
+        assert mock_sync.call_count == 3
+
+    @patch('app.pipedrive.outbox.sync_company_to_pipedrive')
+    def test_webhook_falls_back_to_individual_processing(self, mock_sync, client, db, test_admin):
+        webhook = _webhook(*[tc2_client_data(i, test_admin.tc2_admin_id) for i in range(3)])
+
+        with patch('app.tc2.worker.process_tc_clients', side_effect=RuntimeError('bulk failed')):
+            r = client.post(client.app.url_path_for('tc2-callback'), json=webhook)
+
+        assert r.status_code == 200
+        assert len(db.exec(select(Company)).all()) == 3
+        assert mock_sync.call_count == 3
+
+    @patch('app.pipedrive.outbox.sync_company_to_pipedrive')
+    def test_failed_client_is_marked_failed(self, mock_sync, client, db, test_admin):
+        webhook = _webhook(*[tc2_client_data(i, test_admin.tc2_admin_id) for i in range(3)])
+
+        async def process_tc_client(tc_client, db):
+            if tc_client.id == 1:
+                raise RuntimeError('client failed')
+            return await original_process_tc_client(tc_client, db)
+
+        original_process_tc_client = worker.process_tc_client
+        with (
+            patch('app.tc2.worker.process_tc_clients', side_effect=RuntimeError('bulk failed')),
+            patch('app.tc2.worker.process_tc_client', side_effect=process_tc_client),
+        ):
+            r = client.post(client.app.url_path_for('tc2-callback'), json=webhook)
+
+        assert r.status_code == 200
+        events = {e.tc2_cligency_id: e for e in db.exec(select(TC2Event))}
+        assert {i: (e.status, e.error) for i, e in events.items()} == {
+            0: (TC2Event.STATUS_PROCESSED, None),
+            1: (TC2Event.STATUS_FAILED, 'client failed'),
+            2: (TC2Event.STATUS_PROCESSED, None),
+        }
+        assert sorted(c.tc2_cligency_id for c in db.exec(select(Company))) == [0, 2]
+        assert mock_sync.call_count == 2
+
+    @patch('app.pipedrive.outbox.sync_company_to_pipedrive')
+    def test_webhook_syncs_each_company_once(self, mock_sync, client, db, test_admin):
+        data = tc2_client_data(1, test_admin.tc2_admin_id)
+        r = client.post(client.app.url_path_for('tc2-callback'), json=_webhook(data, data))
+
+        assert r.status_code == 200
+        company = db.exec(select(Company)).one()
+        mock_sync.assert_called_once()
+        assert mock_sync.call_args.args[0] == company.id
+
+    @patch('app.pipedrive.outbox.sync_company_to_pipedrive')
+    def test_invalid_event_is_marked_failed(self, mock_sync, client, db, test_admin):
+        invalid = tc2_client_data(2, test_admin.tc2_admin_id)
+        del invalid['meta_agency']['name']
+        r = client.post(
+            client.app.url_path_for('tc2-callback'), json=_webhook(tc2_client_data(1, test_admin.tc2_admin_id), invalid)
+        )
+
+        assert r.status_code == 200
+        events = {e.tc2_cligency_id: e for e in db.exec(select(TC2Event))}
+        assert events[1].status == TC2Event.STATUS_PROCESSED
+        assert events[2].status == TC2Event.STATUS_FAILED
+        assert 'name' in events[2].error
+        assert db.exec(select(Company)).one().tc2_cligency_id == 1
+
+    @patch('app.tc2.worker.process_tc2_events')
+    def test_webhook_is_acknowledged_when_pool_is_running(self, mock_process, client, db, test_admin):
+        with (
+            patch.object(TC2EventPool, 'running', True),
+            patch.object(TC2EventPool, 'submit') as mock_submit,
+        ):
+            r = client.post(
+                client.app.url_path_for('tc2-callback'), json=_webhook(tc2_client_data(1, test_admin.tc2_admin_id))
+            )
+
+        assert r.status_code == 200
+        assert not mock_process.called
+        [events] = mock_submit.call_args.args
+        assert [e.tc2_cligency_id for e in events] == [1]
+        assert db.exec(select(TC2Event)).one().status == TC2Event.STATUS_PENDING
+
+
+class TestTC2EventPool:
+    """Test the TC2 event worker pool"""
+
+    @patch('app.tc2.worker.pd_outbox_relay')
+    async def test_processes_events(self, mock_relay, db, test_admin):
+        events = _store_events(
+            db,
+            tc2_client_data(1, test_admin.tc2_admin_id),
+            tc2_client_data(2, test_admin.tc2_admin_id),
+            tc2_client_data(1, test_admin.tc2_admin_id, paid_invoice_count=9),
+        )
+        pool = TC2EventPool(workers=2, batch_size=10)
+        await pool.start()
+        pool.submit(events)
+        await pool.stop()
+
+        companies = {c.tc2_cligency_id: c for c in db.exec(select(Company))}
+        assert set(companies) == {1, 2}
+        assert companies[1].paid_invoice_count == 9
+        db.expire_all()
+        assert {e.status for e in db.exec(select(TC2Event))} == {TC2Event.STATUS_PROCESSED}
+        assert {e.object_id for e in db.exec(select(PipedriveOutbox))} == {c.id for c in companies.values()}
+        assert mock_relay.notify.called
+        assert not pool.running
+
+    async def test_same_cligency_in_order_and_others_in_parallel(self, db):
+        processing = []
+        max_parallel = 0
+
+        async def fake_process(event_ids):
+            nonlocal max_parallel
+            processing.append(event_ids)
+            max_parallel = max(max_parallel, len(processing))
+            await asyncio.sleep(0.01)
+            processing.remove(event_ids)
+            batches.append(event_ids)
+            return {}
+
+        batches = []
+        pool = TC2EventPool(workers=4, batch_size=2)
+        with patch('app.tc2.worker.process_tc2_events', side_effect=fake_process):
+            await pool.start()
+            pool.submit([TC2Event(id=i, tc2_cligency_id=i % 4, action='UPDATE', data={}) for i in range(1, 17)])
+            await pool.stop()
+
+        assert max_parallel == 4
+        assert sorted(i for batch in batches for i in batch) == list(range(1, 17))
+        for cligency_id in range(4):
+            ids = [i for batch in batches for i in batch if i % 4 == cligency_id]
+            assert ids == sorted(ids)
+        assert all(len(batch) <= 2 for batch in batches)
+
+    async def test_failed_batch_is_marked_failed(self, db, test_admin):
+        events = _store_events(
+            db, tc2_client_data(1, test_admin.tc2_admin_id), tc2_client_data(5, test_admin.tc2_admin_id)
+        )
+
+        pool = TC2EventPool(workers=4, batch_size=10)
+        with patch('app.tc2.worker.process_tc2_events', side_effect=RuntimeError('database gone')):
+            await pool.start()
+            pool.submit(events)
+            await pool.stop()
+
+        db.expire_all()
+        assert [(e.status, e.error) for e in db.exec(select(TC2Event).order_by(TC2Event.id))] == [
+            (TC2Event.STATUS_FAILED, 'database gone'),
+            (TC2Event.STATUS_FAILED, 'database gone'),
+        ]
+        assert all(e.processed for e in db.exec(select(TC2Event)))
+
+    async def test_requeues_pending_events_on_start(self, db, test_admin):
+        _store_events(db, tc2_client_data(1, test_admin.tc2_admin_id))
+
+        pool = TC2EventPool(workers=2, batch_size=10)
+        await pool.start()
+        await pool.stop()
+
+        assert db.exec(select(Company)).one().tc2_cligency_id == 1
+
+    async def test_process_events_returns_company_narcs(self, db, test_admin):
+        events = _store_events(
+            db, tc2_client_data(1, test_admin.tc2_admin_id), tc2_client_data(2, test_admin.tc2_admin_id, narc=True)
+        )
+
+        company_narcs = await process_tc2_events([e.id for e in events])
+
+        companies = {c.tc2_cligency_id: c.id for c in db.exec(select(Company))}
+        assert company_narcs == {companies[1]: False, companies[2]: True}
+        assert {(e.object_id, e.action) for e in db.exec(select(PipedriveOutbox))} == {
+            (companies[1], PipedriveOutbox.ACTION_SYNC_COMPANY),
+            (companies[2], PipedriveOutbox.ACTION_PURGE_COMPANY),
+        }